@@ -4,15 +4,62 @@ Gère la connexion à la base de données graphe
 """
 
 import os
-from contextlib import contextmanager
-from neo4j import GraphDatabase
+import time
+import base64
+import asyncio
+from datetime import datetime
+from contextlib import asynccontextmanager
+from neo4j import AsyncGraphDatabase
 from dotenv import load_dotenv
 
+from models import BatteryStatus
+from metrics import query_timer, caller_name, neo4j_pool_collector, NEO4J_SESSIONS
+from profiling import slow_query_log
+
 # Charger les variables d'environnement
 load_dotenv()
 
-class Neo4jConnection:
-    """Singleton pour gérer la connexion Neo4j"""
+# ============================================
+# CONFIGURATION DU DRIVER (pool, retry)
+# ============================================
+
+# Base cible (vide = base par défaut du serveur / du cluster)
+NEO4J_DATABASE = os.getenv("NEO4J_DATABASE") or None
+
+
+def driver_config() -> dict:
+    """
+    Options du driver Neo4j lues dans l'environnement:
+    - NEO4J_MAX_POOL_SIZE: connexions max par serveur (défaut driver: 100)
+    - NEO4J_ACQUISITION_TIMEOUT: attente max d'une connexion du pool (s)
+    - NEO4J_MAX_CONNECTION_LIFETIME: durée de vie max d'une connexion (s)
+    - NEO4J_MAX_RETRY_TIME: durée max des rejeux d'une transaction gérée (s),
+      avec backoff exponentiel du driver sur les erreurs transitoires
+    """
+    return {
+        "max_connection_pool_size": int(os.getenv("NEO4J_MAX_POOL_SIZE", 100)),
+        "connection_acquisition_timeout": float(os.getenv("NEO4J_ACQUISITION_TIMEOUT", 60)),
+        "max_connection_lifetime": float(os.getenv("NEO4J_MAX_CONNECTION_LIFETIME", 3600)),
+        "max_transaction_retry_time": float(os.getenv("NEO4J_MAX_RETRY_TIME", 30)),
+    }
+
+
+def summarize_counters(summary) -> dict:
+    """Compteurs d'une requête d'écriture"""
+    return {
+        "nodes_created": summary.counters.nodes_created,
+        "nodes_deleted": summary.counters.nodes_deleted,
+        "relationships_created": summary.counters.relationships_created,
+        "properties_set": summary.counters.properties_set,
+        "labels_added": summary.counters.labels_added,
+        "labels_removed": summary.counters.labels_removed,
+        "constraints_added": summary.counters.constraints_added,
+        "indexes_added": summary.counters.indexes_added
+    }
+
+
+class AsyncNeo4jConnection:
+    """Singleton pour la connexion Neo4j asynchrone (routes FastAPI)"""
     
     _instance = None
     _driver = None
@@ -28,58 +75,122 @@ class Neo4jConnection:
             user = os.getenv("NEO4J_USER")
             password = os.getenv("NEO4J_PASSWORD")
             
-            try:
-                self._driver = GraphDatabase.driver(uri, auth=(user, password))
-                # Test de connexion
-                self._driver.verify_connectivity()
-                print(f"✅ Connecté à Neo4j: {uri}")
-            except Exception as e:
-                print(f"❌ Erreur connexion Neo4j: {e}")
-                raise
+            # La connexion réelle est vérifiée au démarrage (lifespan)
+            self._uri = uri
+            self._profile_tasks = set()
+            self._driver = AsyncGraphDatabase.driver(uri, auth=(user, password), **driver_config())
+            neo4j_pool_collector.register("async", self._driver)
     
     @property
     def driver(self):
         return self._driver
     
-    def close(self):
+    async def verify_connectivity(self):
+        """Vérifie la connexion (à appeler depuis la boucle d'événements)"""
+        try:
+            await self._driver.verify_connectivity()
+            print(f"✅ Connecté à Neo4j (async): {self._uri}")
+        except Exception as e:
+            print(f"❌ Erreur connexion Neo4j (async): {e}")
+            raise
+    
+    async def close(self):
         if self._driver:
-            self._driver.close()
-            print("🔌 Connexion Neo4j fermée")
+            await self._driver.close()
+            print("🔌 Connexion Neo4j (async) fermée")
     
-    @contextmanager
-    def session(self):
-        """Context manager pour les sessions Neo4j"""
-        session = self._driver.session()
+    @asynccontextmanager
+    async def session(self):
+        """
+        Context manager asynchrone pour les sessions Neo4j.
+        Bookmarks partagés: une lecture voit les écritures précédentes
+        du process, même routée vers un follower.
+        """
+        session = self._driver.session(
+            database=NEO4J_DATABASE,
+            bookmark_manager=self._driver.execute_query_bookmark_manager
+        )
+        sessions = NEO4J_SESSIONS.labels("async")
+        sessions.inc()
         try:
             yield session
         finally:
-            session.close()
+            await session.close()
+            sessions.dec()
+    
+    async def execute_query(self, query: str, parameters: dict = None, write: bool = False, name: str = None):
+        """
+        Exécute une requête Cypher dans une transaction gérée et retourne les résultats.
+        Lecture par défaut (routée vers les followers d'un cluster);
+        `write=True` pour une requête qui modifie le graphe.
+        Les erreurs transitoires sont rejouées par le driver (NEO4J_MAX_RETRY_TIME).
+        `name` étiquette les métriques et le journal des requêtes lentes
+        (défaut: fonction appelante).
+        """
+        name = name or caller_name()
+        mode = "write" if write else "read"
+        
+        async def work(tx):
+            result = await tx.run(query, parameters or {})
+            records = [record.data() async for record in result]
+            return records, await result.consume()
+        
+        started = time.perf_counter()
+        with query_timer(name, mode):
+            async with self.session() as session:
+                if write:
+                    records, summary = await session.execute_write(work)
+                else:
+                    records, summary = await session.execute_read(work)
+        self._observe(name, query, parameters, mode, started, len(records), summary)
+        return records
     
-    def execute_query(self, query: str, parameters: dict = None):
-        """Exécute une requête Cypher et retourne les résultats"""
-        with self.session() as session:
-            result = session.run(query, parameters or {})
-            return [record.data() for record in result]
+    async def execute_write(self, query: str, parameters: dict = None, name: str = None):
+        """Exécute une requête d'écriture (CREATE, UPDATE, DELETE) et retourne les compteurs"""
+        name = name or caller_name()
+        
+        async def work(tx):
+            result = await tx.run(query, parameters or {})
+            return await result.consume()
+        
+        started = time.perf_counter()
+        with query_timer(name, "write"):
+            async with self.session() as session:
+                summary = await session.execute_write(work)
+        self._observe(name, query, parameters, "write", started, 0, summary)
+        return summarize_counters(summary)
     
-    def execute_write(self, query: str, parameters: dict = None):
-        """Exécute une requête d'écriture (CREATE, UPDATE, DELETE)"""
-        with self.session() as session:
-            result = session.run(query, parameters or {})
-            summary = result.consume()
-            return {
-                "nodes_created": summary.counters.nodes_created,
-                "nodes_deleted": summary.counters.nodes_deleted,
-                "relationships_created": summary.counters.relationships_created,
-                "properties_set": summary.counters.properties_set
-            }
+    def _observe(self, name: str, query: str, parameters: dict, mode: str, started: float, rows: int, summary):
+        """Journal des requêtes lentes (QUERY_PROFILING) et rejeu PROFILE échantillonné"""
+        duration_ms = (time.perf_counter() - started) * 1000
+        entry = slow_query_log.record(name, query, parameters, mode, duration_ms, rows, summary)
+        if entry is not None and slow_query_log.should_profile(entry):
+            # Rejeu en tâche de fond: la réponse n'attend pas le profilage
+            task = asyncio.create_task(self._profile(entry, query, parameters))
+            self._profile_tasks.add(task)
+            task.add_done_callback(self._profile_tasks.discard)
+    
+    async def _profile(self, entry: dict, query: str, parameters: dict):
+        """Rejoue une lecture avec PROFILE et garde son plan (db hits) dans le journal"""
+        async def work(tx):
+            result = await tx.run("PROFILE " + query, parameters or {})
+            return await result.consume()
+        
+        try:
+            async with self.session() as session:
+                summary = await session.execute_read(work)
+            if summary.profile:
+                slow_query_log.attach_profile(entry, summary.profile)
+        except Exception as e:
+            print(f"⚠️ PROFILE de {entry['name']} échoué: {e}")
 
 
-# Instance globale
-db = Neo4jConnection()
+# Instance globale: connexion asynchrone (routes FastAPI, importer en ligne de commande)
+async_db = AsyncNeo4jConnection()
 
 
-# Fonctions utilitaires pour les requêtes courantes
-def get_battery_by_id(battery_id: str):
+# Fonctions utilitaires pour les requêtes courantes (asynchrones)
+async def get_battery_by_id(battery_id: str):
     """Récupère une batterie par son ID avec toutes ses relations"""
     query = """
     MATCH (b:BatteryInstance {batteryId: $battery_id})
@@ -90,11 +201,48 @@ def get_battery_by_id(battery_id: str):
     OPTIONAL MATCH (b)-[:HAS_STATUS]->(s:Status)
     RETURN b, m, c, t, comp, s
     """
-    results = db.execute_query(query, {"battery_id": battery_id})
+    results = await async_db.execute_query(query, {"battery_id": battery_id})
     return results[0] if results else None
 
 
-def get_battery_modules(battery_id: str):
+async def battery_exists(battery_id: str) -> bool:
+    """Vérifie l'existence d'une batterie (lecture d'index, sans relations)"""
+    query = """
+    MATCH (b:BatteryInstance {batteryId: $battery_id})
+    RETURN count(b) > 0 AS exists
+    """
+    results = await async_db.execute_query(query, {"battery_id": battery_id})
+    return bool(results and results[0]["exists"])
+
+
+async def find_battery_ids(battery_ids: list = None, status: str = None, limit: int = None):
+    """
+    Vérifie un lot de batteries en une requête: retourne les batteryId
+    existants parmi `battery_ids` et/ou ayant le statut `status`.
+    """
+    parameters = {}
+    filters = []
+    if battery_ids is not None:
+        filters.append("b.batteryId IN $battery_ids")
+        parameters["battery_ids"] = battery_ids
+    if status:
+        filters.append("b.status = $status")
+        parameters["status"] = status
+    
+    query = f"""
+    MATCH (b:BatteryInstance)
+    {"WHERE " + " AND ".join(filters) if filters else ""}
+    RETURN b.batteryId AS batteryId
+    ORDER BY b.batteryId
+    {"LIMIT $limit" if limit else ""}
+    """
+    if limit:
+        parameters["limit"] = limit
+    results = await async_db.execute_query(query, parameters)
+    return [row["batteryId"] for row in results]
+
+
+async def get_battery_modules(battery_id: str):
     """Récupère tous les modules d'une batterie"""
     query = """
     MATCH (b:BatteryInstance {batteryId: $battery_id})-[:HAS_MODULE]->(m:Module)
@@ -107,47 +255,777 @@ def get_battery_modules(battery_id: str):
            CASE WHEN m.internalResistance > m.maxResistance THEN true ELSE false END AS isDefective
     ORDER BY m.moduleId
     """
-    return db.execute_query(query, {"battery_id": battery_id})
+    return await async_db.execute_query(query, {"battery_id": battery_id})
 
 
-def update_battery_status(battery_id: str, new_status: str):
-    """Change le statut d'une batterie"""
+async def get_battery_with_modules(battery_id: str):
+    """
+    Récupère une batterie, ses relations et ses modules en une seule requête.
+    Même forme que get_battery_by_id, avec une clé "modules" en plus
+    (même forme que get_battery_modules).
+    """
     query = """
-    MATCH (b:BatteryInstance {batteryId: $battery_id})-[r:HAS_STATUS]->()
-    DELETE r
-    WITH b
-    MATCH (s:Status {name: $new_status})
-    CREATE (b)-[:HAS_STATUS]->(s)
-    SET b.status = $new_status
-    RETURN b.batteryId AS batteryId, b.status AS status
+    MATCH (b:BatteryInstance {batteryId: $battery_id})
+    OPTIONAL MATCH (b)-[:HAS_MODEL]->(m:Model)
+    OPTIONAL MATCH (m)-[:MANUFACTURED_BY]->(c:Company)
+    OPTIONAL MATCH (m)-[:HAS_TYPE]->(t:Type)
+    OPTIONAL MATCH (m)-[:HAS_COMPOSITION]->(comp:Composition)
+    OPTIONAL MATCH (b)-[:HAS_STATUS]->(s:Status)
+    CALL {
+        WITH b
+        OPTIONAL MATCH (b)-[:HAS_MODULE]->(mod:Module)
+        WITH mod
+        ORDER BY mod.moduleId
+        RETURN collect(mod {
+            .moduleId,
+            .internalResistance,
+            .maxResistance,
+            .voltage,
+            .temperature,
+            .soh,
+            isDefective: CASE WHEN mod.internalResistance > mod.maxResistance THEN true ELSE false END
+        }) AS modules
+    }
+    RETURN b, m, c, t, comp, s, modules
     """
-    return db.execute_query(query, {"battery_id": battery_id, "new_status": new_status})
+    results = await async_db.execute_query(query, {"battery_id": battery_id})
+    return results[0] if results else None
+
+
+async def get_decision_inputs(battery_ids: list = None, status: str = None, market_demand: str = "normal"):
+    """
+    Critères de décision agrégés pour un lot de batteries, en une requête:
+    SOH moyen, modules défaillants, ratio de résistance moyen,
+    date de fabrication, composition, dates de télémétrie des modules
+    et décision déjà enregistrée pour cette demande marché.
+    Sélection par liste d'IDs, par statut, ou les deux (intersection).
+    """
+    if battery_ids is not None:
+        match = """
+        UNWIND $battery_ids AS battery_id
+        MATCH (b:BatteryInstance {batteryId: battery_id})
+        WHERE $status IS NULL OR b.status = $status
+        """
+    else:
+        match = """
+        MATCH (b:BatteryInstance {status: $status})
+        """
+    query = match + """
+    OPTIONAL MATCH (b)-[:HAS_MODEL]->(:Model)-[:HAS_COMPOSITION]->(comp:Composition)
+    WITH b, head(collect(comp.id)) AS composition
+    OPTIONAL MATCH (b)-[:HAS_MODULE]->(m:Module)
+    WITH b, composition,
+         count(m) AS moduleCount,
+         avg(coalesce(m.soh, 0)) AS avgSoh,
+         sum(CASE WHEN m.internalResistance > m.maxResistance THEN 1 ELSE 0 END) AS defectiveCount,
+         avg(coalesce(m.internalResistance, 0) / coalesce(m.maxResistance, 1)) AS avgResistanceRatio,
+         collect(toString(m.lastUpdate)) AS lastUpdates,
+         max(m.lastUpdate) AS latestUpdate
+    OPTIONAL MATCH (b)-[:HAS_DECISION]->(d:Decision {marketDemand: $market_demand})
+    RETURN b.batteryId AS batteryId,
+           b.manufacturingDate AS manufacturingDate,
+           composition,
+           moduleCount,
+           avgSoh,
+           defectiveCount,
+           avgResistanceRatio,
+           lastUpdates,
+           latestUpdate,
+           d {.*} AS decision
+    ORDER BY batteryId
+    """
+    return await async_db.execute_query(query, {
+        "battery_ids": battery_ids,
+        "status": status,
+        "market_demand": market_demand
+    })
 
 
-def get_all_batteries():
-    """Liste toutes les batteries avec leur statut"""
+async def save_decisions(decisions: list, market_demand: str):
+    """
+    Enregistre les décisions calculées (une par batterie et demande marché)
+    comme nœuds Decision liés à la batterie. `scores` est sérialisé en JSON.
+    Le MERGE porte sur decisionKey ("batteryId/marketDemand"), sous contrainte
+    d'unicité: deux calculs concurrents mettent à jour le même nœud.
+    """
     query = """
+    UNWIND $decisions AS decision
+    MATCH (b:BatteryInstance {batteryId: decision.batteryId})
+    MERGE (d:Decision {decisionKey: b.batteryId + '/' + $market_demand})
+    ON CREATE SET d.marketDemand = $market_demand
+    MERGE (b)-[:HAS_DECISION]->(d)
+    SET d.recommendation = decision.recommendation,
+        d.confidence = decision.confidence,
+        d.scores = decision.scores,
+        d.reasoning = decision.reasoning,
+        d.fingerprint = decision.fingerprint,
+        d.telemetryAt = decision.latestUpdate,
+        d.computedAt = datetime()
+    """
+    return await async_db.execute_write(query, {"decisions": decisions, "market_demand": market_demand})
+
+
+async def get_stale_decisions(limit: int):
+    """Décisions dont au moins un module a reçu de la télémétrie depuis leur calcul"""
+    query = """
+    MATCH (b:BatteryInstance)-[:HAS_DECISION]->(d:Decision)
+    WHERE EXISTS {
+        MATCH (b)-[:HAS_MODULE]->(m:Module)
+        WHERE m.lastUpdate > d.computedAt
+    }
+    RETURN b.batteryId AS batteryId, d.marketDemand AS marketDemand
+    LIMIT $limit
+    """
+    return await async_db.execute_query(query, {"limit": limit})
+
+
+# Statuts connus: seuls ceux-ci peuvent créer un nœud Status
+BATTERY_STATUSES = [status.value for status in BatteryStatus]
+
+
+async def transition_battery_status(
+    new_status: str,
+    battery_id: str = None,
+    notification_id: str = None,
+    resolved_by: str = None
+):
+    """
+    Change le statut d'une batterie en une seule transaction:
+    lit l'ancien statut, remplace la relation HAS_STATUS et, si
+    `notification_id` est fourni, résout la notification liée.
+    Batterie désignée par `battery_id` et/ou par sa notification.
+    Retourne {batteryId, previousStatus, newStatus, notificationId,
+    notificationWasRead} ou None si la batterie (ou la notification) n'existe pas.
+    ValueError si `new_status` n'est pas un statut connu.
+    """
+    if new_status not in BATTERY_STATUSES:
+        raise ValueError(f"Statut inconnu: {new_status}")
+    
+    if notification_id:
+        match = """
+    MATCH (b:BatteryInstance)-[:HAS_NOTIFICATION]->(n:Notification {notificationId: $notification_id})
+    WHERE $battery_id IS NULL OR b.batteryId = $battery_id
+    """
+    else:
+        match = """
+    MATCH (b:BatteryInstance {batteryId: $battery_id})
+    WITH b, null AS n
+    """
+    query = match + """
+    WITH b, n, b.status AS previousStatus, n.read AS notificationWasRead
+    CALL {
+        WITH b
+        OPTIONAL MATCH (b)-[old:HAS_STATUS]->()
+        DELETE old
+    }
+    MERGE (s:Status {name: $new_status})
+    MERGE (b)-[:HAS_STATUS]->(s)
+    SET b.status = $new_status
+    FOREACH (_ IN CASE WHEN n IS NULL THEN [] ELSE [1] END |
+        SET n.status = 'resolved',
+            n.read = true,
+            n.resolvedAt = datetime(),
+            n.resolvedBy = $resolved_by,
+            n.resolution = 'Statut changé: ' + coalesce(previousStatus, 'None') + ' → ' + $new_status
+    )
+    RETURN b.batteryId AS batteryId,
+           previousStatus,
+           b.status AS newStatus,
+           n.notificationId AS notificationId,
+           notificationWasRead
+    """
+    results = await async_db.execute_query(query, {
+        "battery_id": battery_id,
+        "notification_id": notification_id,
+        "new_status": new_status,
+        "resolved_by": resolved_by
+    }, write=True)
+    return results[0] if results else None
+
+
+async def get_all_batteries(
+    status: str = None,
+    manufacturer: str = None,
+    model: str = None,
+    cursor: str = None,
+    limit: int = None,
+    search: str = None
+):
+    """
+    Liste les batteries avec leur statut, filtrées côté Neo4j.
+    Pagination par clé (keyset) sur batteryId: `cursor` est le dernier
+    batteryId de la page précédente. `search`: préfixe de batteryId (index).
+    """
+    parameters = {}
+    battery_filters = []
+    if status:
+        battery_filters.append("b.status = $status")
+        parameters["status"] = status
+    if search:
+        battery_filters.append("b.batteryId STARTS WITH $search")
+        parameters["search"] = search
+    if cursor:
+        battery_filters.append("b.batteryId > $cursor")
+        parameters["cursor"] = cursor
+    
+    # Filtre fabricant/modèle: le chemin devient obligatoire
+    model_filters = []
+    if manufacturer:
+        model_filters.append("c.name = $manufacturer")
+        parameters["manufacturer"] = manufacturer
+    if model:
+        model_filters.append("m.name = $model")
+        parameters["model"] = model
+    
+    query = f"""
     MATCH (b:BatteryInstance)
-    OPTIONAL MATCH (b)-[:HAS_STATUS]->(s:Status)
-    OPTIONAL MATCH (b)-[:HAS_MODEL]->(m:Model)-[:MANUFACTURED_BY]->(c:Company)
+    {"WHERE " + " AND ".join(battery_filters) if battery_filters else ""}
+    {"MATCH" if model_filters else "OPTIONAL MATCH"} (b)-[:HAS_MODEL]->(m:Model)-[:MANUFACTURED_BY]->(c:Company)
+    {"WHERE " + " AND ".join(model_filters) if model_filters else ""}
     RETURN b.batteryId AS batteryId,
            b.batteryPassportId AS passportId,
            b.status AS status,
            m.name AS modelName,
            c.name AS manufacturer
     ORDER BY b.batteryId
+    {"LIMIT $limit" if limit else ""}
     """
-    return db.execute_query(query)
+    if limit:
+        parameters["limit"] = limit
+    return await async_db.execute_query(query, parameters)
 
 
-def get_defective_modules():
-    """Trouve tous les modules défaillants (résistance > max)"""
-    query = """
-    MATCH (b:BatteryInstance)-[:HAS_MODULE]->(m:Module)
-    WHERE m.internalResistance > m.maxResistance
+async def get_export_page(
+    status: str = None,
+    manufacturer: str = None,
+    cursor: str = None,
+    limit: int = 500
+):
+    """
+    Page d'export: batteries avec modèle, fabricant, composition et modules.
+    Pagination par clé (keyset) sur batteryId, comme get_all_batteries.
+    """
+    parameters = {"limit": limit}
+    battery_filters = []
+    if status:
+        battery_filters.append("b.status = $status")
+        parameters["status"] = status
+    if cursor:
+        battery_filters.append("b.batteryId > $cursor")
+        parameters["cursor"] = cursor
+    
+    query = f"""
+    MATCH (b:BatteryInstance)
+    {"WHERE " + " AND ".join(battery_filters) if battery_filters else ""}
+    {"MATCH" if manufacturer else "OPTIONAL MATCH"} (b)-[:HAS_MODEL]->(m:Model)-[:MANUFACTURED_BY]->(c:Company)
+    {"WHERE c.name = $manufacturer" if manufacturer else ""}
+    WITH b, m, c
+    ORDER BY b.batteryId
+    LIMIT $limit
+    OPTIONAL MATCH (m)-[:HAS_COMPOSITION]->(comp:Composition)
+    CALL {{
+        WITH b
+        OPTIONAL MATCH (b)-[:HAS_MODULE]->(mod:Module)
+        WITH mod
+        ORDER BY mod.moduleId
+        RETURN collect(mod {{
+            .moduleId,
+            .internalResistance,
+            .maxResistance,
+            .voltage,
+            .temperature,
+            .soh,
+            lastUpdate: toString(mod.lastUpdate)
+        }}) AS modules
+    }}
     RETURN b.batteryId AS batteryId,
-           m.moduleId AS moduleId,
-           m.internalResistance AS resistance,
-           m.maxResistance AS maxResistance
+           b.batteryPassportId AS passportId,
+           b.serialNumber AS serialNumber,
+           b.status AS status,
+           toString(b.manufacturingDate) AS manufacturingDate,
+           b.massKg AS massKg,
+           b.carbonFootprint AS carbonFootprint,
+           m.name AS modelName,
+           c.name AS manufacturer,
+           comp.id AS composition,
+           modules
+    ORDER BY batteryId
+    """
+    if manufacturer:
+        parameters["manufacturer"] = manufacturer
+    return await async_db.execute_query(query, parameters)
+
+
+async def import_batteries_batch(records: list):
+    """
+    Importe un lot de batteries (UNWIND) dans une transaction d'écriture gérée.
+    Chaque enregistrement: champs de BatteryImportRecord (dates en ISO 8601).
+    Modèles, fabricants, types, compositions et statuts sont fusionnés (MERGE);
+    les relations modèle/statut d'une batterie existante sont remplacées et
+    ses modules mis à jour en place (même moduleId).
+    """
+    query = """
+    UNWIND $records AS rec
+    MERGE (m:Model {name: rec.modelName})
+    FOREACH (_ IN CASE WHEN rec.manufacturer IS NULL THEN [] ELSE [1] END |
+        MERGE (c:Company {name: rec.manufacturer})
+        MERGE (m)-[:MANUFACTURED_BY]->(c)
+    )
+    FOREACH (_ IN CASE WHEN rec.batteryType IS NULL THEN [] ELSE [1] END |
+        MERGE (t:Type {name: rec.batteryType})
+        MERGE (m)-[:HAS_TYPE]->(t)
+    )
+    FOREACH (_ IN CASE WHEN rec.composition IS NULL THEN [] ELSE [1] END |
+        MERGE (comp:Composition {id: rec.composition})
+        MERGE (m)-[:HAS_COMPOSITION]->(comp)
+    )
+    MERGE (b:BatteryInstance {batteryId: rec.batteryId})
+    SET b.batteryPassportId = rec.batteryPassportId,
+        b.serialNumber = rec.serialNumber,
+        b.status = rec.status,
+        b.manufacturingDate = date(rec.manufacturingDate),
+        b.warrantyPeriod = rec.warrantyPeriod,
+        b.massKg = rec.massKg,
+        b.carbonFootprint = rec.carbonFootprint
+    WITH rec, m, b
+    CALL {
+        WITH b
+        MATCH (b)-[old:HAS_MODEL|HAS_STATUS]->()
+        DELETE old
+    }
+    MERGE (b)-[:HAS_MODEL]->(m)
+    MERGE (s:Status {name: rec.status})
+    MERGE (b)-[:HAS_STATUS]->(s)
+    WITH rec, b
+    CALL {
+        // Modules existants retrouvés par la relation HAS_MODULE (ils n'ont pas
+        // forcément de batteryId), créés seulement s'ils n'existent pas
+        WITH rec, b
+        UNWIND rec.modules AS mod
+        OPTIONAL MATCH (b)-[:HAS_MODULE]->(found:Module {moduleId: mod.moduleId})
+        WITH rec, b, mod, count(found) AS existing
+        FOREACH (_ IN CASE WHEN existing = 0 THEN [1] ELSE [] END |
+            CREATE (b)-[:HAS_MODULE]->(:Module {batteryId: rec.batteryId, moduleId: mod.moduleId})
+        )
+        WITH rec, b, mod
+        MATCH (b)-[:HAS_MODULE]->(x:Module {moduleId: mod.moduleId})
+        SET x += mod, x.batteryId = rec.batteryId, x.lastUpdate = datetime()
+        FOREACH (_ IN CASE WHEN mod.internalResistance > mod.maxResistance THEN [1] ELSE [] END | SET x:Defective)
+        FOREACH (_ IN CASE WHEN mod.internalResistance > mod.maxResistance THEN [] ELSE [1] END | REMOVE x:Defective)
+        RETURN count(x) AS modules
+    }
+    RETURN count(b) AS batteries
+    """
+    return await async_db.execute_write(query, {"records": records})
+
+
+# Projection commune des notifications (n, b = batterie)
+NOTIFICATION_FIELDS = """n.notificationId AS notificationId,
+           b.batteryId AS batteryId,
+           n.message AS message,
+           n.senderRole AS senderRole,
+           n.senderName AS senderName,
+           n.urgency AS urgency,
+           toString(n.createdAt) AS createdAt,
+           n.read AS read,
+           n.status AS status"""
+# Même projection en map, avec la clé de tri (createdAt en nanosecondes epoch)
+NOTIFICATION_MAP = """n {.notificationId, batteryId: b.batteryId, .message, .senderRole, .senderName,
+        .urgency, createdAt: toString(n.createdAt), .read, .status,
+        sortKey: n.createdAt.epochSeconds * 1000000000 + n.createdAt.nanosecond}"""
+
+
+def encode_notification_cursor(created_at: str, notification_id: str) -> str:
+    """Curseur opaque (createdAt, notificationId) pour la pagination des notifications"""
+    raw = f"{created_at}|{notification_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def decode_notification_cursor(cursor: str):
+    """
+    Décode un curseur de notification -> (createdAt, notificationId).
+    ValueError si le curseur ou sa date est invalide (sinon erreur Neo4j dans datetime()).
+    """
+    created_at, notification_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|", 1)
+    # Date ISO 8601, fuseau nommé éventuel ([Europe/Paris]) ignoré pour la vérification
+    datetime.fromisoformat(created_at.split("[", 1)[0])
+    return created_at, notification_id
+
+
+async def get_notifications(
+    unread_only: bool = False,
+    battery_id: str = None,
+    urgency: str = None,
+    since: str = None,
+    cursor: str = None,
+    limit: int = None
+):
+    """
+    Liste les notifications (plus récentes d'abord), filtrées côté Neo4j.
+    Pagination par clé sur (createdAt, notificationId): `cursor` vient de
+    encode_notification_cursor. `since` (ISO 8601) ne renvoie que les
+    notifications créées après cette date (polling incrémental).
+    """
+    parameters = {}
+    filters = []
+    if unread_only:
+        filters.append("n.read = false")
+    if battery_id:
+        filters.append("b.batteryId = $battery_id")
+        parameters["battery_id"] = battery_id
+    if urgency:
+        filters.append("n.urgency = $urgency")
+        parameters["urgency"] = urgency
+    if since:
+        filters.append("n.createdAt > datetime($since)")
+        parameters["since"] = since
+    if cursor:
+        cursor_created_at, cursor_id = decode_notification_cursor(cursor)
+        filters.append(
+            "(n.createdAt < datetime($cursor_created_at) OR "
+            "(n.createdAt = datetime($cursor_created_at) AND n.notificationId < $cursor_id))"
+        )
+        parameters["cursor_created_at"] = cursor_created_at
+        parameters["cursor_id"] = cursor_id
+    
+    query = f"""
+    MATCH (b:BatteryInstance)-[:HAS_NOTIFICATION]->(n:Notification)
+    {"WHERE " + " AND ".join(filters) if filters else ""}
+    RETURN {NOTIFICATION_FIELDS}
+    ORDER BY n.createdAt DESC, n.notificationId DESC
+    {"LIMIT $limit" if limit else ""}
+    """
+    if limit:
+        parameters["limit"] = limit
+    return await async_db.execute_query(query, parameters)
+
+
+async def get_recent_notifications(limit: int):
+    """
+    Les `limit` notifications les plus récentes (NOTIFICATION_MAP)
+    et le nombre total de notifications non lues.
+    """
+    query = f"""
+    CALL {{
+        MATCH (n:Notification)
+        WHERE n.read = false
+        RETURN count(n) AS unreadCount
+    }}
+    CALL {{
+        MATCH (b:BatteryInstance)-[:HAS_NOTIFICATION]->(n:Notification)
+        WITH b, n
+        ORDER BY n.createdAt DESC, n.notificationId DESC
+        LIMIT $limit
+        RETURN collect({NOTIFICATION_MAP}) AS notifications
+    }}
+    RETURN unreadCount, notifications
+    """
+    results = await async_db.execute_query(query, {"limit": limit})
+    return results[0]
+
+
+async def create_notification_node(
+    battery_id: str,
+    notification_id: str,
+    message: str,
+    sender_role: str,
+    sender_name: str,
+    urgency: str
+):
+    """Crée une notification liée à sa batterie (None si la batterie n'existe pas)"""
+    query = f"""
+    MATCH (b:BatteryInstance {{batteryId: $battery_id}})
+    CREATE (n:Notification {{
+        notificationId: $notification_id,
+        message: $message,
+        senderRole: $sender_role,
+        senderName: $sender_name,
+        urgency: $urgency,
+        createdAt: datetime(),
+        read: false,
+        status: 'pending'
+    }})
+    CREATE (b)-[:HAS_NOTIFICATION]->(n)
+    RETURN {NOTIFICATION_MAP} AS notification
+    """
+    results = await async_db.execute_query(query, {
+        "battery_id": battery_id,
+        "notification_id": notification_id,
+        "message": message,
+        "sender_role": sender_role,
+        "sender_name": sender_name,
+        "urgency": urgency
+    }, write=True)
+    return results[0]["notification"] if results else None
+
+
+async def mark_notification_read(notification_id: str):
+    """Marque une notification comme lue. Retourne {wasRead} ou None si absente"""
+    query = """
+    MATCH (n:Notification {notificationId: $notification_id})
+    WITH n, n.read AS wasRead
+    SET n.read = true, n.readAt = datetime()
+    RETURN wasRead
+    """
+    results = await async_db.execute_query(query, {"notification_id": notification_id}, write=True)
+    return results[0] if results else None
+
+
+async def sync_defective_labels():
+    """
+    Aligne le label :Defective sur l'état réel des modules (idempotent).
+    Rattrapage au démarrage: modules écrits hors de l'API ou avant le label.
+    """
+    labeled = await async_db.execute_write("""
+    MATCH (m:Module)
+    WHERE m.internalResistance > m.maxResistance AND NOT m:Defective
+    SET m:Defective
+    """)
+    cleared = await async_db.execute_write("""
+    MATCH (m:Module:Defective)
+    WHERE NOT coalesce(m.internalResistance > m.maxResistance, false)
+    REMOVE m:Defective
+    """)
+    return {"labeled": labeled["labels_added"], "cleared": cleared["labels_removed"]}
+
+
+async def apply_telemetry_batch(frames: list):
+    """
+    Applique un lot de trames de télémétrie en une seule transaction (UNWIND).
+    Chaque trame: {"batteryId": ..., "modules": [...], "timestamp": ISO 8601 ou None}.
+    Les lectures sont aussi ajoutées à la série temporelle du module
+    (ReadingChunk par minute + agrégats Rollup 1 min / 1 h / 1 jour).
+    Retourne une ligne par trame (dans l'ordre) avec l'existence de la batterie
+    et les modules mis à jour, avec l'indicateur de dépassement de seuil
+    avant (wasDefective) et après (isDefective) la mise à jour.
+    """
+    query = """
+    UNWIND $frames AS frame
+    OPTIONAL MATCH (b:BatteryInstance {batteryId: frame.batteryId})
+    CALL {
+        WITH b, frame
+        WITH b, frame, coalesce(datetime(frame.timestamp), datetime()) AS ts
+        UNWIND frame.modules AS mod
+        MATCH (b)-[:HAS_MODULE]->(m:Module {moduleId: mod.moduleId})
+        WITH b, m, mod, ts, coalesce(m.maxResistance, mod.maxResistance) AS threshold
+        WITH b, m, mod, ts, threshold, coalesce(m.internalResistance > threshold, false) AS wasDefective
+        SET m.internalResistance = mod.internalResistance,
+            m.voltage = mod.voltage,
+            m.temperature = mod.temperature,
+            m.soh = mod.soh,
+            m.lastUpdate = datetime()
+        // État défaillant matérialisé (label) dans la même transaction
+        FOREACH (_ IN CASE WHEN m.internalResistance > threshold THEN [1] ELSE [] END | SET m:Defective)
+        FOREACH (_ IN CASE WHEN m.internalResistance > threshold THEN [] ELSE [1] END | REMOVE m:Defective)
+        // Série temporelle: points bruts (tableaux par tranche d'une minute).
+        // Chaque ajout réécrit les tableaux du chunk: des tranches courtes
+        // bornent ce coût au lieu de le faire croître sur toute l'heure
+        WITH b, m, mod, ts, threshold, wasDefective, b.batteryId + '/' + m.moduleId AS series
+        MERGE (chunk:ReadingChunk {series: series, start: datetime.truncate('minute', ts)})
+        ON CREATE SET chunk.ts = [],
+                      chunk.internalResistance = [],
+                      chunk.voltage = [],
+                      chunk.temperature = [],
+                      chunk.soh = []
+        SET chunk.ts = chunk.ts + ts.epochMillis,
+            chunk.internalResistance = chunk.internalResistance + mod.internalResistance,
+            chunk.voltage = chunk.voltage + mod.voltage,
+            chunk.temperature = chunk.temperature + mod.temperature,
+            chunk.soh = chunk.soh + mod.soh
+        MERGE (m)-[:HAS_READINGS]->(chunk)
+        // Agrégats 1 min / 1 h / 1 jour
+        FOREACH (resolution IN ['minute', 'hour', 'day'] |
+            MERGE (r:Rollup {series: series, resolution: resolution, start: datetime.truncate(resolution, ts)})
+            ON CREATE SET r.count = 0,
+                          r.sumInternalResistance = 0.0,
+                          r.minInternalResistance = mod.internalResistance,
+                          r.maxInternalResistance = mod.internalResistance,
+                          r.sumVoltage = 0.0,
+                          r.minVoltage = mod.voltage,
+                          r.maxVoltage = mod.voltage,
+                          r.sumTemperature = 0.0,
+                          r.minTemperature = mod.temperature,
+                          r.maxTemperature = mod.temperature,
+                          r.sumSoh = 0.0,
+                          r.minSoh = mod.soh,
+                          r.maxSoh = mod.soh
+            SET r.count = r.count + 1,
+                r.sumInternalResistance = r.sumInternalResistance + mod.internalResistance,
+                r.minInternalResistance = CASE WHEN mod.internalResistance < r.minInternalResistance THEN mod.internalResistance ELSE r.minInternalResistance END,
+                r.maxInternalResistance = CASE WHEN mod.internalResistance > r.maxInternalResistance THEN mod.internalResistance ELSE r.maxInternalResistance END,
+                r.sumVoltage = r.sumVoltage + mod.voltage,
+                r.minVoltage = CASE WHEN mod.voltage < r.minVoltage THEN mod.voltage ELSE r.minVoltage END,
+                r.maxVoltage = CASE WHEN mod.voltage > r.maxVoltage THEN mod.voltage ELSE r.maxVoltage END,
+                r.sumTemperature = r.sumTemperature + mod.temperature,
+                r.minTemperature = CASE WHEN mod.temperature < r.minTemperature THEN mod.temperature ELSE r.minTemperature END,
+                r.maxTemperature = CASE WHEN mod.temperature > r.maxTemperature THEN mod.temperature ELSE r.maxTemperature END,
+                r.sumSoh = r.sumSoh + mod.soh,
+                r.minSoh = CASE WHEN mod.soh < r.minSoh THEN mod.soh ELSE r.minSoh END,
+                r.maxSoh = CASE WHEN mod.soh > r.maxSoh THEN mod.soh ELSE r.maxSoh END
+            MERGE (m)-[:HAS_ROLLUP]->(r)
+        )
+        RETURN collect({
+            moduleId: m.moduleId,
+            resistance: m.internalResistance,
+            maxResistance: threshold,
+            isDefective: m.internalResistance > threshold,
+            wasDefective: wasDefective
+        }) AS updated
+    }
+    RETURN frame.batteryId AS batteryId, b IS NOT NULL AS batteryExists, updated
+    """
+    return await async_db.execute_query(query, {"frames": frames}, write=True)
+
+
+async def apply_telemetry(battery_id: str, modules: list, timestamp: str = None):
+    """
+    Applique une trame de télémétrie en une seule transaction (UNWIND).
+    Retourne l'existence de la batterie et les modules mis à jour.
+    """
+    results = await apply_telemetry_batch([
+        {"batteryId": battery_id, "modules": modules, "timestamp": timestamp}
+    ])
+    return results[0] if results else {"batteryExists": False, "updated": []}
+
+
+async def get_fleet_stats():
+    """Statistiques globales de la flotte (agrégation complète, une requête)"""
+    query = """
+    MATCH (b:BatteryInstance)
+    WITH b.status AS status, count(*) AS count
+    WITH collect({status: status, count: count}) AS byStatus
+    CALL {
+        MATCH (:BatteryInstance)-[:HAS_MODULE]->(m:Module)
+        RETURN count(m) AS totalModules
+    }
+    CALL {
+        // Label matérialisé: compteur lu directement dans le count store
+        MATCH (m:Defective)
+        RETURN count(m) AS defectiveModules
+    }
+    RETURN byStatus, totalModules, defectiveModules
+    """
+    results = await async_db.execute_query(query)
+    row = results[0] if results else {"byStatus": [], "totalModules": 0, "defectiveModules": 0}
+    by_status = {item["status"]: item["count"] for item in row["byStatus"]}
+    return {
+        "totalBatteries": sum(by_status.values()),
+        "totalModules": row["totalModules"],
+        "defectiveModules": row["defectiveModules"],
+        "byStatus": by_status
+    }
+
+
+# Statuts de la file Waste: signalées par un garagiste, puis validées
+WASTE_QUEUE_STATUSES = ["Signaled As Waste", "Waste"]
+
+
+async def get_owner_dashboard(alerts_limit: int, queue_limit: int):
+    """
+    Partie graphe du tableau de bord Propriétaire, en une requête:
+    les `alerts_limit` modules les plus en surcharge (label :Defective)
+    et la file Waste (taille totale + `queue_limit` premières batteries,
+    avec leur dernière notification en attente).
+    """
+    query = """
+    CALL {
+        MATCH (b:BatteryInstance)-[:HAS_MODULE]->(m:Module:Defective)
+        WITH b, m, round((m.internalResistance / m.maxResistance) * 100) AS overloadPercent
+        ORDER BY overloadPercent DESC
+        LIMIT $alerts_limit
+        RETURN collect({
+            batteryId: b.batteryId,
+            batteryStatus: b.status,
+            moduleId: m.moduleId,
+            resistance: m.internalResistance,
+            maxResistance: m.maxResistance,
+            temperature: m.temperature,
+            soh: m.soh,
+            overloadPercent: overloadPercent
+        }) AS alerts
+    }
+    CALL {
+        MATCH (b:BatteryInstance)
+        WHERE b.status IN $statuses
+        RETURN count(b) AS wasteQueueSize
+    }
+    CALL {
+        MATCH (b:BatteryInstance)
+        WHERE b.status IN $statuses
+        WITH b
+        ORDER BY b.batteryId
+        LIMIT $queue_limit
+        CALL {
+            WITH b
+            OPTIONAL MATCH (b)-[:HAS_NOTIFICATION]->(n:Notification {status: 'pending'})
+            WITH n
+            ORDER BY n.createdAt DESC
+            LIMIT 1
+            RETURN n
+        }
+        RETURN collect({
+            batteryId: b.batteryId,
+            passportId: b.batteryPassportId,
+            status: b.status,
+            defectiveModules: size([(b)-[:HAS_MODULE]->(x:Defective) | x]),
+            pendingNotificationId: n.notificationId,
+            reportedAt: toString(n.createdAt)
+        }) AS wasteQueue
+    }
+    RETURN alerts, wasteQueueSize, wasteQueue
+    """
+    results = await async_db.execute_query(query, {
+        "alerts_limit": alerts_limit,
+        "queue_limit": queue_limit,
+        "statuses": WASTE_QUEUE_STATUSES
+    })
+    return results[0]
+
+
+async def get_sorting_dashboard(queue_limit: int, market_demand: str = "normal"):
+    """
+    Partie graphe du tableau de bord Centre de tri, en une requête:
+    batteries Waste à traiter (taille totale + `queue_limit` premières)
+    avec leur SOH moyen et la décision enregistrée pour `market_demand`.
+    """
+    query = """
+    CALL {
+        MATCH (b:BatteryInstance {status: 'Waste'})
+        RETURN count(b) AS queueSize
+    }
+    CALL {
+        MATCH (b:BatteryInstance {status: 'Waste'})
+        WITH b
+        ORDER BY b.batteryId
+        LIMIT $queue_limit
+        OPTIONAL MATCH (b)-[:HAS_MODEL]->(model:Model)-[:MANUFACTURED_BY]->(c:Company)
+        OPTIONAL MATCH (b)-[:HAS_DECISION]->(d:Decision {marketDemand: $market_demand})
+        CALL {
+            WITH b
+            OPTIONAL MATCH (b)-[:HAS_MODULE]->(m:Module)
+            RETURN count(m) AS moduleCount,
+                   avg(m.soh) AS avgSoh,
+                   count(CASE WHEN m:Defective THEN 1 END) AS defectiveModules
+        }
+        RETURN collect({
+            batteryId: b.batteryId,
+            passportId: b.batteryPassportId,
+            modelName: model.name,
+            manufacturer: c.name,
+            moduleCount: moduleCount,
+            avgSoh: round(avgSoh * 100) / 100,
+            defectiveModules: defectiveModules,
+            decision: CASE WHEN d IS NULL THEN null ELSE {
+                recommendation: d.recommendation,
+                confidence: d.confidence,
+                computedAt: toString(d.computedAt)
+            } END
+        }) AS queue
+    }
+    RETURN queueSize, queue
     """
-    return db.execute_query(query)
\ No newline at end of file
+    results = await async_db.execute_query(query, {
+        "queue_limit": queue_limit,
+        "market_demand": market_demand
+    })
+    return results[0]
@@ -0,0 +1,305 @@
+"""
+Moteur de décision du Centre de tri (Défi #3)
+Scoring Recycle / Reuse / Remanufacture / Repurpose vectorisé (NumPy):
+N batteries sont évaluées en une passe à partir de tableaux de critères.
+Les décisions sont enregistrées dans Neo4j et ne sont recalculées
+que si leurs entrées ont changé
+"""
+
+import os
+import json
+import asyncio
+import hashlib
+from datetime import date
+
+import numpy as np
+
+from database import get_decision_inputs, save_decisions, get_stale_decisions
+
+
+# ============================================
+# BARÈMES
+# ============================================
+
+# Ordre des colonnes de score (départage identique à max() sur le dict historique)
+DECISIONS = ["Recycle", "Reuse", "Remanufacture", "Repurpose"]
+
+# Chaque barème: une ligne par tranche, une colonne par décision (ordre DECISIONS)
+
+# 1. SOH (40% du poids): >= 80, >= 60, >= 40, < 40
+SOH_POINTS = np.array([
+    [0, 40, 0, 30],
+    [0, 20, 30, 35],
+    [25, 0, 35, 20],
+    [40, 0, 15, 0],
+])
+
+# 2. Modules défaillants (25% du poids): 0, 1-2, > 2
+DEFECTIVE_POINTS = np.array([
+    [0, 25, 0, 20],
+    [0, 0, 25, 15],
+    [25, 0, 0, 0],
+])
+
+# 3. Âge (15% du poids): <= 24 mois, <= 48 mois, > 48 mois
+AGE_POINTS = np.array([
+    [0, 15, 0, 10],
+    [0, 0, 10, 15],
+    [15, 0, 10, 0],
+])
+
+# 4. Chimie (10% du poids): autre, LFP (plus durable), NMC811/NCA (matériaux précieux)
+CHEMISTRY_CODES = {"LFP": 1, "NMC811": 2, "NCA": 2}
+CHEMISTRY_POINTS = np.array([
+    [0, 0, 0, 0],
+    [0, 10, 0, 8],
+    [10, 0, 0, 0],
+])
+
+# 5. Demande marché (10% du poids): normale (ou inconnue), haute, basse
+DEMAND_CODES = {"high": 1, "low": 2}
+DEMAND_POINTS = np.array([
+    [0, 0, 5, 5],
+    [0, 10, 0, 8],
+    [10, 0, 0, 0],
+])
+
+# Âge par défaut si la date de fabrication est inconnue
+DEFAULT_AGE_MONTHS = 24
+
+# Chimie par défaut si la composition est inconnue
+DEFAULT_CHEMISTRY = "NMC"
+
+# À incrémenter quand les barèmes changent (invalide les décisions enregistrées)
+DECISION_ENGINE_VERSION = "1"
+
+# Balayage des décisions périmées (secondes, nombre de batteries par passe)
+DECISION_SWEEP_INTERVAL = int(os.getenv("DECISION_SWEEP_INTERVAL", 300))
+DECISION_SWEEP_BATCH = int(os.getenv("DECISION_SWEEP_BATCH", 500))
+
+# Nombre maximum de batteries par décision en masse (même plafond que la liste d'IDs)
+DECISION_BATCH_MAX = int(os.getenv("DECISION_BATCH_MAX", 5000))
+
+
+# ============================================
+# ENCODAGE DES CRITÈRES
+# ============================================
+
+def age_in_months(manufacturing_dates, today: date = None) -> np.ndarray:
+    """Âge en mois (année/mois, sans les jours) depuis des dates Neo4j ou Python"""
+    today = today or date.today()
+    years = np.array([getattr(d, "year", -1) if d else -1 for d in manufacturing_dates])
+    months = np.array([getattr(d, "month", -1) if d else -1 for d in manufacturing_dates])
+    ages = (today.year - years) * 12 + (today.month - months)
+    return np.where(years < 0, DEFAULT_AGE_MONTHS, ages)
+
+
+def encode_chemistry(chemistries) -> np.ndarray:
+    return np.array([CHEMISTRY_CODES.get(c, 0) for c in chemistries], dtype=int)
+
+
+def encode_demand(demands) -> np.ndarray:
+    return np.array([DEMAND_CODES.get(d, 0) for d in demands], dtype=int)
+
+
+# ============================================
+# SCORING VECTORISÉ
+# ============================================
+
+def score_batch(avg_soh, age_months, defective_count, resistance_ratio, chemistry_code, demand_code) -> np.ndarray:
+    """
+    Calcule la matrice de scores (N x 4, colonnes DECISIONS).
+    Le ratio de résistance est accepté pour la forme du vecteur de critères
+    mais n'entre pas dans le barème actuel.
+    """
+    avg_soh = np.asarray(avg_soh, dtype=float)
+    age_months = np.asarray(age_months)
+    defective_count = np.asarray(defective_count)
+    
+    soh_bucket = np.select([avg_soh >= 80, avg_soh >= 60, avg_soh >= 40], [0, 1, 2], default=3)
+    defective_bucket = np.select([defective_count == 0, defective_count <= 2], [0, 1], default=2)
+    age_bucket = np.select([age_months <= 24, age_months <= 48], [0, 1], default=2)
+    
+    return (
+        SOH_POINTS[soh_bucket]
+        + DEFECTIVE_POINTS[defective_bucket]
+        + AGE_POINTS[age_bucket]
+        + CHEMISTRY_POINTS[np.asarray(chemistry_code)]
+        + DEMAND_POINTS[np.asarray(demand_code)]
+    )
+
+
+def _reasoning(avg_soh: float, defective_count: int, age_months: int, chemistry: str, market_demand: str) -> str:
+    """Justification lisible d'une recommandation"""
+    reasons = []
+    if avg_soh < 60:
+        reasons.append(f"SOH moyen faible ({avg_soh:.1f}%)")
+    if defective_count > 0:
+        reasons.append(f"{defective_count} module(s) défaillant(s)")
+    if age_months > 36:
+        reasons.append(f"Batterie âgée ({age_months} mois)")
+    if chemistry == "LFP":
+        reasons.append("Chimie LFP favorable au réemploi")
+    if market_demand == "high":
+        reasons.append("Forte demande marché")
+    return ", ".join(reasons) if reasons else "Paramètres dans les normes"
+
+
+def recommend_batch(
+    battery_ids,
+    avg_soh,
+    age_months,
+    defective_count,
+    resistance_ratio,
+    chemistry,
+    market_demand
+) -> list:
+    """
+    Recommande une décision pour N batteries.
+    `chemistry` et `market_demand` sont des séquences de chaînes (NMC, LFP... / low, normal, high).
+    Retourne une liste de dicts au format DecisionRecommendation.
+    """
+    scores = score_batch(
+        avg_soh,
+        age_months,
+        defective_count,
+        resistance_ratio,
+        encode_chemistry(chemistry),
+        encode_demand(market_demand)
+    )
+    best = scores.argmax(axis=1)
+    confidence = scores[np.arange(len(best)), best]
+    
+    return [
+        {
+            "batteryId": battery_ids[i],
+            "recommendation": DECISIONS[best[i]],
+            "confidence": int(confidence[i]),
+            "scores": {name: int(value) for name, value in zip(DECISIONS, scores[i])},
+            "reasoning": _reasoning(
+                float(avg_soh[i]), int(defective_count[i]), int(age_months[i]),
+                chemistry[i], market_demand[i]
+            )
+        }
+        for i in range(len(best))
+    ]
+
+
+def recommend_from_inputs(rows: list, market_demand: str = "normal") -> list:
+    """
+    Recommandations à partir de lignes de critères (voir get_decision_inputs):
+    batteryId, avgSoh, defectiveCount, avgResistanceRatio, manufacturingDate, composition.
+    """
+    if not rows:
+        return []
+    return recommend_batch(
+        [row["batteryId"] for row in rows],
+        np.array([row["avgSoh"] for row in rows], dtype=float),
+        age_in_months([row.get("manufacturingDate") for row in rows]),
+        np.array([row["defectiveCount"] for row in rows], dtype=int),
+        np.array([row["avgResistanceRatio"] for row in rows], dtype=float),
+        [row.get("composition") or DEFAULT_CHEMISTRY for row in rows],
+        [market_demand] * len(rows)
+    )
+
+
+# ============================================
+# DÉCISIONS ENREGISTRÉES (NEO4J)
+# ============================================
+
+def input_fingerprint(last_updates: list, market_demand: str, today: date = None) -> str:
+    """
+    Empreinte des entrées d'une décision: dates de télémétrie des modules,
+    demande marché et mois courant (granularité de l'âge en mois).
+    """
+    today = today or date.today()
+    payload = "|".join([
+        DECISION_ENGINE_VERSION,
+        market_demand,
+        today.strftime("%Y-%m"),
+        *sorted(last_updates)
+    ])
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _stored_result(battery_id: str, stored: dict) -> dict:
+    """Décision enregistrée -> format DecisionRecommendation"""
+    return {
+        "batteryId": battery_id,
+        "recommendation": stored["recommendation"],
+        "confidence": stored["confidence"],
+        "scores": json.loads(stored["scores"]),
+        "reasoning": stored["reasoning"]
+    }
+
+
+async def decide_batteries(
+    battery_ids: list = None,
+    status: str = None,
+    market_demand: str = "normal",
+    force: bool = False
+) -> dict:
+    """
+    Décisions pour un lot de batteries (IDs ou statut).
+    Réutilise les décisions enregistrées dont l'empreinte est inchangée,
+    calcule les autres en une passe et les enregistre en une transaction.
+    Retourne {"rows": critères lus, "results": décisions, "cached": IDs réutilisés}.
+    """
+    rows = await get_decision_inputs(battery_ids, status, market_demand)
+    
+    results = {}
+    cached = set()
+    stale = []
+    for row in rows:
+        if row["moduleCount"] == 0:
+            continue
+        row["fingerprint"] = input_fingerprint(row["lastUpdates"], market_demand)
+        stored = row.get("decision")
+        if not force and stored and stored.get("fingerprint") == row["fingerprint"]:
+            results[row["batteryId"]] = _stored_result(row["batteryId"], stored)
+            cached.add(row["batteryId"])
+        else:
+            stale.append(row)
+    
+    computed = recommend_from_inputs(stale, market_demand)
+    if computed:
+        await save_decisions([
+            {
+                **result,
+                "scores": json.dumps(result["scores"]),
+                "fingerprint": row["fingerprint"],
+                "latestUpdate": row["latestUpdate"]
+            }
+            for row, result in zip(stale, computed)
+        ], market_demand)
+        results.update({result["batteryId"]: result for result in computed})
+    
+    return {
+        "rows": rows,
+        "results": [results[row["batteryId"]] for row in rows if row["batteryId"] in results],
+        "cached": cached
+    }
+
+
+async def sweep_stale_decisions(limit: int = DECISION_SWEEP_BATCH) -> int:
+    """Recalcule les décisions des batteries ayant reçu de la télémétrie depuis"""
+    stale = await get_stale_decisions(limit)
+    by_demand = {}
+    for row in stale:
+        by_demand.setdefault(row["marketDemand"], []).append(row["batteryId"])
+    
+    for market_demand, battery_ids in by_demand.items():
+        await decide_batteries(battery_ids, market_demand=market_demand, force=True)
+    return len(stale)
+
+
+async def run_decision_sweeper(interval: int = DECISION_SWEEP_INTERVAL):
+    """Boucle de fond: balayage des décisions périmées toutes les `interval` secondes"""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            recomputed = await sweep_stale_decisions()
+            if recomputed:
+                print(f"🎯 {recomputed} décision(s) recalculée(s)")
+        except Exception as e:
+            print(f"⚠️ Balayage des décisions échoué: {e}")
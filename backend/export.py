@@ -0,0 +1,146 @@
+"""
+Export de la flotte - CSV / Parquet en streaming
+Parcourt le graphe page par page (keyset sur batteryId) et émet
+une ligne par module, à mémoire constante
+"""
+
+import os
+import csv
+from io import StringIO, BytesIO
+
+from database import get_export_page
+
+# Parquet optionnel (pyarrow)
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+
+# Batteries lues par requête Neo4j (= un row group Parquet)
+EXPORT_PAGE_SIZE = int(os.getenv("EXPORT_PAGE_SIZE", 500))
+
+# Colonnes de l'export: batterie (répétée) + module
+BATTERY_COLUMNS = [
+    "batteryId",
+    "passportId",
+    "serialNumber",
+    "status",
+    "manufacturingDate",
+    "massKg",
+    "carbonFootprint",
+    "modelName",
+    "manufacturer",
+    "composition",
+]
+MODULE_COLUMNS = [
+    "moduleId",
+    "internalResistance",
+    "maxResistance",
+    "voltage",
+    "temperature",
+    "soh",
+    "lastUpdate",
+]
+EXPORT_COLUMNS = BATTERY_COLUMNS + MODULE_COLUMNS
+
+# Schéma Parquet (colonnes typées)
+PARQUET_SCHEMA = pa.schema(
+    [(name, pa.string()) for name in BATTERY_COLUMNS[:5]]
+    + [("massKg", pa.float64()), ("carbonFootprint", pa.float64())]
+    + [(name, pa.string()) for name in BATTERY_COLUMNS[7:]]
+    + [("moduleId", pa.string())]
+    + [(name, pa.float64()) for name in MODULE_COLUMNS[1:6]]
+    + [("lastUpdate", pa.string())]
+) if pa else None
+
+
+def parquet_available() -> bool:
+    return pa is not None
+
+
+def flatten_page(batteries: list) -> list:
+    """Une ligne par module (une ligne sans module pour les batteries vides)"""
+    rows = []
+    for battery in batteries:
+        base = {name: battery.get(name) for name in BATTERY_COLUMNS}
+        modules = battery.get("modules") or [{}]
+        for module in modules:
+            row = dict(base)
+            for name in MODULE_COLUMNS:
+                row[name] = module.get(name)
+            rows.append(row)
+    return rows
+
+
+async def iter_export_pages(
+    status: str = None,
+    manufacturer: str = None,
+    first_page: list = None,
+    page_size: int = EXPORT_PAGE_SIZE
+):
+    """
+    Itère sur les pages de batteries.
+    `first_page` permet de réutiliser une page déjà lue (erreurs remontées
+    avant l'envoi des en-têtes HTTP).
+    """
+    page = first_page
+    if page is None:
+        page = await get_export_page(status, manufacturer, None, page_size)
+    while page:
+        yield page
+        if len(page) < page_size:
+            return
+        page = await get_export_page(status, manufacturer, page[-1]["batteryId"], page_size)
+
+
+async def stream_csv(pages):
+    """Émet l'en-tête puis un bloc CSV encodé par page"""
+    buffer = StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_COLUMNS)
+    writer.writeheader()
+    async for page in pages:
+        writer.writerows(flatten_page(page))
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    # Export vide: l'en-tête seul
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+class _DrainableSink(BytesIO):
+    """
+    Tampon d'écriture Parquet vidé après chaque row group.
+    tell() renvoie la position absolue dans le fichier (offsets du pied).
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._drained = 0
+
+    def tell(self) -> int:
+        return self._drained + super().tell()
+
+    def drain(self) -> bytes:
+        data = self.getvalue()
+        self._drained += len(data)
+        self.seek(0)
+        self.truncate()
+        return data
+
+
+async def stream_parquet(pages):
+    """Émet un row group Parquet par page (le pied de fichier en dernier)"""
+    sink = _DrainableSink()
+    writer = pq.ParquetWriter(sink, PARQUET_SCHEMA)
+    try:
+        async for page in pages:
+            table = pa.Table.from_pylist(flatten_page(page), schema=PARQUET_SCHEMA)
+            writer.write_table(table)
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
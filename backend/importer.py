@@ -0,0 +1,227 @@
+"""
+Import en masse des passeports - CSV / JSONL
+Valide les enregistrements BatteryImportRecord au fil de l'eau et les
+écrit par lots UNWIND (transactions d'écriture gérées)
+
+Utilisable depuis l'API (POST /battery/import) ou en ligne de commande:
+    cd backend && python importer.py catalogue.csv --batch-size 1000
+"""
+
+import os
+import csv
+import json
+import time
+import asyncio
+import argparse
+
+from pydantic import ValidationError
+
+from models import BatteryImportRecord, ImportFormat
+from database import async_db, import_batteries_batch
+from stats import fleet_stats
+
+
+# Batteries par transaction UNWIND
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", 1000))
+
+# Nombre maximum d'erreurs de ligne renvoyées dans le rapport
+MAX_REPORTED_ERRORS = 100
+
+# Colonnes CSV des modules (une ligne par module, batterie répétée)
+MODULE_FIELDS = ["moduleId", "internalResistance", "maxResistance", "voltage", "temperature", "soh"]
+
+# Alias de colonnes (fichiers produits par GET /battery/export)
+COLUMN_ALIASES = {"passportId": "batteryPassportId"}
+
+
+async def iter_lines(chunks):
+    """Découpe un flux asynchrone d'octets en lignes"""
+    buffer = b""
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            yield line
+    if buffer:
+        yield buffer
+
+
+async def iter_jsonl_records(lines):
+    """(numéro de ligne, dict | erreur) pour chaque ligne JSONL non vide"""
+    line_number = 0
+    async for line in lines:
+        line_number += 1
+        if not line.strip():
+            continue
+        try:
+            yield line_number, json.loads(line)
+        except ValueError as e:
+            yield line_number, e
+
+
+async def iter_csv_records(lines):
+    """
+    (numéro de ligne, dict) par batterie. Les lignes consécutives d'une même
+    batterie sont regroupées, leurs colonnes de module formant la liste `modules`.
+    Les valeurs entre guillemets ne peuvent pas contenir de saut de ligne.
+    """
+    header = None
+    current = None
+    start_line = 0
+    line_number = 0
+    async for line in lines:
+        line_number += 1
+        text = line.decode("utf-8-sig").rstrip("\r")
+        if not text.strip():
+            continue
+        values = next(csv.reader([text]))
+        if header is None:
+            header = [COLUMN_ALIASES.get(name, name) for name in values]
+            continue
+        row = {name: value for name, value in zip(header, values) if value != ""}
+        module = {name: row.pop(name) for name in MODULE_FIELDS if name in row}
+        
+        if current is None or row.get("batteryId") != current.get("batteryId"):
+            if current is not None:
+                yield start_line, current
+            current = {**row, "modules": []}
+            start_line = line_number
+        if module:
+            current["modules"].append(module)
+    if current is not None:
+        yield start_line, current
+
+
+def format_record(record: BatteryImportRecord) -> dict:
+    """Enregistrement validé -> paramètres Cypher"""
+    data = record.model_dump(mode="json")
+    data["modules"] = [module.model_dump() for module in record.modules]
+    return data
+
+
+async def run_import(
+    lines,
+    format: ImportFormat = ImportFormat.JSONL,
+    batch_size: int = IMPORT_BATCH_SIZE,
+    on_progress=None
+) -> dict:
+    """
+    Importe un flux de lignes (octets) CSV ou JSONL.
+    `on_progress(report)` est appelé après chaque lot écrit.
+    Retourne le rapport: reçus, importés, invalides, lots (écrits et refusés),
+    erreurs par ligne.
+    """
+    records = iter_csv_records(lines) if format == ImportFormat.CSV else iter_jsonl_records(lines)
+    report = {
+        "received": 0,
+        "imported": 0,
+        "invalid": 0,
+        "batches": 0,
+        "failedBatches": 0,
+        "nodesCreated": 0,
+        "relationshipsCreated": 0,
+        "errors": []
+    }
+    pending = []
+    pending_lines = []
+    started = time.monotonic()
+
+    async def flush():
+        # Un lot refusé par Neo4j (contrainte d'unicité...) est annulé en entier:
+        # ses lignes sont rapportées en erreur et l'import continue
+        try:
+            counters = await import_batteries_batch(pending)
+        except Exception as e:
+            report["failedBatches"] += 1
+            for line_number, record in zip(pending_lines, pending):
+                reject(line_number, record["batteryId"], f"Lot refusé par Neo4j: {e}")
+        else:
+            report["imported"] += len(pending)
+            report["batches"] += 1
+            report["nodesCreated"] += counters["nodes_created"]
+            report["relationshipsCreated"] += counters["relationships_created"]
+        pending.clear()
+        pending_lines.clear()
+        if on_progress:
+            on_progress(report)
+
+    def reject(line_number, battery_id, error):
+        report["invalid"] += 1
+        if len(report["errors"]) < MAX_REPORTED_ERRORS:
+            report["errors"].append({"line": line_number, "batteryId": battery_id, "error": error})
+    
+    async for line_number, raw in records:
+        report["received"] += 1
+        if isinstance(raw, Exception):
+            reject(line_number, None, f"JSON invalide: {raw}")
+            continue
+        try:
+            record = BatteryImportRecord.model_validate(raw)
+        except ValidationError as e:
+            reject(
+                line_number,
+                raw.get("batteryId") if isinstance(raw, dict) else None,
+                e.errors(include_url=False, include_context=False, include_input=False)
+            )
+            continue
+        
+        pending.append(format_record(record))
+        pending_lines.append(line_number)
+        if len(pending) >= batch_size:
+            await flush()
+    
+    if pending:
+        await flush()
+    if report["imported"]:
+        fleet_stats.invalidate()
+    
+    report["durationSeconds"] = round(time.monotonic() - started, 3)
+    return report
+
+
+# ============================================
+# CLI
+# ============================================
+
+async def _iter_file(path: str, chunk_size: int = 1 << 16):
+    with open(path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            yield chunk
+
+
+async def _main(path: str, format: ImportFormat, batch_size: int):
+    def progress(report):
+        print(
+            f"⏳ Lot {report['batches']}: {report['imported']} importées, "
+            f"{report['invalid']} invalides",
+            flush=True
+        )
+    
+    try:
+        report = await run_import(iter_lines(_iter_file(path)), format, batch_size, progress)
+    finally:
+        await async_db.close()
+    
+    for error in report["errors"]:
+        print(f"❌ Ligne {error['line']} ({error['batteryId']}): {error['error']}")
+    print(
+        f"✅ Import terminé: {report['imported']}/{report['received']} batteries "
+        f"en {report['batches']} lot(s), {report['durationSeconds']}s"
+    )
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import en masse de passeports batterie (CSV / JSONL)")
+    parser.add_argument("path", help="Fichier à importer")
+    parser.add_argument("--format", choices=[f.value for f in ImportFormat], help="Format (déduit de l'extension par défaut)")
+    parser.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE, help="Batteries par transaction")
+    args = parser.parse_args()
+    
+    format = ImportFormat(args.format or ("csv" if args.path.lower().endswith(".csv") else "jsonl"))
+    report = asyncio.run(_main(args.path, format, args.batch_size))
+    raise SystemExit(1 if report["invalid"] else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,10 +4,11 @@ Serveur principal pour le hackathon ESILV x Capgemini
 """
 
 import os
+import asyncio
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 from contextlib import asynccontextmanager
 from dotenv import load_dotenv
 
@@ -15,10 +16,18 @@ from dotenv import load_dotenv
 load_dotenv()
 
 # Import des routers (à décommenter quand créés)
-from routers import batteries, modules, notifications
+from routers import batteries, modules, notifications, events, dashboard, admin
 
 # Import de la connexion DB
-from database import db
+from database import async_db, sync_defective_labels
+from schema import ensure_schema, format_schema_report
+from models import NEXT_CURSOR_HEADER
+from stats import fleet_stats
+from qrcodes import start_render_pool, shutdown_render_pool
+from decision import run_decision_sweeper
+from timeseries import run_retention
+from notification_store import notification_repo
+from metrics import MetricsMiddleware, render_metrics
 
 
 # ============================================
@@ -30,11 +39,35 @@ async def lifespan(app: FastAPI):
     """Gère le cycle de vie de l'application"""
     # Startup
     print("🚀 Démarrage Battery Passport API...")
+    await async_db.verify_connectivity()
     print("✅ Connexion Neo4j établie")
+    # Contraintes et index (idempotent)
+    app.state.schema_report = await ensure_schema()
+    print(format_schema_report(app.state.schema_report))
+    # Label :Defective (rattrapage des modules écrits hors de l'API)
+    defective_sync = await sync_defective_labels()
+    print(f"🏷️ Label :Defective: {defective_sync['labeled']} ajouté(s), {defective_sync['cleared']} retiré(s)")
+    # Statistiques: snapshot initial + réconciliation périodique
+    await fleet_stats.refresh()
+    stats_task = asyncio.create_task(fleet_stats.run_reconciler())
+    # Notifications: fenêtre récente en mémoire + rechargement périodique
+    await notification_repo.refresh()
+    notifications_task = asyncio.create_task(notification_repo.run_reconciler())
+    # Décisions: recalcul en tâche de fond des décisions périmées
+    decision_task = asyncio.create_task(run_decision_sweeper())
+    # Séries temporelles: purge des points bruts et agrégats expirés
+    retention_task = asyncio.create_task(run_retention())
+    # QR codes: pool de processus de rendu en masse
+    start_render_pool()
     yield
     # Shutdown
     print("🛑 Arrêt de l'API...")
-    db.close()
+    stats_task.cancel()
+    notifications_task.cancel()
+    decision_task.cancel()
+    retention_task.cancel()
+    shutdown_render_pool()
+    await async_db.close()
 
 
 # ============================================
@@ -50,6 +83,9 @@ app = FastAPI(
     - 🔋 **Batteries** : CRUD sur les passeports de batteries
     - 📊 **Modules** : Télémétrie et diagnostic (Défi #1)
     - 🔔 **Notifications** : Workflow garagiste → propriétaire → centre de tri
+    - 📡 **Temps réel** : Flux SSE des notifications et alertes
+    - 🧭 **Tableaux de bord** : Un agrégat par rôle et par écran
+    - 🛠️ **Admin** : Journal des requêtes Cypher lentes (profilage opt-in)
     - 🎯 **Décision** : Algorithme d'aide à la décision (Défi #3)
     
     ### Rôles:
@@ -98,9 +134,17 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER],  # Pagination lisible depuis React
 )
 
 
+# ============================================
+# MÉTRIQUES - Latence par route (Prometheus)
+# ============================================
+
+app.add_middleware(MetricsMiddleware)
+
+
 # ============================================
 # STATIC FILES (QR Codes)
 # ============================================
@@ -133,6 +177,24 @@ app.include_router(
     tags=["🔔 Notifications"]
 )
 
+app.include_router(
+    events.router,
+    prefix="/events",
+    tags=["📡 Temps réel"]
+)
+
+app.include_router(
+    dashboard.router,
+    prefix="/dashboard",
+    tags=["🧭 Tableaux de bord"]
+)
+
+app.include_router(
+    admin.router,
+    prefix="/admin",
+    tags=["🛠️ Admin"]
+)
+
 
 # ============================================
 # ROUTES RACINE
@@ -149,7 +211,9 @@ async def root():
         "endpoints": {
             "batteries": "/battery",
             "modules": "/modules", 
-            "notifications": "/notifications"
+            "notifications": "/notifications",
+            "dashboard": "/dashboard",
+            "metrics": "/metrics"
         }
     }
 
@@ -159,7 +223,7 @@ async def health_check():
     """Vérification santé de l'API et connexion Neo4j"""
     try:
         # Test requête Neo4j
-        result = db.execute_query("RETURN 1 AS test")
+        result = await async_db.execute_query("RETURN 1 AS test")
         neo4j_status = "connected" if result else "error"
     except Exception as e:
         neo4j_status = f"error: {str(e)}"
@@ -167,43 +231,30 @@ async def health_check():
     return {
         "status": "healthy" if neo4j_status == "connected" else "degraded",
         "api": "running",
-        "neo4j": neo4j_status
+        "neo4j": neo4j_status,
+        "schema": getattr(app.state, "schema_report", None)
     }
 
 
+@app.get("/metrics", tags=["🏠 Root"], response_class=Response)
+async def get_metrics():
+    """
+    Métriques Prometheus (format texte): latence, requêtes en cours et
+    codes HTTP par route, durée des requêtes Neo4j par nom, pool du driver.
+    """
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
+
 @app.get("/stats", tags=["🏠 Root"])
 async def get_stats():
-    """Statistiques globales de la base de données"""
+    """
+    Statistiques globales de la base de données.
+    Servies depuis un snapshot en mémoire, tenu à jour par les écritures
+    et réconcilié périodiquement avec Neo4j (STATS_RECONCILE_INTERVAL).
+    """
     try:
-        # Compter les batteries par statut
-        query = """
-        MATCH (b:BatteryInstance)
-        RETURN b.status AS status, count(*) AS count
-        """
-        status_counts = db.execute_query(query)
-        
-        # Compter les modules défaillants
-        defective_query = """
-        MATCH (b:BatteryInstance)-[:HAS_MODULE]->(m:Module)
-        WHERE m.internalResistance > m.maxResistance
-        RETURN count(m) AS defectiveCount
-        """
-        defective = db.execute_query(defective_query)
-        
-        # Total batteries et modules
-        totals_query = """
-        MATCH (b:BatteryInstance)
-        OPTIONAL MATCH (b)-[:HAS_MODULE]->(m:Module)
-        RETURN count(DISTINCT b) AS totalBatteries, count(m) AS totalModules
-        """
-        totals = db.execute_query(totals_query)
-        
-        return {
-            "totalBatteries": totals[0]["totalBatteries"] if totals else 0,
-            "totalModules": totals[0]["totalModules"] if totals else 0,
-            "defectiveModules": defective[0]["defectiveCount"] if defective else 0,
-            "byStatus": {item["status"]: item["count"] for item in status_counts}
-        }
+        return await fleet_stats.get()
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
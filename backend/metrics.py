@@ -0,0 +1,184 @@
+"""
+Métriques Prometheus - Latence des routes et des requêtes Neo4j
+Middleware ASGI (latence, requêtes en cours, codes HTTP par route),
+chronométrage des requêtes Cypher par nom et état du pool du driver.
+Servies au format texte Prometheus par GET /metrics.
+
+Chaque worker uvicorn a son propre registre: Prometheus doit scraper
+chaque worker (ou l'API tourner avec un seul worker).
+"""
+
+import sys
+import time
+from contextlib import contextmanager
+
+from prometheus_client import Counter, Gauge, Histogram, CONTENT_TYPE_LATEST, generate_latest
+from prometheus_client.core import GaugeMetricFamily, REGISTRY
+
+
+# Bornes des histogrammes (secondes): de la milliseconde aux requêtes lentes
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# Libellé des chemins sans route (404): évite une série par URL inconnue
+UNMATCHED_ROUTE = "unmatched"
+
+
+# ============================================
+# MÉTRIQUES HTTP
+# ============================================
+
+HTTP_REQUESTS = Counter(
+    "http_requests_total",
+    "Requêtes HTTP traitées",
+    ["method", "route", "status"]
+)
+HTTP_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "Latence HTTP jusqu'à l'envoi des en-têtes de réponse",
+    ["method", "route"],
+    buckets=LATENCY_BUCKETS
+)
+HTTP_IN_PROGRESS = Gauge(
+    "http_requests_in_progress",
+    "Requêtes HTTP en cours (flux SSE et exports compris)",
+    ["method"]
+)
+
+
+def route_template(scope) -> str:
+    """
+    Gabarit de la route (/battery/{battery_id}) plutôt que l'URL appelée:
+    le chemin dont les paramètres extraits par le routage sont remis en
+    {nom}. Une série par route, quel que soit le préfixe du router.
+    """
+    if scope.get("route") is None:
+        return UNMATCHED_ROUTE
+    path = scope["path"]
+    segments = {}
+    for name, value in scope.get("path_params", {}).items():
+        value = str(value)
+        if "/" in value and path.endswith(value):
+            # Paramètre {path} d'un montage (fichiers statiques)
+            path = path[:-len(value)] + "{" + name + "}"
+        else:
+            segments[value] = "{" + name + "}"
+    return "/".join(segments.get(segment, segment) for segment in path.split("/"))
+
+
+class MetricsMiddleware:
+    """
+    Middleware ASGI pur (sans mise en tampon: compatible SSE et streaming).
+    La latence est mesurée jusqu'au début de la réponse, la requête reste
+    comptée « en cours » jusqu'au dernier octet envoyé.
+    La route est connue une fois le routage fait (scope["route"]):
+    les requêtes en cours ne sont donc comptées que par méthode.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        started = time.perf_counter()
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                HTTP_LATENCY.labels(method, route_template(scope)).observe(time.perf_counter() - started)
+            await send(message)
+
+        in_progress = HTTP_IN_PROGRESS.labels(method)
+        in_progress.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            in_progress.dec()
+            HTTP_REQUESTS.labels(method, route_template(scope), str(status["code"])).inc()
+
+
+# ============================================
+# MÉTRIQUES NEO4J
+# ============================================
+
+NEO4J_QUERY_LATENCY = Histogram(
+    "neo4j_query_duration_seconds",
+    "Durée des transactions Neo4j (rejeux compris), par requête",
+    ["query", "mode"],
+    buckets=LATENCY_BUCKETS
+)
+NEO4J_QUERY_ERRORS = Counter(
+    "neo4j_query_errors_total",
+    "Requêtes Neo4j en échec (après rejeux), par requête",
+    ["query", "mode", "error"]
+)
+NEO4J_SESSIONS = Gauge(
+    "neo4j_sessions_active",
+    "Sessions Neo4j ouvertes",
+    ["driver"]
+)
+
+
+def caller_name(depth: int = 2) -> str:
+    """Nom de la fonction appelante (nom de requête par défaut)"""
+    return sys._getframe(depth).f_code.co_name
+
+
+@contextmanager
+def query_timer(name: str, mode: str):
+    """Chronomètre une requête Neo4j (`mode`: read / write)"""
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception as e:
+        NEO4J_QUERY_ERRORS.labels(name, mode, type(e).__name__).inc()
+        raise
+    finally:
+        NEO4J_QUERY_LATENCY.labels(name, mode).observe(time.perf_counter() - started)
+
+
+class Neo4jPoolCollector:
+    """
+    État du pool de connexions de chaque driver, lu à chaque scrape.
+    Le pool n'a pas d'API publique: attributs internes lus avec getattr,
+    chaque métrique est omise si le driver change de structure.
+    """
+
+    def __init__(self):
+        self._drivers = {}
+
+    def register(self, name: str, driver):
+        self._drivers[name] = driver
+
+    def collect(self):
+        size = GaugeMetricFamily("neo4j_pool_connections", "Connexions ouvertes du pool", labels=["driver", "address"])
+        in_use = GaugeMetricFamily("neo4j_pool_connections_in_use", "Connexions empruntées du pool", labels=["driver", "address"])
+        limit = GaugeMetricFamily("neo4j_pool_max_size", "Taille max du pool par serveur", labels=["driver"])
+        for name, driver in self._drivers.items():
+            pool = getattr(driver, "_pool", None)
+            max_size = getattr(getattr(pool, "pool_config", None), "max_connection_pool_size", None)
+            if max_size is not None:
+                limit.add_metric([name], max_size)
+            connections_by_address = getattr(pool, "connections", None)
+            if not isinstance(connections_by_address, dict):
+                continue
+            for address, connections in list(connections_by_address.items()):
+                connections = list(connections)
+                size.add_metric([name, str(address)], len(connections))
+                in_use.add_metric([name, str(address)], sum(1 for c in connections if getattr(c, "in_use", False)))
+        yield size
+        yield in_use
+        yield limit
+
+
+neo4j_pool_collector = Neo4jPoolCollector()
+REGISTRY.register(neo4j_pool_collector)
+
+
+def render_metrics():
+    """(corps, type de contenu) au format texte Prometheus"""
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
@@ -16,6 +16,7 @@ from enum import Enum
 class BatteryStatus(str, Enum):
     """Statuts possibles d'une batterie"""
     ORIGINAL = "Original"
+    SIGNALED_AS_WASTE = "Signaled As Waste"
     WASTE = "Waste"
     REUSED = "Reused"
     REPURPOSED = "Repurposed"
@@ -29,6 +30,13 @@ class DecisionType(str, Enum):
     REPURPOSE = "Repurpose"
 
 
+class MarketDemand(str, Enum):
+    """Niveaux de demande marché pris en compte par l'aide à la décision"""
+    LOW = "low"
+    NORMAL = "normal"
+    HIGH = "high"
+
+
 # ============================================
 # MODULES (Télémétrie - Défi #1)
 # ============================================
@@ -103,6 +111,14 @@ class BatteryCreate(BatteryBase):
     carbonFootprint: Optional[float] = Field(None, ge=0, example=65.5)
 
 
+class BatteryImportRecord(BatteryCreate):
+    """Ligne d'import en masse: batterie, relations du modèle et modules"""
+    manufacturer: Optional[str] = Field(None, example="CATL")
+    batteryType: Optional[str] = Field(None, example="Li-ion")
+    composition: Optional[str] = Field(None, example="LFP")
+    modules: List[ModuleBase] = Field(default_factory=list, max_length=100)
+
+
 class BatteryResponse(BatteryBase):
     """Réponse complète d'une batterie"""
     serialNumber: Optional[str] = None
@@ -145,6 +161,12 @@ class BatteryListItem(BaseModel):
     manufacturer: Optional[str] = None
 
 
+class BatteryPage(BaseModel):
+    """Page de batteries avec le curseur de la suivante (GET /battery/?envelope=true)"""
+    items: List[BatteryListItem]
+    nextCursor: Optional[str] = None
+
+
 class BatteryWithModules(BatteryResponse):
     """Batterie avec ses modules (pour diagnostic garagiste)"""
     modules: List[ModuleResponse] = []
@@ -188,6 +210,12 @@ class NotificationResponse(NotificationCreate):
     read: bool = False
 
 
+class NotificationPage(BaseModel):
+    """Page de notifications avec le curseur de la suivante (GET /notifications/?envelope=true)"""
+    items: List[dict]
+    nextCursor: Optional[str] = None
+
+
 # ============================================
 # DECISION CENTER (Défi #3)
 # ============================================
@@ -199,7 +227,7 @@ class DecisionCriteria(BaseModel):
     defectiveModulesCount: int = Field(..., ge=0, description="Nombre de modules défaillants")
     avgResistanceRatio: float = Field(..., ge=0, description="Ratio résistance/max moyen")
     composition: str = Field(..., description="Chimie de la batterie (NMC, LFP, NCA)")
-    marketDemand: Optional[str] = Field("normal", description="Demande marché (low, normal, high)")
+    marketDemand: Optional[MarketDemand] = Field(MarketDemand.NORMAL, description="Demande marché (low, normal, high)")
 
 
 class DecisionRecommendation(BaseModel):
@@ -227,6 +255,21 @@ class DecisionRecommendation(BaseModel):
         }
 
 
+class DecisionBatchRequest(BaseModel):
+    """Décision en masse (arrivage d'un camion): liste d'IDs et/ou filtre statut"""
+    batteryIds: Optional[List[str]] = Field(None, max_length=5000, example=["BP-2024-LG-002", "BP-2024-CATL-001"])
+    status: Optional[str] = Field(None, example="Waste")
+    marketDemand: MarketDemand = Field(MarketDemand.NORMAL, description="Demande marché (low, normal, high)")
+
+
+class DecisionBatchResponse(BaseModel):
+    """Résultat d'une décision en masse"""
+    results: List[DecisionRecommendation]
+    notFound: List[str] = []
+    statusMismatch: List[str] = []
+    withoutModules: List[str] = []
+
+
 # ============================================
 # QR CODE
 # ============================================
@@ -238,6 +281,40 @@ class QRCodeResponse(BaseModel):
     passportUrl: str = Field(..., example="http://localhost:8000/battery/BP-2024-CATL-001")
 
 
+class QRBulkFormat(str, Enum):
+    """Formats de sortie pour l'impression d'étiquettes en masse"""
+    ZIP = "zip"
+    PDF = "pdf"
+
+
+class ExportFormat(str, Enum):
+    """Formats de l'export de la flotte"""
+    CSV = "csv"
+    PARQUET = "parquet"
+
+
+class ImportFormat(str, Enum):
+    """Formats acceptés par l'import en masse"""
+    CSV = "csv"
+    JSONL = "jsonl"
+
+
+class QRBulkRequest(BaseModel):
+    """Génération d'étiquettes QR pour une palette (liste d'IDs ou filtre statut)"""
+    batteryIds: Optional[List[str]] = Field(None, max_length=5000, example=["BP-2024-LG-002", "BP-2024-CATL-001"])
+    status: Optional[str] = Field(None, example="Waste")
+    format: QRBulkFormat = QRBulkFormat.ZIP
+    size: int = Field(10, ge=5, le=50, description="Taille du QR code (box_size)")
+
+
+# ============================================
+# PAGINATION
+# ============================================
+
+# En-tête portant le curseur de la page suivante (listes paginées par clé)
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
 # ============================================
 # API RESPONSES
 # ============================================
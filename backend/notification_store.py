@@ -0,0 +1,281 @@
+"""
+Notifications - Dépôt avec cache borné en mémoire
+Neo4j reste la source de vérité; chaque worker garde les notifications
+récentes, indexées par batterie et par état de lecture, pour servir
+la boîte de réception et le compteur de non lues sans requête graphe
+"""
+
+import os
+import uuid
+import asyncio
+from bisect import insort
+from datetime import timezone
+
+from database import (
+    get_recent_notifications,
+    create_notification_node,
+    mark_notification_read
+)
+from realtime import event_broker, EVENT_NOTIFICATION, EVENT_UNREAD
+
+
+# Nombre de notifications récentes gardées en mémoire (par worker)
+NOTIFICATION_CACHE_SIZE = int(os.getenv("NOTIFICATION_CACHE_SIZE", 1000))
+
+# Intervalle de rechargement depuis Neo4j (écritures des autres workers)
+NOTIFICATION_RECONCILE_INTERVAL = int(os.getenv("NOTIFICATION_RECONCILE_INTERVAL", 10))
+
+
+def to_sort_key(moment) -> int:
+    """datetime -> nanosecondes epoch (naïf = UTC, comme datetime() côté Neo4j)"""
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return int(moment.timestamp()) * 1_000_000_000 + moment.microsecond * 1000
+
+
+def public(notification: dict) -> dict:
+    """Notification sans la clé de tri interne (même forme que get_notifications)"""
+    return {key: value for key, value in notification.items() if key != "sortKey"}
+
+
+class NotificationRepository:
+    """
+    Fenêtre des NOTIFICATION_CACHE_SIZE notifications les plus récentes.
+    - _items: notificationId -> notification
+    - _order: (sortKey, notificationId) trié, la plus ancienne en tête
+    - _by_battery / _unread: index secondaires de la fenêtre
+    - _unread_total: non lues sur toute la base (pas seulement la fenêtre)
+    La fenêtre est complète (_complete) tant qu'aucune notification n'en
+    est sortie: une requête filtrée peut alors y être servie en entier.
+    Chaque worker a sa propre fenêtre, rechargée périodiquement.
+
+    Les requêtes Neo4j se font hors verrou; la fenêtre n'est modifiée que
+    par du code synchrone (atomique pour la boucle d'événements). Les
+    écritures locales faites pendant un rechargement sont journalisées
+    (_journal) puis rejouées sur l'instantané, qui peut les précéder.
+    """
+
+    def __init__(self, capacity: int = NOTIFICATION_CACHE_SIZE):
+        self.capacity = capacity
+        # Un seul rechargement à la fois (les écritures ne l'attendent pas)
+        self._refresh_lock = asyncio.Lock()
+        self._journal = None
+        self._reset()
+
+    def _reset(self):
+        self._items = {}
+        self._order = []
+        self._by_battery = {}
+        self._unread = set()
+        self._unread_total = None
+        self._complete = False
+
+    def _add(self, notification: dict) -> bool:
+        """Ajoute une notification à la fenêtre. False si elle y est déjà"""
+        notification_id = notification["notificationId"]
+        if notification_id in self._items:
+            return False
+        self._items[notification_id] = notification
+        insort(self._order, (notification["sortKey"], notification_id))
+        self._by_battery.setdefault(notification["batteryId"], set()).add(notification_id)
+        if not notification["read"]:
+            self._unread.add(notification_id)
+        
+        # Éviction des plus anciennes au-delà de la capacité
+        while len(self._order) > self.capacity:
+            _, oldest_id = self._order.pop(0)
+            oldest = self._items.pop(oldest_id)
+            battery_ids = self._by_battery[oldest["batteryId"]]
+            battery_ids.discard(oldest_id)
+            if not battery_ids:
+                del self._by_battery[oldest["batteryId"]]
+            self._unread.discard(oldest_id)
+            self._complete = False
+        return True
+
+    def _set_read(self, notification_id: str, was_read: bool, **changes):
+        if self._journal is not None:
+            self._journal.append(("read", notification_id, changes))
+        notification = self._items.get(notification_id)
+        if notification is not None:
+            # Déjà lue dans la fenêtre: un rechargement a déjà compté l'écriture
+            was_read = was_read or notification["read"]
+            notification.update(read=True, **changes)
+            self._unread.discard(notification_id)
+        if not was_read and self._unread_total:
+            self._unread_total -= 1
+            self._publish_unread()
+    
+    def _replay(self, snapshot_ids: set, journal: list):
+        """
+        Rejoue sur l'instantané les écritures locales faites pendant sa lecture.
+        Une notification absente de la fenêtre ne corrige pas le compteur:
+        l'écart éventuel disparaît au rechargement suivant.
+        """
+        for entry in journal:
+            if entry[0] == "create":
+                notification = entry[1]
+                if notification["notificationId"] not in snapshot_ids:
+                    self._add(notification)
+                    if not notification["read"]:
+                        self._unread_total += 1
+            else:
+                _, notification_id, changes = entry
+                notification = self._items.get(notification_id)
+                if notification is None:
+                    continue
+                if not notification["read"]:
+                    self._unread.discard(notification_id)
+                    self._unread_total -= 1
+                notification.update(read=True, **changes)
+    
+    def _publish_unread(self):
+        event_broker.publish(EVENT_UNREAD, {"unreadCount": self._unread_total})
+
+    async def refresh(self, force: bool = True):
+        """
+        Recharge la fenêtre et le compteur de non lues depuis Neo4j.
+        `force=False`: ne recharge que si la fenêtre n'est pas encore chargée.
+        """
+        async with self._refresh_lock:
+            if not force and self._unread_total is not None:
+                return
+            self._journal = []
+            try:
+                result = await get_recent_notifications(self.capacity)
+            except Exception:
+                self._journal = None
+                raise
+            journal, self._journal = self._journal, None
+            
+            # Application de l'instantané: synchrone, sans point d'attente
+            loaded = self._unread_total is not None
+            previous_ids = set(self._items)
+            newest_key = self._order[-1][0] if self._order else 0
+            previous_unread = self._unread_total
+            
+            self._reset()
+            for notification in result["notifications"]:
+                self._add(notification)
+            self._unread_total = result["unreadCount"]
+            self._complete = len(result["notifications"]) < self.capacity
+            self._replay({n["notificationId"] for n in result["notifications"]}, journal)
+            
+            # Diffuser les notifications créées par les autres workers
+            if loaded:
+                for notification in reversed(result["notifications"]):
+                    if notification["notificationId"] not in previous_ids and notification["sortKey"] > newest_key:
+                        event_broker.publish(EVENT_NOTIFICATION, public(notification))
+                if self._unread_total != previous_unread:
+                    self._publish_unread()
+
+    async def _ensure_loaded(self):
+        if self._unread_total is None:
+            await self.refresh(force=False)
+
+    async def run_reconciler(self, interval: int = NOTIFICATION_RECONCILE_INTERVAL):
+        """Boucle de fond: rechargement complet toutes les `interval` secondes"""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.refresh()
+            except Exception as e:
+                print(f"⚠️ Rechargement des notifications échoué: {e}")
+
+    async def create(
+        self,
+        battery_id: str,
+        message: str,
+        sender_role: str,
+        sender_name: str = None,
+        urgency: str = "normal"
+    ):
+        """Crée une notification. None si la batterie n'existe pas"""
+        notification = await create_notification_node(
+            battery_id,
+            str(uuid.uuid4())[:8],
+            message,
+            sender_role,
+            sender_name or "",
+            urgency
+        )
+        if notification is None:
+            return None
+        if self._journal is not None:
+            self._journal.append(("create", notification))
+        if self._unread_total is not None:
+            if not self._add(notification):
+                # Déjà chargée (et diffusée) par un rechargement plus rapide
+                return public(notification)
+            self._unread_total += 1
+            self._publish_unread()
+        event_broker.publish(EVENT_NOTIFICATION, public(notification))
+        return public(notification)
+
+    async def mark_read(self, notification_id: str) -> bool:
+        """Marque une notification comme lue. False si elle n'existe pas"""
+        result = await mark_notification_read(notification_id)
+        if result is None:
+            return False
+        self._set_read(notification_id, result["wasRead"])
+        return True
+
+    def record_resolution(self, notification_id: str, was_read: bool):
+        """Répercute une notification résolue par transition_battery_status"""
+        self._set_read(notification_id, was_read, status="resolved")
+    
+    async def unread_count(self) -> int:
+        """Nombre de notifications non lues (O(1))"""
+        await self._ensure_loaded()
+        return self._unread_total
+
+    async def recent(
+        self,
+        unread_only: bool = False,
+        battery_id: str = None,
+        urgency: str = None,
+        since=None,
+        limit: int = 50
+    ):
+        """
+        Première page de la boîte de réception servie depuis la fenêtre.
+        Retourne None si la fenêtre ne suffit pas à répondre (la requête
+        doit alors être faite sur Neo4j).
+        """
+        await self._ensure_loaded()
+        since_key = to_sort_key(since) if since else None
+        if since_key is not None and not self._complete:
+            if not self._order or since_key < self._order[0][0]:
+                return None
+        
+        # Index le plus sélectif d'abord
+        if battery_id:
+            candidates = self._by_battery.get(battery_id, set())
+            if unread_only:
+                candidates = candidates & self._unread
+        elif unread_only:
+            candidates = self._unread
+        else:
+            candidates = None
+        
+        matches = []
+        for sort_key, notification_id in reversed(self._order):
+            if since_key is not None and sort_key <= since_key:
+                break
+            if candidates is not None and notification_id not in candidates:
+                continue
+            notification = self._items[notification_id]
+            if urgency and notification["urgency"] != urgency:
+                continue
+            matches.append(public(notification))
+            if len(matches) >= limit:
+                return matches
+        
+        # Moins de `limit` résultats: exacts seulement si rien n'est hors fenêtre
+        if self._complete or since_key is not None:
+            return matches
+        return None
+
+
+# Instance globale
+notification_repo = NotificationRepository()
@@ -0,0 +1,148 @@
+"""
+Profilage des requêtes Cypher - Journal des requêtes lentes
+Mode opt-in (QUERY_PROFILING=1): au-delà de SLOW_QUERY_THRESHOLD_MS,
+la requête est journalisée (texte, forme des paramètres, lignes,
+temps serveur du ResultSummary). Une partie des lectures lentes de l'API
+(connexion asynchrone) est rejouée avec PROFILE pour garder le plan et ses db hits.
+Consultable via GET /admin/slow-queries.
+"""
+
+import os
+import re
+import random
+from collections import deque
+from datetime import datetime
+
+
+# Mode profilage (0 = désactivé: aucun surcoût)
+QUERY_PROFILING = bool(int(os.getenv("QUERY_PROFILING", 0)))
+
+# Seuil de journalisation (millisecondes, durée côté client rejeux compris)
+SLOW_QUERY_THRESHOLD_MS = float(os.getenv("SLOW_QUERY_THRESHOLD_MS", 200))
+
+# Requêtes lentes gardées en mémoire (par worker)
+SLOW_QUERY_LOG_SIZE = int(os.getenv("SLOW_QUERY_LOG_SIZE", 200))
+
+# Part des lectures lentes rejouées avec PROFILE (0 = jamais, 1 = toutes)
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", 0.1))
+
+# Opérateurs signalés dans un plan: parcours sans index
+SCAN_OPERATORS = ("AllNodesScan", "NodeByLabelScan", "DirectedAllRelationshipsScan", "UndirectedAllRelationshipsScan")
+
+
+def params_shape(value):
+    """Forme des paramètres (types, clés, tailles des listes) sans leurs valeurs"""
+    if isinstance(value, dict):
+        return {key: params_shape(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        if not value:
+            return "list[0]"
+        return {f"list[{len(value)}]": params_shape(value[0])}
+    if value is None:
+        return "null"
+    return type(value).__name__
+
+
+def compact_query(query: str) -> str:
+    """Texte de la requête sur une ligne (indentation et retours supprimés)"""
+    return re.sub(r"\s+", " ", query).strip()
+
+
+def simplify_plan(plan: dict) -> dict:
+    """Plan PROFILE réduit: opérateur, db hits, lignes, détails, enfants"""
+    arguments = plan.get("args", {})
+    return {
+        "operator": (plan.get("operatorType") or "").split("@")[0],
+        "dbHits": plan.get("dbHits", 0),
+        "rows": plan.get("rows", 0),
+        "details": arguments.get("Details"),
+        "children": [simplify_plan(child) for child in plan.get("children", [])]
+    }
+
+
+def plan_totals(plan: dict):
+    """(db hits cumulés, opérateurs de parcours sans index) d'un plan simplifié"""
+    db_hits = plan["dbHits"]
+    scans = []
+    if plan["operator"] in SCAN_OPERATORS:
+        scans.append(f"{plan['operator']}({plan['details'] or ''})")
+    for child in plan["children"]:
+        child_hits, child_scans = plan_totals(child)
+        db_hits += child_hits
+        scans += child_scans
+    return db_hits, scans
+
+
+class SlowQueryLog:
+    """
+    Les SLOW_QUERY_LOG_SIZE dernières requêtes lentes du worker.
+    Chaque entrée est un dict; le profil PROFILE y est ajouté plus tard
+    (rejoué en tâche de fond) pour les lectures échantillonnées.
+    """
+
+    def __init__(
+        self,
+        enabled: bool = QUERY_PROFILING,
+        threshold_ms: float = SLOW_QUERY_THRESHOLD_MS,
+        sample_rate: float = PROFILE_SAMPLE_RATE,
+        capacity: int = SLOW_QUERY_LOG_SIZE
+    ):
+        self.enabled = enabled
+        self.threshold_ms = threshold_ms
+        self.sample_rate = sample_rate
+        self._entries = deque(maxlen=capacity)
+        self._total = 0
+
+    def record(self, name: str, query: str, parameters: dict, mode: str, duration_ms: float, rows: int, summary):
+        """Journalise la requête si elle dépasse le seuil. Retourne l'entrée ou None"""
+        if not self.enabled or duration_ms < self.threshold_ms:
+            return None
+        entry = {
+            "name": name,
+            "mode": mode,
+            "query": compact_query(query),
+            "parametersShape": params_shape(parameters or {}),
+            "rows": rows,
+            "durationMs": round(duration_ms, 1),
+            "resultAvailableAfterMs": getattr(summary, "result_available_after", None),
+            "resultConsumedAfterMs": getattr(summary, "result_consumed_after", None),
+            "at": datetime.now().isoformat(),
+            "profile": None
+        }
+        self._entries.append(entry)
+        self._total += 1
+        print(
+            f"🐢 Requête lente {name} ({mode}): {entry['durationMs']} ms, {rows} ligne(s), "
+            f"serveur {entry['resultAvailableAfterMs']}+{entry['resultConsumedAfterMs']} ms"
+        )
+        return entry
+
+    def should_profile(self, entry: dict) -> bool:
+        """Lecture à rejouer avec PROFILE (les écritures ne sont jamais rejouées)"""
+        return entry["mode"] == "read" and random.random() < self.sample_rate
+
+    def attach_profile(self, entry: dict, profile: dict):
+        """Ajoute le plan PROFILE (brut, tel que renvoyé par le driver) à l'entrée"""
+        plan = simplify_plan(profile)
+        db_hits, scans = plan_totals(plan)
+        entry["profile"] = {"dbHits": db_hits, "scans": scans, "plan": plan}
+        if scans:
+            print(f"🔎 {entry['name']}: {db_hits} db hits, parcours sans index: {', '.join(scans)}")
+
+    def recent(self, name: str = None, limit: int = 50) -> list:
+        """Requêtes lentes, les plus récentes d'abord (filtre optionnel par nom)"""
+        entries = [entry for entry in reversed(self._entries) if name is None or entry["name"] == name]
+        return entries[:limit]
+
+    def clear(self):
+        self._entries.clear()
+        self._total = 0
+
+    @property
+    def total(self) -> int:
+        """Requêtes lentes journalisées depuis le démarrage (ou le dernier clear)"""
+        return self._total
+
+
+# Instance globale
+slow_query_log = SlowQueryLog()
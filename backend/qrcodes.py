@@ -0,0 +1,392 @@
+"""
+QR Codes - Rendu et cache des images PNG
+Le rendu ne dépend que de (battery_id, size, FRONTEND_BASE_URL):
+les PNG sont gardés dans un LRU borné en mémoire, avec débordement
+optionnel sur disque, et identifiés par un ETag fort
+"""
+
+import io
+import os
+import zlib
+import hashlib
+import zipfile
+import threading
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+
+import qrcode
+from starlette.concurrency import run_in_threadpool
+from PIL import Image, ImageDraw, ImageFont
+
+
+# URL du frontend pour le passeport (à configurer en variable d'environnement)
+FRONTEND_BASE_URL = os.getenv("FRONTEND_BASE_URL", "https://battery-passport-repo.onrender.com")
+
+# Nombre de PNG gardés en mémoire
+QR_CACHE_SIZE = int(os.getenv("QR_CACHE_SIZE", 512))
+
+# Dossier de débordement sur disque, ex: static/qrcodes/cache (vide = désactivé)
+QR_CACHE_DIR = os.getenv("QR_CACHE_DIR", "")
+
+# Nombre maximum de PNG sur disque (les moins récemment utilisés sont supprimés)
+QR_CACHE_DIR_MAX_FILES = int(os.getenv("QR_CACHE_DIR_MAX_FILES", 10000))
+
+# À incrémenter si le rendu change (invalide les ETags déjà distribués)
+QR_RENDER_VERSION = "1"
+
+# Durée de cache côté client/proxy (secondes)
+QR_CACHE_MAX_AGE = int(os.getenv("QR_CACHE_MAX_AGE", 86400))
+
+# Processus de rendu pour la génération en masse (défaut: nombre de CPU)
+QR_RENDER_PROCESSES = int(os.getenv("QR_RENDER_PROCESSES", 0)) or None
+
+# Nombre maximum d'étiquettes par requête en masse
+QR_BULK_MAX = int(os.getenv("QR_BULK_MAX", 5000))
+
+# Planche d'impression: A4 à 150 dpi, 3 x 4 étiquettes par page
+SHEET_DPI = 150
+SHEET_SIZE = (1240, 1754)
+SHEET_GRID = (3, 4)
+SHEET_MARGIN = 60
+
+
+def passport_url(battery_id: str, base_url: str = FRONTEND_BASE_URL) -> str:
+    """URL du passeport sur le FRONTEND (pas l'API!)"""
+    return f"{base_url}/passport/{battery_id}"
+
+
+def render_qr_png(data: str, box_size: int = 10) -> bytes:
+    """
+    Génère le QR code et l'encode en PNG.
+    Fonction pure de niveau module (exécutable dans un thread ou un processus).
+    """
+    qr = qrcode.QRCode(
+        version=1,
+        error_correction=qrcode.constants.ERROR_CORRECT_L,
+        box_size=box_size,
+        border=4,
+    )
+    qr.add_data(data)
+    qr.make(fit=True)
+    
+    img = qr.make_image(fill_color="black", back_color="white")
+    
+    buffer = BytesIO()
+    img.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def qr_etag(battery_id: str, size: int, base_url: str = FRONTEND_BASE_URL) -> str:
+    """ETag fort, dérivé uniquement des entrées du rendu"""
+    key = f"{QR_RENDER_VERSION}|{base_url}|{battery_id}|{size}"
+    return '"' + hashlib.sha256(key.encode()).hexdigest()[:32] + '"'
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """Vérifie un en-tête If-None-Match (liste, '*', préfixe W/)"""
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or any(
+        tag.removeprefix("W/") == etag for tag in candidates
+    )
+
+
+class QRCodeCache:
+    """
+    LRU borné de PNG indexés par ETag, thread-safe, avec débordement disque.
+    get() / put() font les E/S disque: à appeler depuis un thread.
+    Les routes utilisent aget() et render_cached() (threadpool).
+    """
+    
+    def __init__(
+        self,
+        max_entries: int = QR_CACHE_SIZE,
+        spill_dir: str = QR_CACHE_DIR,
+        max_spill_files: int = QR_CACHE_DIR_MAX_FILES
+    ):
+        self._entries = OrderedDict()
+        self._max_entries = max_entries
+        self._spill_dir = spill_dir or None
+        self._max_spill_files = max_spill_files
+        self._lock = threading.Lock()
+        self._spill_lock = threading.Lock()
+        self._spill_count = 0
+        if self._spill_dir:
+            os.makedirs(self._spill_dir, exist_ok=True)
+            self._spill_count = len(os.listdir(self._spill_dir))
+    
+    def _spill_path(self, etag: str) -> str:
+        return os.path.join(self._spill_dir, etag.strip('"') + ".png")
+    
+    def _get_memory(self, etag: str):
+        with self._lock:
+            png = self._entries.get(etag)
+            if png is not None:
+                self._entries.move_to_end(etag)
+            return png
+    
+    def _read_spill(self, etag: str):
+        path = self._spill_path(etag)
+        try:
+            with open(path, "rb") as f:
+                png = f.read()
+            # Date de modification = dernier usage (ordre de suppression)
+            os.utime(path)
+        except OSError:
+            return None
+        self.put(etag, png)
+        return png
+    
+    def _write_spill(self, etag: str, png: bytes):
+        path = self._spill_path(etag)
+        if os.path.exists(path):
+            return
+        try:
+            with open(path, "wb") as f:
+                f.write(png)
+        except OSError:
+            return
+        with self._spill_lock:
+            self._spill_count += 1
+            if self._spill_count > self._max_spill_files:
+                self._prune_spill()
+    
+    def _prune_spill(self):
+        """Supprime les PNG les moins récemment utilisés jusqu'à 90% du plafond"""
+        files = []
+        for entry in os.scandir(self._spill_dir):
+            try:
+                files.append((entry.stat().st_mtime, entry.path))
+            except OSError:
+                continue
+        files.sort()
+        excess = len(files) - int(self._max_spill_files * 0.9)
+        for _, path in files[:max(excess, 0)]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        self._spill_count = len(files) - max(excess, 0)
+    
+    def get(self, etag: str):
+        """PNG en cache (mémoire puis disque) ou None. Bloquant si débordement disque"""
+        png = self._get_memory(etag)
+        if png is None and self._spill_dir:
+            png = self._read_spill(etag)
+        return png
+    
+    async def aget(self, etag: str):
+        """get() depuis la boucle d'événements: la lecture disque passe par le threadpool"""
+        png = self._get_memory(etag)
+        if png is None and self._spill_dir:
+            png = await run_in_threadpool(self._read_spill, etag)
+        return png
+    
+    def put(self, etag: str, png: bytes):
+        """Ajoute un PNG; les entrées évincées de la mémoire partent sur disque (bloquant)"""
+        evicted = []
+        with self._lock:
+            self._entries[etag] = png
+            self._entries.move_to_end(etag)
+            while len(self._entries) > self._max_entries:
+                evicted.append(self._entries.popitem(last=False))
+        
+        if self._spill_dir:
+            for old_etag, old_png in evicted:
+                self._write_spill(old_etag, old_png)
+
+
+# Instance globale
+qr_cache = QRCodeCache()
+
+
+def render_cached(battery_id: str, size: int) -> bytes:
+    """Rend le QR code d'une batterie et le met en cache. Bloquant: threadpool"""
+    png = render_qr_png(passport_url(battery_id), size)
+    qr_cache.put(qr_etag(battery_id, size), png)
+    return png
+
+
+# ============================================
+# GÉNÉRATION EN MASSE
+# ============================================
+
+_render_pool = None
+_render_pool_lock = threading.Lock()
+
+
+def start_render_pool() -> ProcessPoolExecutor:
+    """
+    Crée le pool de processus de rendu (lifespan de l'API).
+    Processus lancés en « spawn »: un fork depuis un processus multi-thread
+    (threadpool, driver Neo4j) peut hériter de verrous tenus par d'autres threads.
+    """
+    global _render_pool
+    with _render_pool_lock:
+        if _render_pool is None:
+            _render_pool = ProcessPoolExecutor(
+                max_workers=QR_RENDER_PROCESSES,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return _render_pool
+
+
+def get_render_pool() -> ProcessPoolExecutor:
+    """Pool de processus de rendu (démarré à la demande hors de l'API)"""
+    return _render_pool or start_render_pool()
+
+
+def shutdown_render_pool():
+    """Arrête le pool de processus (shutdown de l'API)"""
+    global _render_pool
+    with _render_pool_lock:
+        if _render_pool is not None:
+            _render_pool.shutdown(cancel_futures=True)
+            _render_pool = None
+
+
+def render_many(battery_ids: list, size: int) -> list:
+    """
+    Rend les QR codes d'un lot en parallèle dans le pool de processus.
+    Les PNG déjà en cache ne sont pas recalculés; les nouveaux y sont ajoutés.
+    Bloquant: à appeler depuis un thread (run_in_threadpool).
+    Retourne [(battery_id, png), ...] dans l'ordre de `battery_ids`.
+    """
+    etags = [qr_etag(battery_id, size) for battery_id in battery_ids]
+    pngs = [qr_cache.get(etag) for etag in etags]
+    
+    missing = [i for i, png in enumerate(pngs) if png is None]
+    if missing:
+        urls = [passport_url(battery_ids[i]) for i in missing]
+        rendered = get_render_pool().map(
+            render_qr_png, urls, [size] * len(urls), chunksize=32
+        )
+        for i, png in zip(missing, rendered):
+            qr_cache.put(etags[i], png)
+            pngs[i] = png
+    
+    return list(zip(battery_ids, pngs))
+
+
+class _StreamSink(io.RawIOBase):
+    """
+    Tampon d'écriture non positionnable, vidé après chaque fichier de l'archive.
+    zipfile écrit alors des descripteurs de données au lieu de revenir en arrière.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._chunks = []
+        self._written = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._written += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._written
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def stream_zip(labels: list):
+    """Archive ZIP des PNG (stockés sans recompression), émise fichier par fichier"""
+    sink = _StreamSink()
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_STORED) as archive:
+        for battery_id, png in labels:
+            archive.writestr(f"{battery_id}_qrcode.png", png)
+            yield sink.drain()
+    yield sink.drain()
+
+
+def _label_font(size: int):
+    try:
+        return ImageFont.load_default(size=size)
+    except TypeError:
+        # Pillow < 10.1: police bitmap sans taille
+        return ImageFont.load_default()
+
+
+def iter_label_pages(labels: list):
+    """Planches A4 en niveaux de gris (grille QR code + batteryId), une à la fois"""
+    columns, rows = SHEET_GRID
+    width, height = SHEET_SIZE
+    cell_w = (width - 2 * SHEET_MARGIN) // columns
+    cell_h = (height - 2 * SHEET_MARGIN) // rows
+    caption_h = 40
+    qr_side = min(cell_w, cell_h - caption_h) - 20
+    font = _label_font(24)
+    per_page = columns * rows
+    
+    for start in range(0, len(labels), per_page):
+        page = Image.new("L", SHEET_SIZE, "white")
+        draw = ImageDraw.Draw(page)
+        for index, (battery_id, png) in enumerate(labels[start:start + per_page]):
+            col, row = index % columns, index // columns
+            x = SHEET_MARGIN + col * cell_w
+            y = SHEET_MARGIN + row * cell_h
+            qr_img = Image.open(BytesIO(png)).convert("L").resize((qr_side, qr_side), Image.NEAREST)
+            page.paste(qr_img, (x + (cell_w - qr_side) // 2, y))
+            text_w = draw.textlength(battery_id, font=font)
+            draw.text((x + (cell_w - text_w) / 2, y + qr_side + 8), battery_id, fill="black", font=font)
+        yield page
+
+
+def stream_label_sheet_pdf(labels: list):
+    """
+    PDF des planches A4, émis page par page (mémoire constante).
+    Objets: 1 catalogue, 2 arbre des pages, puis page / image / contenu
+    pour chaque planche; la table xref termine le fichier.
+    """
+    page_count = -(-len(labels) // (SHEET_GRID[0] * SHEET_GRID[1]))
+    # Taille de la page en points (1/72 pouce) à SHEET_DPI
+    page_w, page_h = (side * 72 / SHEET_DPI for side in SHEET_SIZE)
+    offsets = []
+    position = 0
+    
+    def pdf_object(body: bytes) -> bytes:
+        nonlocal position
+        offsets.append(position)
+        data = b"%d 0 obj\n%s\nendobj\n" % (len(offsets), body)
+        position += len(data)
+        return data
+    
+    def pdf_stream(dictionary: bytes, data: bytes) -> bytes:
+        return b"<< %s /Length %d >>\nstream\n%s\nendstream" % (dictionary, len(data), data)
+    
+    header = b"%PDF-1.4\n"
+    position = len(header)
+    yield header
+    kids = b" ".join(b"%d 0 R" % (3 + 3 * index) for index in range(page_count))
+    yield pdf_object(b"<< /Type /Catalog /Pages 2 0 R >>")
+    yield pdf_object(b"<< /Type /Pages /Count %d /Kids [%s] >>" % (page_count, kids))
+    
+    for page in iter_label_pages(labels):
+        page_ref = len(offsets) + 1
+        yield pdf_object(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %.2f %.2f] "
+            b"/Resources << /XObject << /Sheet %d 0 R >> >> /Contents %d 0 R >>"
+            % (page_w, page_h, page_ref + 1, page_ref + 2)
+        )
+        yield pdf_object(pdf_stream(
+            b"/Type /XObject /Subtype /Image /Width %d /Height %d "
+            b"/ColorSpace /DeviceGray /BitsPerComponent 8 /Filter /FlateDecode" % page.size,
+            zlib.compress(page.tobytes())
+        ))
+        yield pdf_object(pdf_stream(b"", b"q %.2f 0 0 %.2f 0 0 cm /Sheet Do Q" % (page_w, page_h)))
+    
+    xref = [b"xref\n0 %d\n0000000000 65535 f \n" % (len(offsets) + 1)]
+    xref += [b"%010d 00000 n \n" % offset for offset in offsets]
+    yield b"".join(xref) + (
+        b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(offsets) + 1, position)
+    )
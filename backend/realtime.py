@@ -0,0 +1,117 @@
+"""
+Événements temps réel - Diffusion vers les abonnés SSE
+Les routes publient les nouvelles notifications et les dépassements de
+seuil; chaque abonné a sa file bornée et ses filtres (batterie, urgence)
+"""
+
+import os
+import json
+import asyncio
+from itertools import count
+
+
+# Événements en attente par abonné avant de sacrifier les plus anciens
+EVENTS_QUEUE_SIZE = int(os.getenv("EVENTS_QUEUE_SIZE", 100))
+
+# Intervalle des commentaires keep-alive SSE (secondes)
+EVENTS_HEARTBEAT = int(os.getenv("EVENTS_HEARTBEAT", 15))
+
+# Types d'événements diffusés
+EVENT_NOTIFICATION = "notification"
+EVENT_ALERT = "alert"
+EVENT_UNREAD = "unread"
+EVENT_LAGGED = "lagged"
+EVENT_TYPES = [EVENT_NOTIFICATION, EVENT_ALERT, EVENT_UNREAD]
+
+
+class Subscriber:
+    """
+    Abonné SSE: file bornée + filtres.
+    Backpressure: si l'abonné ne consomme pas assez vite, les événements
+    les plus anciens sont abandonnés et un événement `lagged` lui indique
+    combien il en a perdu (le client se resynchronise via l'API REST).
+    """
+
+    def __init__(self, battery_id: str = None, urgency: str = None, types: list = None):
+        self.battery_id = battery_id
+        self.urgency = urgency
+        self.types = set(types or EVENT_TYPES)
+        self.queue = asyncio.Queue(maxsize=EVENTS_QUEUE_SIZE)
+        self.dropped = 0
+
+    def accepts(self, event_type: str, data: dict) -> bool:
+        if event_type not in self.types:
+            return False
+        # Le compteur de non lues est global: pas de filtre batterie/urgence
+        if event_type == EVENT_UNREAD:
+            return True
+        if self.battery_id and data.get("batteryId") != self.battery_id:
+            return False
+        if self.urgency and data.get("urgency") != self.urgency:
+            return False
+        return True
+
+    def offer(self, event: tuple):
+        """Dépose un événement sans jamais bloquer l'émetteur"""
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(event)
+
+    async def next_event(self, timeout: float):
+        """Prochain événement, ou None après `timeout` secondes sans événement"""
+        if self.dropped:
+            # Signaler la perte avant de reprendre le flux
+            dropped, self.dropped = self.dropped, 0
+            return (None, EVENT_LAGGED, {"dropped": dropped})
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class EventBroker:
+    """
+    Diffusion en mémoire (par worker uvicorn).
+    Les notifications créées sur un autre worker sont republiées par
+    le rechargement périodique du dépôt de notifications.
+    """
+
+    def __init__(self):
+        self._subscribers = set()
+        self._ids = count(1)
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def subscribe(self, **filters) -> Subscriber:
+        subscriber = Subscriber(**filters)
+        self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        self._subscribers.discard(subscriber)
+
+    def publish(self, event_type: str, data: dict):
+        """Diffuse un événement aux abonnés dont les filtres correspondent"""
+        if not self._subscribers:
+            return
+        event = (next(self._ids), event_type, data)
+        for subscriber in self._subscribers:
+            if subscriber.accepts(event_type, data):
+                subscriber.offer(event)
+
+
+def format_sse(event_id, event_type: str, data: dict) -> str:
+    """Sérialise un événement au format text/event-stream"""
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event_type}")
+    lines.append(f"data: {json.dumps(data, default=str)}")
+    return "\n".join(lines) + "\n\n"
+
+
+# Instance globale
+event_broker = EventBroker()
@@ -6,5 +6,8 @@ Export des routers pour montage dans main.py
 from . import batteries
 from . import modules
 from . import notifications
+from . import events
+from . import dashboard
+from . import admin
 
-__all__ = ["batteries", "modules", "notifications"]
\ No newline at end of file
+__all__ = ["batteries", "modules", "notifications", "events", "dashboard", "admin"]
\ No newline at end of file
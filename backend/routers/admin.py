@@ -0,0 +1,66 @@
+"""
+Router Admin - Diagnostic des performances
+Journal des requêtes Cypher lentes (mode QUERY_PROFILING)
+"""
+
+import os
+import hmac
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from typing import Optional
+
+from models import APIResponse
+from profiling import slow_query_log
+
+# Jeton exigé dans l'en-tête X-Admin-Token (vide = routes admin désactivées)
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    """Vérifie le jeton admin; sans ADMIN_TOKEN configuré, tout accès est refusé"""
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Routes admin désactivées (ADMIN_TOKEN non configuré)")
+    if not x_admin_token or not hmac.compare_digest(x_admin_token.encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="Jeton admin invalide")
+
+
+router = APIRouter(dependencies=[Depends(require_admin)])
+
+# ============================================
+# GET - Requêtes lentes
+# ============================================
+
+@router.get("/slow-queries", response_model=dict)
+async def list_slow_queries(
+    name: Optional[str] = Query(None, description="Filtrer par nom de requête (fonction appelante)"),
+    limit: int = Query(50, ge=1, le=500, description="Nombre maximum de requêtes")
+):
+    """
+    Dernières requêtes Cypher au-delà de SLOW_QUERY_THRESHOLD_MS (ce worker),
+    les plus récentes d'abord: texte, forme des paramètres, lignes, temps
+    serveur et, pour les lectures échantillonnées, plan PROFILE avec db hits
+    et parcours sans index (AllNodesScan, NodeByLabelScan).
+    """
+    try:
+        return {
+            "enabled": slow_query_log.enabled,
+            "thresholdMs": slow_query_log.threshold_ms,
+            "profileSampleRate": slow_query_log.sample_rate,
+            "total": slow_query_log.total,
+            "queries": slow_query_log.recent(name=name, limit=limit)
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+# ============================================
+# DELETE - Vider le journal
+# ============================================
+
+@router.delete("/slow-queries", response_model=APIResponse)
+async def clear_slow_queries():
+    """Vide le journal des requêtes lentes (après une correction d'index, etc.)"""
+    try:
+        slow_query_log.clear()
+        return APIResponse(success=True, message="Journal des requêtes lentes vidé")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
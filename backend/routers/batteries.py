@@ -4,59 +4,196 @@ Endpoints pour la gestion des passeports de batteries
 """
 
 import os
-import qrcode
-from io import BytesIO
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, HTTPException, Query, Request, Response
 from fastapi.responses import FileResponse, StreamingResponse
-from typing import List, Optional
+from starlette.concurrency import run_in_threadpool
+from typing import List, Optional, Union
 
 from models import (
     BatteryResponse,
     BatteryListItem,
+    BatteryPage,
     BatteryWithModules,
     QRCodeResponse,
+    QRBulkRequest,
+    QRBulkFormat,
+    ExportFormat,
+    ImportFormat,
     StatusChangeRequest,
     StatusChangeResponse,
-    APIResponse
+    APIResponse,
+    NEXT_CURSOR_HEADER
 )
 from database import (
-    db,
+    async_db,
     get_battery_by_id,
-    get_battery_modules,
+    get_battery_with_modules,
     get_all_batteries,
-    update_battery_status
+    transition_battery_status,
+    battery_exists,
+    find_battery_ids,
+    get_export_page
 )
+from stats import fleet_stats
+from services import build_battery_with_modules
+from qrcodes import (
+    qr_cache,
+    qr_etag,
+    etag_matches,
+    passport_url,
+    render_cached,
+    render_many,
+    stream_zip,
+    stream_label_sheet_pdf,
+    QR_CACHE_MAX_AGE,
+    QR_BULK_MAX
+)
+from export import (
+    iter_export_pages,
+    stream_csv,
+    stream_parquet,
+    parquet_available,
+    EXPORT_PAGE_SIZE
+)
+from importer import run_import, iter_lines, IMPORT_BATCH_SIZE
 from datetime import datetime
 
 router = APIRouter()
 
-# URL du frontend pour le passeport (à configurer en variable d'environnement)
-FRONTEND_BASE_URL = os.getenv("FRONTEND_BASE_URL", "https://battery-passport-repo.onrender.com")
-
 # ============================================
 # GET - Liste des batteries
 # ============================================
 
-@router.get("/", response_model=List[BatteryListItem])
+@router.get("/", response_model=Union[List[BatteryListItem], BatteryPage])
 async def list_batteries(
-    status: Optional[str] = Query(None, description="Filtrer par statut (Original, Waste, Reused, Repurposed)")
+    response: Response,
+    status: Optional[str] = Query(None, description="Filtrer par statut (Original, Waste, Reused, Repurposed)"),
+    manufacturer: Optional[str] = Query(None, description="Filtrer par fabricant"),
+    model: Optional[str] = Query(None, description="Filtrer par modèle"),
+    search: Optional[str] = Query(None, min_length=1, description="Préfixe de batteryId (recherche, autocomplétion)"),
+    cursor: Optional[str] = Query(None, description="Curseur de pagination (nextCursor / en-tête X-Next-Cursor de la page précédente)"),
+    limit: int = Query(100, ge=1, le=1000, description="Nombre maximum de batteries par page"),
+    envelope: bool = Query(False, description="Réponse {items, nextCursor} au lieu de la liste seule")
 ):
     """
-    Liste toutes les batteries avec leur statut.
-    Optionnel: filtrer par statut.
+    Liste les batteries avec leur statut, page par page.
+    Optionnel: filtrer par statut, fabricant, modèle ou préfixe d'ID.
+    Le curseur de la page suivante est renvoyé dans l'en-tête X-Next-Cursor
+    (absent sur la dernière page) et, avec `envelope=true`, dans le corps.
     """
     try:
-        batteries = get_all_batteries()
+        # Une ligne de plus pour savoir s'il reste une page
+        batteries = await get_all_batteries(
+            status=status,
+            manufacturer=manufacturer,
+            model=model,
+            cursor=cursor,
+            limit=limit + 1,
+            search=search
+        )
         
-        # Filtrer par statut si demandé
-        if status:
-            batteries = [b for b in batteries if b.get("status") == status]
+        next_cursor = None
+        if len(batteries) > limit:
+            batteries = batteries[:limit]
+            next_cursor = batteries[-1]["batteryId"]
+            response.headers[NEXT_CURSOR_HEADER] = next_cursor
         
+        if envelope:
+            return BatteryPage(items=batteries, nextCursor=next_cursor)
         return batteries
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+# ============================================
+# POST - Import en masse (CSV / JSONL)
+# ============================================
+
+@router.post(
+    "/import",
+    response_model=APIResponse,
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "application/x-ndjson": {"schema": {"type": "string"}},
+                "text/csv": {"schema": {"type": "string"}}
+            }
+        }
+    }
+)
+async def import_batteries(
+    request: Request,
+    format: ImportFormat = Query(ImportFormat.JSONL, description="Format du corps (jsonl, csv)"),
+    batch_size: int = Query(IMPORT_BATCH_SIZE, ge=1, le=10000, description="Batteries par transaction UNWIND")
+):
+    """
+    Importe un catalogue de passeports (BatteryImportRecord avec modules).
+    JSONL: un enregistrement par ligne. CSV: une ligne par module, colonnes
+    de la batterie répétées (même disposition que GET /battery/export).
+    Les enregistrements sont validés au fil de l'eau et écrits par lots;
+    les lignes invalides et celles des lots refusés par Neo4j sont rapportées
+    sans interrompre l'import.
+    """
+    try:
+        report = await run_import(iter_lines(request.stream()), format, batch_size)
+        
+        return APIResponse(
+            success=report["invalid"] == 0,
+            message=(
+                f"Import: {report['imported']}/{report['received']} batteries "
+                f"en {report['batches']} lot(s)"
+            ),
+            data=report
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+# ============================================
+# GET - Export de la flotte (CSV / Parquet)
+# ============================================
+
+@router.get("/export", response_class=StreamingResponse)
+async def export_batteries(
+    format: ExportFormat = Query(ExportFormat.CSV, description="Format de sortie (csv, parquet)"),
+    status: Optional[str] = Query(None, description="Filtrer par statut"),
+    manufacturer: Optional[str] = Query(None, description="Filtrer par fabricant")
+):
+    """
+    Exporte toute la flotte (batterie, modèle, fabricant, composition, modules)
+    avec une ligne par module. Le résultat est lu page par page et envoyé en
+    streaming (blocs CSV ou row groups Parquet), à mémoire constante.
+    """
+    try:
+        if format == ExportFormat.PARQUET and not parquet_available():
+            raise HTTPException(status_code=501, detail="Export Parquet indisponible (pyarrow non installé)")
+        
+        # Première page lue avant l'envoi des en-têtes: les erreurs Neo4j restent des 500
+        first_page = await get_export_page(status, manufacturer, None, EXPORT_PAGE_SIZE)
+        pages = iter_export_pages(status, manufacturer, first_page=first_page)
+        stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        
+        if format == ExportFormat.PARQUET:
+            content = stream_parquet(pages)
+            media_type = "application/vnd.apache.parquet"
+        else:
+            content = stream_csv(pages)
+            media_type = "text/csv; charset=utf-8"
+        
+        return StreamingResponse(
+            content,
+            media_type=media_type,
+            headers={"Content-Disposition": f"attachment; filename=batteries_{stamp}.{format.value}"}
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 # ============================================
 # GET - Détails d'une batterie
 # ============================================
@@ -68,7 +205,7 @@ async def get_battery(battery_id: str):
     Inclut: modèle, fabricant, type, composition, statut.
     """
     try:
-        result = get_battery_by_id(battery_id)
+        result = await get_battery_by_id(battery_id)
         
         if not result:
             raise HTTPException(status_code=404, detail=f"Batterie {battery_id} non trouvée")
@@ -113,41 +250,12 @@ async def get_battery_full(battery_id: str):
     Inclut: indicateurs de défaillance par module.
     """
     try:
-        # Récupérer la batterie
-        result = get_battery_by_id(battery_id)
+        # Récupérer la batterie et ses modules (une seule requête)
+        result = await get_battery_with_modules(battery_id)
         if not result:
             raise HTTPException(status_code=404, detail=f"Batterie {battery_id} non trouvée")
         
-        # Récupérer les modules
-        modules = get_battery_modules(battery_id)
-        
-        # Extraire les données
-        battery = result.get("b", {})
-        model = result.get("m", {})
-        company = result.get("c", {})
-        battery_type = result.get("t", {})
-        composition = result.get("comp", {})
-        
-        # Calculer les stats de défaillance
-        defective_modules = [m for m in modules if m.get("isDefective")]
-        
-        return BatteryWithModules(
-            batteryId=battery.get("batteryId"),
-            batteryPassportId=battery.get("batteryPassportId"),
-            serialNumber=battery.get("serialNumber"),
-            status=battery.get("status", "Original"),
-            manufacturingDate=str(battery.get("manufacturingDate")) if battery.get("manufacturingDate") else None,
-            warrantyPeriod=battery.get("warrantyPeriod"),
-            massKg=battery.get("massKg"),
-            carbonFootprint=battery.get("carbonFootprint"),
-            modelName=model.get("name") if model else None,
-            manufacturer=company.get("name") if company else None,
-            batteryType=battery_type.get("name") if battery_type else None,
-            composition=composition.get("id") if composition else None,
-            modules=modules,
-            hasDefectiveModule=len(defective_modules) > 0,
-            defectiveModulesCount=len(defective_modules)
-        )
+        return build_battery_with_modules(result)
     except HTTPException:
         raise
     except Exception as e:
@@ -165,18 +273,13 @@ async def change_battery_status(battery_id: str, request: StatusChangeRequest):
     Utilisé par le Propriétaire BP pour passer de Original → Waste, etc.
     """
     try:
-        # Vérifier que la batterie existe
-        current = get_battery_by_id(battery_id)
-        if not current:
+        # Lecture de l'ancien statut et changement en une seule transaction
+        result = await transition_battery_status(request.newStatus.value, battery_id=battery_id)
+        if not result:
             raise HTTPException(status_code=404, detail=f"Batterie {battery_id} non trouvée")
         
-        previous_status = current.get("b", {}).get("status", "Original")
-        
-        # Changer le statut
-        result = update_battery_status(battery_id, request.newStatus.value)
-        
-        if not result:
-            raise HTTPException(status_code=500, detail="Échec du changement de statut")
+        previous_status = result["previousStatus"] or "Original"
+        fleet_stats.record_status_change(result["previousStatus"], request.newStatus.value)
         
         return StatusChangeResponse(
             batteryId=battery_id,
@@ -187,6 +290,8 @@ async def change_battery_status(battery_id: str, request: StatusChangeRequest):
         )
     except HTTPException:
         raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -197,43 +302,40 @@ async def change_battery_status(battery_id: str, request: StatusChangeRequest):
 
 @router.get("/{battery_id}/qrcode", response_class=StreamingResponse)
 async def generate_qr_code(
+    request: Request,
     battery_id: str,
     size: int = Query(10, ge=5, le=50, description="Taille du QR code (box_size)")
 ):
     """
     Génère un QR code pour une batterie.
     Le QR code pointe vers l'URL du passeport sur le FRONTEND (pas l'API).
+    Les PNG sont mis en cache (ETag fort, 304 si If-None-Match correspond).
     """
     try:
-        # Vérifier que la batterie existe
-        result = get_battery_by_id(battery_id)
-        if not result:
-            raise HTTPException(status_code=404, detail=f"Batterie {battery_id} non trouvée")
-        
-        # URL du passeport sur le FRONTEND (pas l'API!)
-        passport_url = f"{FRONTEND_BASE_URL}/passport/{battery_id}"
+        etag = qr_etag(battery_id, size)
+        headers = {
+            "ETag": etag,
+            "Cache-Control": f"public, max-age={QR_CACHE_MAX_AGE}"
+        }
         
-        # Générer le QR code
-        qr = qrcode.QRCode(
-            version=1,
-            error_correction=qrcode.constants.ERROR_CORRECT_L,
-            box_size=size,
-            border=4,
-        )
-        qr.add_data(passport_url)
-        qr.make(fit=True)
-        
-        img = qr.make_image(fill_color="black", back_color="white")
+        # Le client a déjà cette image: ni requête Neo4j ni rendu
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers=headers)
         
-        # Convertir en bytes
-        buffer = BytesIO()
-        img.save(buffer, format="PNG")
-        buffer.seek(0)
+        png = await qr_cache.aget(etag)
+        if png is None:
+            # Vérifier que la batterie existe
+            if not await battery_exists(battery_id):
+                raise HTTPException(status_code=404, detail=f"Batterie {battery_id} non trouvée")
+            
+            # Rendu et mise en cache (débordement disque) hors de la boucle d'événements
+            png = await run_in_threadpool(render_cached, battery_id, size)
         
-        return StreamingResponse(
-            buffer,
+        return Response(
+            content=png,
             media_type="image/png",
             headers={
+                **headers,
                 "Content-Disposition": f"inline; filename={battery_id}_qrcode.png"
             }
         )
@@ -251,34 +353,88 @@ async def save_qr_code(battery_id: str):
     """
     try:
         # Vérifier que la batterie existe
-        result = get_battery_by_id(battery_id)
-        if not result:
+        if not await battery_exists(battery_id):
             raise HTTPException(status_code=404, detail=f"Batterie {battery_id} non trouvée")
         
         # URL du passeport sur le FRONTEND
-        passport_url = f"{FRONTEND_BASE_URL}/passport/{battery_id}"
-        
-        # Générer le QR code
-        qr = qrcode.QRCode(
-            version=1,
-            error_correction=qrcode.constants.ERROR_CORRECT_L,
-            box_size=10,
-            border=4,
-        )
-        qr.add_data(passport_url)
-        qr.make(fit=True)
+        url = passport_url(battery_id)
         
-        img = qr.make_image(fill_color="black", back_color="white")
+        etag = qr_etag(battery_id, 10)
+        png = await qr_cache.aget(etag)
+        if png is None:
+            png = await run_in_threadpool(render_cached, battery_id, 10)
         
         # Sauvegarder
         qr_path = f"static/qrcodes/{battery_id}.png"
         os.makedirs("static/qrcodes", exist_ok=True)
-        img.save(qr_path)
+        with open(qr_path, "wb") as f:
+            f.write(png)
         
         return QRCodeResponse(
             batteryId=battery_id,
             qrCodeUrl=f"/static/qrcodes/{battery_id}.png",
-            passportUrl=passport_url
+            passportUrl=url
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/qrcode/bulk", response_class=StreamingResponse)
+async def generate_qr_codes_bulk(request: QRBulkRequest):
+    """
+    Génère les étiquettes QR d'une palette en une requête.
+    Sélection par liste d'IDs (toutes doivent exister) et/ou par statut.
+    Retourne un ZIP de PNG ou un PDF de planches A4 prêtes à imprimer.
+    """
+    try:
+        if request.batteryIds is None and not request.status:
+            raise HTTPException(status_code=400, detail="Fournir batteryIds ou status")
+        
+        requested = list(dict.fromkeys(request.batteryIds)) if request.batteryIds is not None else None
+        if requested is not None and len(requested) > QR_BULK_MAX:
+            raise HTTPException(status_code=400, detail=f"Maximum {QR_BULK_MAX} étiquettes par requête")
+        
+        # Vérification de toutes les batteries en une seule requête
+        battery_ids = await find_battery_ids(requested, request.status, limit=QR_BULK_MAX + 1)
+        
+        if requested is not None:
+            missing = sorted(set(requested) - set(battery_ids))
+            if missing:
+                raise HTTPException(
+                    status_code=404,
+                    detail=f"{len(missing)} batterie(s) non trouvée(s): {', '.join(missing[:20])}"
+                )
+            # Conserver l'ordre demandé (ordre de la palette)
+            battery_ids = requested
+        
+        if not battery_ids:
+            raise HTTPException(status_code=404, detail="Aucune batterie ne correspond à la sélection")
+        if len(battery_ids) > QR_BULK_MAX:
+            raise HTTPException(status_code=400, detail=f"Maximum {QR_BULK_MAX} étiquettes par requête")
+        
+        # Rendu parallèle (pool de processus); l'archive est assemblée pendant
+        # l'envoi (générateur itéré hors boucle d'événements par StreamingResponse)
+        labels = await run_in_threadpool(render_many, battery_ids, request.size)
+        stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        
+        if request.format == QRBulkFormat.PDF:
+            content = stream_label_sheet_pdf(labels)
+            media_type = "application/pdf"
+            filename = f"qrcodes_{stamp}.pdf"
+        else:
+            content = stream_zip(labels)
+            media_type = "application/zip"
+            filename = f"qrcodes_{stamp}.zip"
+        
+        return StreamingResponse(
+            content,
+            media_type=media_type,
+            headers={
+                "Content-Disposition": f"attachment; filename={filename}",
+                "X-Labels-Count": str(len(labels))
+            }
         )
     except HTTPException:
         raise
@@ -298,8 +454,8 @@ async def list_defective_batteries():
     """
     try:
         query = """
-        MATCH (b:BatteryInstance)-[:HAS_MODULE]->(m:Module)
-        WHERE m.internalResistance > m.maxResistance
+        MATCH (m:Module:Defective)
+        MATCH (b:BatteryInstance)-[:HAS_MODULE]->(m)
         WITH b, collect({
             moduleId: m.moduleId,
             resistance: m.internalResistance,
@@ -310,6 +466,6 @@ async def list_defective_batteries():
                defectiveModules,
                size(defectiveModules) AS defectiveCount
         """
-        return db.execute_query(query)
+        return await async_db.execute_query(query)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
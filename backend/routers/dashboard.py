@@ -0,0 +1,170 @@
+"""
+Router Dashboard - Agrégats par rôle
+Un appel par écran: chaque interface reçoit exactement ce qu'elle affiche,
+construit par une requête Cypher multi-parties et les caches en mémoire
+(statistiques, notifications) interrogés en parallèle
+"""
+
+import os
+import time
+import asyncio
+from fastapi import APIRouter, HTTPException, Query, Response
+
+from database import (
+    get_battery_with_modules,
+    get_notifications,
+    get_owner_dashboard,
+    get_sorting_dashboard
+)
+from models import MarketDemand
+from stats import fleet_stats
+from notification_store import notification_repo
+from services import build_battery_with_modules, build_diagnostic
+
+router = APIRouter()
+
+
+# Durée de vie des agrégats (secondes): cache serveur et Cache-Control client
+DASHBOARD_CACHE_TTL = int(os.getenv("DASHBOARD_CACHE_TTL", 5))
+
+# Agrégats graphe en cours ou récents: clé -> (expiration, tâche)
+_graph_cache = {}
+
+
+async def cached_graph_query(key: tuple, loader):
+    """
+    Partie graphe d'un tableau de bord, partagée pendant DASHBOARD_CACHE_TTL.
+    Les appels simultanés attendent la même requête (une seule vers Neo4j).
+    """
+    now = time.monotonic()
+    entry = _graph_cache.get(key)
+    if entry is None or entry[0] <= now:
+        # Purge des entrées expirées (clés bornées par les paramètres)
+        for stale in [k for k, (expires, _) in _graph_cache.items() if expires <= now]:
+            del _graph_cache[stale]
+        entry = (now + DASHBOARD_CACHE_TTL, asyncio.ensure_future(loader()))
+        _graph_cache[key] = entry
+    try:
+        return await asyncio.shield(entry[1])
+    except Exception:
+        if _graph_cache.get(key) is entry:
+            del _graph_cache[key]
+        raise
+
+
+def set_cache_headers(response: Response):
+    response.headers["Cache-Control"] = f"private, max-age={DASHBOARD_CACHE_TTL}"
+
+
+async def recent_notifications(battery_id: str = None, limit: int = 10):
+    """Dernières notifications: fenêtre en mémoire, Neo4j si elle ne suffit pas"""
+    notifications = await notification_repo.recent(battery_id=battery_id, limit=limit)
+    if notifications is None:
+        notifications = await get_notifications(battery_id=battery_id, limit=limit)
+    return notifications
+
+
+# ============================================
+# GET - Tableau de bord Propriétaire BP
+# ============================================
+
+@router.get("/proprietaire", response_model=dict)
+async def owner_dashboard(
+    response: Response,
+    alerts_limit: int = Query(5, ge=1, le=100, description="Nombre d'alertes (les plus en surcharge)"),
+    notifications_limit: int = Query(10, ge=1, le=100, description="Nombre de notifications récentes"),
+    queue_limit: int = Query(20, ge=1, le=200, description="Nombre de batteries de la file Waste")
+):
+    """
+    Écran d'accueil du Propriétaire BP en un appel: statistiques,
+    non lues, top alertes, notifications récentes et file Waste
+    (batteries signalées ou validées hors d'usage).
+    """
+    try:
+        stats, unread_count, notifications, graph = await asyncio.gather(
+            fleet_stats.get(),
+            notification_repo.unread_count(),
+            recent_notifications(limit=notifications_limit),
+            cached_graph_query(
+                ("proprietaire", alerts_limit, queue_limit),
+                lambda: get_owner_dashboard(alerts_limit, queue_limit)
+            )
+        )
+        
+        set_cache_headers(response)
+        return {
+            "stats": stats,
+            "unreadCount": unread_count,
+            "alerts": graph["alerts"],
+            "notifications": notifications,
+            "wasteQueueSize": graph["wasteQueueSize"],
+            "wasteQueue": graph["wasteQueue"]
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+# ============================================
+# GET - Tableau de bord Garagiste
+# ============================================
+
+@router.get("/garagiste/{battery_id}", response_model=dict)
+async def garage_dashboard(
+    response: Response,
+    battery_id: str,
+    notifications_limit: int = Query(10, ge=1, le=100, description="Nombre de notifications de la batterie")
+):
+    """
+    Batterie scannée par le Garagiste en un appel: fiche complète
+    avec modules, diagnostic et dernières notifications de la batterie.
+    """
+    try:
+        result, notifications = await asyncio.gather(
+            get_battery_with_modules(battery_id),
+            recent_notifications(battery_id=battery_id, limit=notifications_limit)
+        )
+        if not result:
+            raise HTTPException(status_code=404, detail=f"Batterie {battery_id} non trouvée")
+        
+        diagnostic = build_diagnostic(battery_id, result) if result["modules"] else None
+        
+        set_cache_headers(response)
+        return {
+            "battery": build_battery_with_modules(result),
+            "diagnostic": diagnostic["diagnostic"] if diagnostic else None,
+            "recommendation": diagnostic["recommendation"] if diagnostic else None,
+            "notifications": notifications
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+# ============================================
+# GET - Tableau de bord Centre de tri
+# ============================================
+
+@router.get("/centre-tri", response_model=dict)
+async def sorting_dashboard(
+    response: Response,
+    queue_limit: int = Query(50, ge=1, le=500, description="Nombre de batteries Waste à traiter"),
+    market_demand: MarketDemand = Query(MarketDemand.NORMAL, description="Demande marché des décisions affichées: low, normal, high")
+):
+    """
+    File de traitement du Centre de tri en un appel: batteries Waste
+    avec SOH moyen, modules défaillants et décision déjà enregistrée.
+    """
+    try:
+        graph = await cached_graph_query(
+            ("centre-tri", queue_limit, market_demand.value),
+            lambda: get_sorting_dashboard(queue_limit, market_demand.value)
+        )
+        
+        set_cache_headers(response)
+        return {
+            "queueSize": graph["queueSize"],
+            "queue": graph["queue"]
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
@@ -0,0 +1,75 @@
+"""
+Router Événements - Push temps réel (Server-Sent Events)
+Remplace le polling des dashboards sur les notifications et les alertes
+"""
+
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from typing import List, Optional
+
+from realtime import (
+    event_broker,
+    format_sse,
+    EVENT_TYPES,
+    EVENT_UNREAD,
+    EVENTS_HEARTBEAT
+)
+from notification_store import notification_repo
+
+router = APIRouter()
+
+
+# ============================================
+# GET - Flux d'événements (SSE)
+# ============================================
+
+@router.get("/stream", response_class=StreamingResponse)
+async def stream_events(
+    request: Request,
+    battery_id: Optional[str] = Query(None, description="Filtrer par batterie"),
+    urgency: Optional[str] = Query(None, description="Filtrer par urgence (low, normal, high)"),
+    types: Optional[List[str]] = Query(None, description="Types d'événements (notification, alert, unread)")
+):
+    """
+    Flux text/event-stream des nouvelles notifications (`notification`),
+    des nouveaux dépassements de seuil (`alert`) et du compteur de non lues
+    (`unread`, envoyé aussi à la connexion).
+    Un événement `lagged` signale des événements perdus par un client trop
+    lent: il doit alors recharger l'état via l'API REST.
+    """
+    try:
+        if types:
+            unknown = sorted(set(types) - set(EVENT_TYPES))
+            if unknown:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Type(s) inconnu(s): {', '.join(unknown)}. Valeurs: {', '.join(EVENT_TYPES)}"
+                )
+        
+        unread_count = await notification_repo.unread_count()
+        
+        async def event_stream():
+            # Abonnement au démarrage du flux: rien à désinscrire si la réponse n'est jamais envoyée
+            subscriber = event_broker.subscribe(battery_id=battery_id, urgency=urgency, types=types)
+            try:
+                if subscriber.accepts(EVENT_UNREAD, {}):
+                    yield format_sse(None, EVENT_UNREAD, {"unreadCount": unread_count})
+                while not await request.is_disconnected():
+                    event = await subscriber.next_event(EVENTS_HEARTBEAT)
+                    if event is None:
+                        # Keep-alive (proxys) et détection de déconnexion
+                        yield ": keep-alive\n\n"
+                        continue
+                    yield format_sse(*event)
+            finally:
+                event_broker.unsubscribe(subscriber)
+        
+        return StreamingResponse(
+            event_stream(),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
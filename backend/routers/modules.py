@@ -4,7 +4,8 @@ Endpoints pour recevoir les données du BMS (Wokwi/micro:bit)
 et analyser l'état des modules de batterie
 """
 
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+from pydantic import ValidationError
 from typing import List, Optional
 from datetime import datetime
 
@@ -12,14 +13,53 @@ from models import (
     ModuleResponse,
     TelemetryInput,
     APIResponse,
-    DecisionCriteria,
     DecisionRecommendation,
-    DecisionType
+    DecisionBatchRequest,
+    DecisionBatchResponse,
+    MarketDemand
 )
-from database import db, get_battery_modules, get_battery_by_id
+from database import (
+    async_db,
+    get_battery_modules,
+    get_battery_with_modules,
+    apply_telemetry,
+    apply_telemetry_batch,
+    find_battery_ids
+)
+from stats import fleet_stats
+from services import build_diagnostic
+from decision import decide_batteries, DECISION_BATCH_MAX
+from timeseries import RESOLUTIONS, get_module_history, as_utc
+from realtime import event_broker, EVENT_ALERT
+from importer import iter_lines
 
 router = APIRouter()
 
+# Nombre maximum d'erreurs de validation renvoyées par l'ingestion en masse
+MAX_REPORTED_ERRORS = 100
+
+
+def build_alert(row: dict) -> dict:
+    """Construit une alerte à partir d'un module mis à jour en dépassement"""
+    return {
+        "moduleId": row["moduleId"],
+        "resistance": row["resistance"],
+        "maxResistance": row["maxResistance"],
+        "message": f"⚠️ Module {row['moduleId']} défaillant: résistance {row['resistance']}Ω > max {row['maxResistance']}Ω"
+    }
+
+
+def publish_breaches(battery_id: str, updated: list):
+    """Diffuse (SSE) les modules qui viennent de franchir leur seuil"""
+    for row in updated:
+        if row["isDefective"] and not row["wasDefective"]:
+            event_broker.publish(EVENT_ALERT, {
+                "batteryId": battery_id,
+                "urgency": "high",
+                "timestamp": datetime.now().isoformat(),
+                **build_alert(row)
+            })
+
 
 # ============================================
 # GET - Modules d'une batterie
@@ -32,12 +72,12 @@ async def get_modules(battery_id: str):
     Inclut l'indicateur isDefective pour chaque module.
     """
     try:
-        # Vérifier que la batterie existe
-        battery = get_battery_by_id(battery_id)
+        # Vérifier que la batterie existe et récupérer ses modules (une seule requête)
+        battery = await get_battery_with_modules(battery_id)
         if not battery:
             raise HTTPException(status_code=404, detail=f"Batterie {battery_id} non trouvée")
         
-        modules = get_battery_modules(battery_id)
+        modules = battery["modules"]
         
         if not modules:
             raise HTTPException(status_code=404, detail=f"Aucun module trouvé pour {battery_id}")
@@ -60,13 +100,61 @@ async def get_defective_modules(battery_id: str):
     Un module est défaillant si internalResistance > maxResistance.
     """
     try:
-        modules = get_battery_modules(battery_id)
+        modules = await get_battery_modules(battery_id)
         defective = [m for m in modules if m.get("isDefective")]
         return defective
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+# ============================================
+# GET - Historique de télémétrie (séries agrégées)
+# ============================================
+
+@router.get("/battery/{battery_id}/history", response_model=dict)
+async def get_modules_history(
+    battery_id: str,
+    module_id: Optional[str] = Query(None, description="Limiter à un module"),
+    resolution: str = Query("1h", description="Résolution des agrégats (1m, 1h, 1d)"),
+    start: Optional[datetime] = Query(None, description="Début de la fenêtre (défaut selon la résolution)"),
+    end: Optional[datetime] = Query(None, description="Fin de la fenêtre (défaut: maintenant)")
+):
+    """
+    Historique agrégé (moyenne, min, max) des métriques de chaque module.
+    Lit les agrégats pré-calculés à l'ingestion, sans parcourir les points bruts.
+    Les dates sans fuseau horaire sont interprétées en UTC.
+    """
+    try:
+        if resolution not in RESOLUTIONS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Résolution invalide: {resolution}. Valeurs: {', '.join(RESOLUTIONS)}"
+            )
+        start, end = as_utc(start), as_utc(end)
+        if start and end and start >= end:
+            raise HTTPException(status_code=400, detail="La fenêtre doit vérifier start < end")
+        
+        history = await get_module_history(
+            battery_id,
+            RESOLUTIONS[resolution],
+            start=start,
+            end=end,
+            module_id=module_id
+        )
+        if not history["modules"]:
+            raise HTTPException(status_code=404, detail=f"Aucun module trouvé pour {battery_id}")
+        
+        return {
+            "batteryId": battery_id,
+            "resolution": resolution,
+            **history
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 # ============================================
 # POST - Recevoir télémétrie du BMS
 # ============================================
@@ -83,46 +171,20 @@ async def receive_telemetry(data: TelemetryInput):
     try:
         battery_id = data.batteryId
         
-        # Vérifier que la batterie existe
-        battery = get_battery_by_id(battery_id)
-        if not battery:
+        # Une seule transaction pour toute la trame (vérification + mise à jour)
+        result = await apply_telemetry(
+            battery_id,
+            [module.model_dump() for module in data.modules],
+            data.timestamp.isoformat() if data.timestamp else None
+        )
+        if not result["batteryExists"]:
             raise HTTPException(status_code=404, detail=f"Batterie {battery_id} non trouvée")
         
-        alerts = []
-        updated_count = 0
-        
-        for module in data.modules:
-            # Mettre à jour le module dans Neo4j
-            query = """
-            MATCH (b:BatteryInstance {batteryId: $battery_id})-[:HAS_MODULE]->(m:Module {moduleId: $module_id})
-            SET m.internalResistance = $resistance,
-                m.voltage = $voltage,
-                m.temperature = $temperature,
-                m.soh = $soh,
-                m.lastUpdate = datetime()
-            RETURN m.moduleId AS moduleId,
-                   m.internalResistance AS resistance,
-                   m.maxResistance AS maxResistance
-            """
-            result = db.execute_query(query, {
-                "battery_id": battery_id,
-                "module_id": module.moduleId,
-                "resistance": module.internalResistance,
-                "voltage": module.voltage,
-                "temperature": module.temperature,
-                "soh": module.soh
-            })
-            
-            if result:
-                updated_count += 1
-                # Vérifier si le module est défaillant
-                if module.internalResistance > module.maxResistance:
-                    alerts.append({
-                        "moduleId": module.moduleId,
-                        "resistance": module.internalResistance,
-                        "maxResistance": module.maxResistance,
-                        "message": f"⚠️ Module {module.moduleId} défaillant: résistance {module.internalResistance}Ω > max {module.maxResistance}Ω"
-                    })
+        updated = result["updated"]
+        updated_count = len(updated)
+        fleet_stats.record_telemetry(updated)
+        publish_breaches(battery_id, updated)
+        alerts = [build_alert(row) for row in updated if row["isDefective"]]
         
         return APIResponse(
             success=True,
@@ -140,6 +202,114 @@ async def receive_telemetry(data: TelemetryInput):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+# ============================================
+# POST - Télémétrie en masse (NDJSON, flotte complète)
+# ============================================
+
+@router.post(
+    "/telemetry/bulk",
+    response_model=APIResponse,
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {"application/x-ndjson": {"schema": {"type": "string"}}}
+        }
+    }
+)
+async def receive_bulk_telemetry(
+    request: Request,
+    batch_size: int = Query(500, ge=1, le=5000, description="Nombre de trames par transaction UNWIND")
+):
+    """
+    Reçoit un flux NDJSON de trames TelemetryInput (une par ligne, plusieurs batteries).
+    Les trames sont validées au fil de l'eau puis appliquées par lots
+    de `batch_size` dans une seule transaction Neo4j par lot.
+    Retourne un résumé par batterie (mises à jour et alertes).
+    
+    Appelé par la passerelle de flotte à la place de milliers de POST /telemetry.
+    """
+    try:
+        summary = {}
+        unknown_batteries = set()
+        errors = []
+        frames_received = 0
+        frames_applied = 0
+        invalid_frames = 0
+        batches = 0
+        pending = []
+        
+        async def flush():
+            nonlocal frames_applied, batches
+            rows = await apply_telemetry_batch(pending)
+            batches += 1
+            for row in rows:
+                battery_id = row["batteryId"]
+                if not row["batteryExists"]:
+                    unknown_batteries.add(battery_id)
+                    continue
+                frames_applied += 1
+                fleet_stats.record_telemetry(row["updated"])
+                publish_breaches(battery_id, row["updated"])
+                defective = [m["moduleId"] for m in row["updated"] if m["isDefective"]]
+                entry = summary.setdefault(battery_id, {"frames": 0, "modulesUpdated": 0, "alerts": 0})
+                entry["frames"] += 1
+                entry["modulesUpdated"] += len(row["updated"])
+                entry["alerts"] += len(defective)
+                # État de la dernière trame reçue pour cette batterie
+                entry["defectiveModuleIds"] = defective
+            pending.clear()
+        
+        line_number = 0
+        async for line in iter_lines(request.stream()):
+            line_number += 1
+            if not line.strip():
+                continue
+            frames_received += 1
+            try:
+                frame = TelemetryInput.model_validate_json(line)
+            except ValidationError as e:
+                invalid_frames += 1
+                if len(errors) < MAX_REPORTED_ERRORS:
+                    errors.append({
+                        "line": line_number,
+                        "error": e.errors(include_url=False, include_context=False, include_input=False)
+                    })
+                continue
+            
+            pending.append({
+                "batteryId": frame.batteryId,
+                "modules": [module.model_dump() for module in frame.modules],
+                "timestamp": frame.timestamp.isoformat() if frame.timestamp else None
+            })
+            if len(pending) >= batch_size:
+                await flush()
+        
+        if pending:
+            await flush()
+        
+        return APIResponse(
+            success=True,
+            message=(
+                f"Télémétrie en masse: {frames_applied}/{frames_received} trames appliquées "
+                f"sur {len(summary)} batteries en {batches} lot(s)"
+            ),
+            data={
+                "framesReceived": frames_received,
+                "framesApplied": frames_applied,
+                "invalidFrames": invalid_frames,
+                "batches": batches,
+                "batteries": summary,
+                "unknownBatteries": sorted(unknown_batteries),
+                "errors": errors,
+                "timestamp": datetime.now().isoformat()
+            }
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 # ============================================
 # GET - Diagnostic complet
 # ============================================
@@ -152,61 +322,15 @@ async def get_diagnostic(battery_id: str):
     Utilisé par le Garagiste pour évaluer l'état de la batterie.
     """
     try:
-        # Récupérer la batterie et ses modules
-        battery = get_battery_by_id(battery_id)
+        # Récupérer la batterie et ses modules (une seule requête)
+        battery = await get_battery_with_modules(battery_id)
         if not battery:
             raise HTTPException(status_code=404, detail=f"Batterie {battery_id} non trouvée")
         
-        modules = get_battery_modules(battery_id)
-        
-        if not modules:
+        if not battery["modules"]:
             raise HTTPException(status_code=404, detail="Aucun module trouvé")
         
-        # Calculer les statistiques
-        total_soh = sum(m.get("soh", 0) for m in modules)
-        avg_soh = total_soh / len(modules)
-        
-        total_resistance_ratio = sum(
-            m.get("internalResistance", 0) / m.get("maxResistance", 1) 
-            for m in modules
-        )
-        avg_resistance_ratio = total_resistance_ratio / len(modules)
-        
-        defective_modules = [m for m in modules if m.get("isDefective")]
-        
-        avg_temp = sum(m.get("temperature", 0) for m in modules) / len(modules)
-        avg_voltage = sum(m.get("voltage", 0) for m in modules) / len(modules)
-        
-        # Déterminer l'état global
-        if len(defective_modules) > 0:
-            health_status = "CRITICAL"
-            recommendation = "Batterie hors d'usage - Signaler au Propriétaire BP"
-        elif avg_soh < 70:
-            health_status = "WARNING"
-            recommendation = "SOH faible - Surveillance recommandée"
-        elif avg_soh < 80:
-            health_status = "FAIR"
-            recommendation = "État acceptable - Contrôle dans 6 mois"
-        else:
-            health_status = "GOOD"
-            recommendation = "Batterie en bon état"
-        
-        return {
-            "batteryId": battery_id,
-            "status": battery.get("b", {}).get("status", "Unknown"),
-            "diagnostic": {
-                "healthStatus": health_status,
-                "avgSoh": round(avg_soh, 2),
-                "avgResistanceRatio": round(avg_resistance_ratio, 3),
-                "avgTemperature": round(avg_temp, 1),
-                "avgVoltage": round(avg_voltage, 2),
-                "totalModules": len(modules),
-                "defectiveModules": len(defective_modules),
-                "defectiveModuleIds": [m.get("moduleId") for m in defective_modules]
-            },
-            "recommendation": recommendation,
-            "modules": modules
-        }
+        return build_diagnostic(battery_id, battery)
     except HTTPException:
         raise
     except Exception as e:
@@ -225,8 +349,8 @@ async def get_all_alerts():
     """
     try:
         query = """
-        MATCH (b:BatteryInstance)-[:HAS_MODULE]->(m:Module)
-        WHERE m.internalResistance > m.maxResistance
+        MATCH (m:Module:Defective)
+        MATCH (b:BatteryInstance)-[:HAS_MODULE]->(m)
         RETURN b.batteryId AS batteryId,
                b.status AS batteryStatus,
                m.moduleId AS moduleId,
@@ -237,7 +361,7 @@ async def get_all_alerts():
                round((m.internalResistance / m.maxResistance) * 100) AS overloadPercent
         ORDER BY overloadPercent DESC
         """
-        return db.execute_query(query)
+        return await async_db.execute_query(query)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -248,139 +372,83 @@ async def get_all_alerts():
 
 @router.post("/battery/{battery_id}/decision", response_model=DecisionRecommendation)
 async def get_decision_recommendation(
+    response: Response,
     battery_id: str,
-    market_demand: str = Query("normal", description="Demande marché: low, normal, high")
+    market_demand: MarketDemand = Query(MarketDemand.NORMAL, description="Demande marché: low, normal, high")
 ):
     """
     Algorithme d'aide à la décision pour le Centre de tri (Défi #3).
     Analyse les critères et recommande: Recycle, Reuse, Remanufacture, Repurpose.
+    La décision enregistrée est réutilisée tant que ses entrées
+    (télémétrie des modules, demande marché, mois) n'ont pas changé.
     """
     try:
-        # Récupérer les données de la batterie
-        battery = get_battery_by_id(battery_id)
-        if not battery:
-            raise HTTPException(status_code=404, detail=f"Batterie {battery_id} non trouvée")
+        # Critères, décision enregistrée et recalcul si nécessaire
+        decided = await decide_batteries([battery_id], market_demand=market_demand.value)
         
-        modules = get_battery_modules(battery_id)
+        if not decided["rows"]:
+            raise HTTPException(status_code=404, detail=f"Batterie {battery_id} non trouvée")
         
-        if not modules:
+        if not decided["results"]:
             raise HTTPException(status_code=404, detail="Aucun module trouvé")
         
-        # Calculer les critères
-        avg_soh = sum(m.get("soh", 0) for m in modules) / len(modules)
-        defective_count = len([m for m in modules if m.get("isDefective")])
-        avg_resistance_ratio = sum(
-            m.get("internalResistance", 0) / m.get("maxResistance", 1) 
-            for m in modules
-        ) / len(modules)
-        
-        # Récupérer l'âge (en mois) depuis la date de fabrication
-        battery_data = battery.get("b", {})
-        manufacturing_date = battery_data.get("manufacturingDate")
-        if manufacturing_date:
-            from datetime import date
-            today = date.today()
-            # Neo4j retourne une date, calculer l'âge en mois
-            age_months = (today.year - manufacturing_date.year) * 12 + (today.month - manufacturing_date.month)
-        else:
-            age_months = 24  # Valeur par défaut
-        
-        # Récupérer la composition chimique
-        composition = battery.get("comp", {})
-        chemistry = composition.get("id", "NMC") if composition else "NMC"
-        
-        # ============================================
-        # ALGORITHME DE SCORING
-        # ============================================
-        
-        scores = {
-            "Recycle": 0,
-            "Reuse": 0,
-            "Remanufacture": 0,
-            "Repurpose": 0
-        }
-        
-        # 1. Score basé sur SOH (40% du poids)
-        if avg_soh >= 80:
-            scores["Reuse"] += 40
-            scores["Repurpose"] += 30
-        elif avg_soh >= 60:
-            scores["Repurpose"] += 35
-            scores["Remanufacture"] += 30
-            scores["Reuse"] += 20
-        elif avg_soh >= 40:
-            scores["Remanufacture"] += 35
-            scores["Recycle"] += 25
-            scores["Repurpose"] += 20
-        else:
-            scores["Recycle"] += 40
-            scores["Remanufacture"] += 15
-        
-        # 2. Score basé sur les modules défaillants (25% du poids)
-        if defective_count == 0:
-            scores["Reuse"] += 25
-            scores["Repurpose"] += 20
-        elif defective_count <= 2:
-            scores["Remanufacture"] += 25
-            scores["Repurpose"] += 15
-        else:
-            scores["Recycle"] += 25
-        
-        # 3. Score basé sur l'âge (15% du poids)
-        if age_months <= 24:
-            scores["Reuse"] += 15
-            scores["Repurpose"] += 10
-        elif age_months <= 48:
-            scores["Repurpose"] += 15
-            scores["Remanufacture"] += 10
-        else:
-            scores["Recycle"] += 15
-            scores["Remanufacture"] += 10
-        
-        # 4. Score basé sur la chimie (10% du poids)
-        if chemistry == "LFP":
-            scores["Reuse"] += 10  # LFP plus durable
-            scores["Repurpose"] += 8
-        elif chemistry == "NMC811" or chemistry == "NCA":
-            scores["Recycle"] += 10  # Matériaux plus précieux à recycler
-        
-        # 5. Score basé sur la demande marché (10% du poids)
-        if market_demand == "high":
-            scores["Reuse"] += 10
-            scores["Repurpose"] += 8
-        elif market_demand == "low":
-            scores["Recycle"] += 10
-        else:
-            scores["Remanufacture"] += 5
-            scores["Repurpose"] += 5
+        response.headers["X-Decision-Cache"] = "hit" if battery_id in decided["cached"] else "miss"
+        return DecisionRecommendation(**decided["results"][0])
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+# ============================================
+# POST - Aide à la décision en masse (Défi #3)
+# ============================================
+
+@router.post("/decision/batch", response_model=DecisionBatchResponse)
+async def get_decision_batch(request: DecisionBatchRequest):
+    """
+    Recommandations pour un lot de batteries (arrivage complet) en un appel.
+    Sélection par liste d'IDs et/ou par statut: avec les deux, seules les
+    batteries de la liste ayant ce statut sont évaluées (les autres sont
+    renvoyées dans statusMismatch). Au plus DECISION_BATCH_MAX batteries.
+    Les critères de toutes les batteries sont lus en une requête Cypher,
+    puis évalués ensemble par le moteur de décision vectorisé
+    (les décisions enregistrées encore valides sont réutilisées).
+    """
+    try:
+        if request.batteryIds is None and not request.status:
+            raise HTTPException(status_code=400, detail="Fournir batteryIds ou status")
         
-        # Déterminer la recommandation
-        recommendation = max(scores, key=scores.get)
-        confidence = scores[recommendation]
+        requested = list(dict.fromkeys(request.batteryIds)) if request.batteryIds is not None else None
+        if requested is None:
+            # Filtre statut seul: IDs lus d'abord pour appliquer le plafond
+            requested = await find_battery_ids(status=request.status, limit=DECISION_BATCH_MAX + 1)
+            if len(requested) > DECISION_BATCH_MAX:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Plus de {DECISION_BATCH_MAX} batteries au statut {request.status}: fournir batteryIds"
+                )
         
-        # Générer le raisonnement
-        reasons = []
-        if avg_soh < 60:
-            reasons.append(f"SOH moyen faible ({avg_soh:.1f}%)")
-        if defective_count > 0:
-            reasons.append(f"{defective_count} module(s) défaillant(s)")
-        if age_months > 36:
-            reasons.append(f"Batterie âgée ({age_months} mois)")
-        if chemistry == "LFP":
-            reasons.append("Chimie LFP favorable au réemploi")
-        if market_demand == "high":
-            reasons.append("Forte demande marché")
+        decided = await decide_batteries(requested, request.status, request.marketDemand.value)
+        rows = decided["rows"]
         
-        reasoning = ", ".join(reasons) if reasons else "Paramètres dans les normes"
+        found = {row["batteryId"] for row in rows}
+        not_found = [battery_id for battery_id in requested if battery_id not in found]
+        status_mismatch = []
+        if not_found and request.batteryIds is not None and request.status:
+            # Distinguer les batteries absentes de celles d'un autre statut
+            existing = set(await find_battery_ids(not_found))
+            status_mismatch = [battery_id for battery_id in not_found if battery_id in existing]
+            not_found = [battery_id for battery_id in not_found if battery_id not in existing]
+        without_modules = [row["batteryId"] for row in rows if row["moduleCount"] == 0]
         
-        return DecisionRecommendation(
-            batteryId=battery_id,
-            recommendation=DecisionType(recommendation),
-            confidence=confidence,
-            scores=scores,
-            reasoning=reasoning
+        return DecisionBatchResponse(
+            results=[DecisionRecommendation(**result) for result in decided["results"]],
+            notFound=not_found,
+            statusMismatch=status_mismatch,
+            withoutModules=without_modules
         )
     except HTTPException:
         raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
@@ -3,31 +3,32 @@ Router Notifications - Workflow de communication
 Gère les notifications entre Garagiste, Propriétaire BP et Centre de tri
 """
 
-from fastapi import APIRouter, HTTPException, Query
-from typing import List, Optional
+from fastapi import APIRouter, HTTPException, Query, Response
+from typing import List, Optional, Union
 from datetime import datetime
-import uuid
 
 from models import (
     NotificationCreate,
     NotificationResponse,
+    NotificationPage,
     StatusChangeRequest,
     StatusChangeResponse,
     APIResponse,
-    BatteryStatus
+    BatteryStatus,
+    NEXT_CURSOR_HEADER
 )
-from database import db, get_battery_by_id, update_battery_status
+from database import (
+    async_db,
+    get_battery_by_id,
+    transition_battery_status,
+    get_notifications,
+    encode_notification_cursor
+)
+from stats import fleet_stats
+from notification_store import notification_repo
 
 router = APIRouter()
 
-# ============================================
-# Stockage en mémoire des notifications
-# (En prod, utiliser Neo4j ou Redis)
-# ============================================
-
-notifications_store: List[dict] = []
-
-
 # ============================================
 # POST - Créer une notification
 # ============================================
@@ -39,60 +40,25 @@ async def create_notification(notification: NotificationCreate):
     Utilisé quand le garagiste détecte une batterie hors d'usage.
     """
     try:
-        # Vérifier que la batterie existe
-        battery = get_battery_by_id(notification.batteryId)
-        if not battery:
+        # Création dans Neo4j (vérifie l'existence de la batterie) puis mise en cache
+        created = await notification_repo.create(
+            battery_id=notification.batteryId,
+            message=notification.message,
+            sender_role=notification.senderRole,
+            sender_name=notification.senderName,
+            urgency=notification.urgency
+        )
+        if created is None:
             raise HTTPException(status_code=404, detail=f"Batterie {notification.batteryId} non trouvée")
         
-        # Créer la notification
-        notif_id = str(uuid.uuid4())[:8]
-        new_notification = {
-            "notificationId": notif_id,
-            "batteryId": notification.batteryId,
-            "message": notification.message,
-            "senderRole": notification.senderRole,
-            "senderName": notification.senderName,
-            "urgency": notification.urgency,
-            "createdAt": datetime.now(),
-            "read": False,
-            "status": "pending"  # pending, acknowledged, resolved
-        }
-        
-        notifications_store.append(new_notification)
-        
-        # Aussi créer un nœud Notification dans Neo4j (optionnel)
-        query = """
-        MATCH (b:BatteryInstance {batteryId: $battery_id})
-        CREATE (n:Notification {
-            notificationId: $notif_id,
-            message: $message,
-            senderRole: $sender_role,
-            senderName: $sender_name,
-            urgency: $urgency,
-            createdAt: datetime(),
-            read: false,
-            status: 'pending'
-        })
-        CREATE (b)-[:HAS_NOTIFICATION]->(n)
-        RETURN n
-        """
-        db.execute_query(query, {
-            "battery_id": notification.batteryId,
-            "notif_id": notif_id,
-            "message": notification.message,
-            "sender_role": notification.senderRole,
-            "sender_name": notification.senderName or "",
-            "urgency": notification.urgency
-        })
-        
         return NotificationResponse(
-            notificationId=notif_id,
+            notificationId=created["notificationId"],
             batteryId=notification.batteryId,
             message=notification.message,
             senderRole=notification.senderRole,
             senderName=notification.senderName,
             urgency=notification.urgency,
-            createdAt=new_notification["createdAt"],
+            createdAt=created["createdAt"],
             read=False
         )
     except HTTPException:
@@ -105,39 +71,58 @@ async def create_notification(notification: NotificationCreate):
 # GET - Liste des notifications
 # ============================================
 
-@router.get("/", response_model=List[dict])
+@router.get("/", response_model=Union[List[dict], NotificationPage])
 async def list_notifications(
+    response: Response,
     unread_only: bool = Query(False, description="Afficher uniquement les non lues"),
     battery_id: Optional[str] = Query(None, description="Filtrer par batterie"),
-    urgency: Optional[str] = Query(None, description="Filtrer par urgence (low, normal, high)")
+    urgency: Optional[str] = Query(None, description="Filtrer par urgence (low, normal, high)"),
+    since: Optional[datetime] = Query(None, description="Uniquement les notifications créées après cette date (polling)"),
+    cursor: Optional[str] = Query(None, description="Curseur de pagination (nextCursor / en-tête X-Next-Cursor de la page précédente)"),
+    limit: int = Query(50, ge=1, le=500, description="Nombre maximum de notifications par page"),
+    envelope: bool = Query(False, description="Réponse {items, nextCursor} au lieu de la liste seule")
 ):
+    """
+    Liste les notifications, les plus récentes d'abord, page par page.
+    Le curseur de la page suivante est renvoyé dans l'en-tête X-Next-Cursor
+    (absent sur la dernière page) et, avec `envelope=true`, dans le corps.
+    """
     try:
-        query = """
-        MATCH (b:BatteryInstance)-[:HAS_NOTIFICATION]->(n:Notification)
-        RETURN n.notificationId AS notificationId,
-               b.batteryId AS batteryId,
-               n.message AS message,
-               n.senderRole AS senderRole,
-               n.senderName AS senderName,
-               n.urgency AS urgency,
-               toString(n.createdAt) AS createdAt,
-               n.read AS read,
-               n.status AS status
-        ORDER BY n.createdAt DESC
-        """
-        notifications = db.execute_query(query)
-        
-        # Appliquer les filtres
-        if unread_only:
-            notifications = [n for n in notifications if not n.get("read")]
-        
-        if battery_id:
-            notifications = [n for n in notifications if n.get("batteryId") == battery_id]
+        # Première page: servie depuis la fenêtre en mémoire si elle suffit
+        notifications = None
+        if cursor is None:
+            notifications = await notification_repo.recent(
+                unread_only=unread_only,
+                battery_id=battery_id,
+                urgency=urgency,
+                since=since,
+                limit=limit + 1
+            )
+        try:
+            if notifications is None:
+                notifications = await get_notifications(
+                    unread_only=unread_only,
+                    battery_id=battery_id,
+                    urgency=urgency,
+                    since=since.isoformat() if since else None,
+                    cursor=cursor,
+                    limit=limit + 1
+                )
+        except (ValueError, UnicodeDecodeError):
+            raise HTTPException(status_code=400, detail="Curseur de pagination invalide")
         
-        if urgency:
-            notifications = [n for n in notifications if n.get("urgency") == urgency]
+        next_cursor = None
+        if len(notifications) > limit:
+            notifications = notifications[:limit]
+            last = notifications[-1]
+            next_cursor = encode_notification_cursor(last["createdAt"], last["notificationId"])
+            response.headers[NEXT_CURSOR_HEADER] = next_cursor
         
+        if envelope:
+            return NotificationPage(items=notifications, nextCursor=next_cursor)
         return notifications
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -153,13 +138,7 @@ async def count_unread():
     Pour le badge de notification du Propriétaire BP.
     """
     try:
-        query = """
-        MATCH (n:Notification)
-        WHERE n.read = false
-        RETURN count(n) AS count
-        """
-        result = db.execute_query(query)
-        return {"unreadCount": result[0]["count"] if result else 0}
+        return {"unreadCount": await notification_repo.unread_count()}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -174,14 +153,7 @@ async def mark_as_read(notification_id: str):
     Marque une notification comme lue.
     """
     try:
-        query = """
-        MATCH (n:Notification {notificationId: $notif_id})
-        SET n.read = true, n.readAt = datetime()
-        RETURN n.notificationId AS id
-        """
-        result = db.execute_query(query, {"notif_id": notification_id})
-        
-        if not result:
+        if not await notification_repo.mark_read(notification_id):
             raise HTTPException(status_code=404, detail="Notification non trouvée")
         
         return APIResponse(
@@ -208,40 +180,19 @@ async def process_notification(
     Workflow complet: Garagiste signale → Propriétaire valide → Statut change.
     """
     try:
-        # Récupérer la notification et la batterie associée
-        query = """
-        MATCH (b:BatteryInstance)-[:HAS_NOTIFICATION]->(n:Notification {notificationId: $notif_id})
-        RETURN b.batteryId AS batteryId, b.status AS currentStatus, n
-        """
-        result = db.execute_query(query, {"notif_id": notification_id})
-        
+        # Changement de statut et résolution de la notification en une seule transaction
+        result = await transition_battery_status(
+            request.newStatus.value,
+            notification_id=notification_id,
+            resolved_by="Propriétaire BP"
+        )
         if not result:
             raise HTTPException(status_code=404, detail="Notification non trouvée")
         
-        battery_id = result[0]["batteryId"]
-        previous_status = result[0]["currentStatus"]
-        
-        # Changer le statut de la batterie
-        update_result = update_battery_status(battery_id, request.newStatus.value)
-        
-        if not update_result:
-            raise HTTPException(status_code=500, detail="Échec du changement de statut")
-        
-        # Mettre à jour la notification
-        update_notif_query = """
-        MATCH (n:Notification {notificationId: $notif_id})
-        SET n.status = 'resolved',
-            n.read = true,
-            n.resolvedAt = datetime(),
-            n.resolvedBy = $resolved_by,
-            n.resolution = $resolution
-        RETURN n
-        """
-        db.execute_query(update_notif_query, {
-            "notif_id": notification_id,
-            "resolved_by": "Propriétaire BP",
-            "resolution": f"Statut changé: {previous_status} → {request.newStatus.value}"
-        })
+        battery_id = result["batteryId"]
+        previous_status = result["previousStatus"]
+        fleet_stats.record_status_change(previous_status, request.newStatus.value)
+        notification_repo.record_resolution(notification_id, result["notificationWasRead"])
         
         return StatusChangeResponse(
             batteryId=battery_id,
@@ -252,6 +203,8 @@ async def process_notification(
         )
     except HTTPException:
         raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -267,16 +220,11 @@ async def report_waste(
     garage_name: str = Query("Garage", description="Nom du garage")
 ):
     try:
-        # Vérifier la batterie
-        battery = get_battery_by_id(battery_id)
-        if not battery:
+        # Changer le statut à "Signaled As Waste" (vérifie aussi l'existence)
+        result = await transition_battery_status("Signaled As Waste", battery_id=battery_id)
+        if not result:
             raise HTTPException(status_code=404, detail=f"Batterie {battery_id} non trouvée")
-        
-        # Changer le statut à "Signaled As Waste"
-        db.execute_query("""
-            MATCH (b:BatteryInstance {batteryId: $battery_id})
-            SET b.status = 'Signaled As Waste'
-        """, {"battery_id": battery_id})
+        fleet_stats.record_status_change(result["previousStatus"], "Signaled As Waste")
         
         # Créer la notification
         notification = NotificationCreate(
@@ -318,7 +266,7 @@ async def get_battery_history(battery_id: str):
                    urgency: n.urgency
                }) AS notifications
         """
-        result = db.execute_query(query, {"battery_id": battery_id})
+        result = await async_db.execute_query(query, {"battery_id": battery_id})
         
         if not result:
             raise HTTPException(status_code=404, detail=f"Batterie {battery_id} non trouvée")
@@ -345,7 +293,7 @@ async def confirm_reception(
     """
     try:
         # Vérifier la batterie
-        battery = get_battery_by_id(battery_id)
+        battery = await get_battery_by_id(battery_id)
         if not battery:
             raise HTTPException(status_code=404, detail=f"Batterie {battery_id} non trouvée")
         
@@ -369,10 +317,10 @@ async def confirm_reception(
         CREATE (b)-[:HAS_EVENT]->(e)
         RETURN e
         """
-        db.execute_query(query, {
+        await async_db.execute_query(query, {
             "battery_id": battery_id,
             "center_name": center_name
-        })
+        }, write=True)
         
         return APIResponse(
             success=True,
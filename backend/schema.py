@@ -0,0 +1,242 @@
+"""
+Schéma Neo4j - Contraintes d'unicité et index
+Créés de façon idempotente au démarrage de l'API (lifespan)
+"""
+
+import os
+
+from database import async_db
+
+
+# Modules complétés par transaction lors des migrations de données
+MIGRATION_BATCH_SIZE = int(os.getenv("MIGRATION_BATCH_SIZE", 10000))
+
+
+# ============================================
+# DÉFINITION DU SCHÉMA
+# ============================================
+
+# (nom, type, requête Cypher) - IF NOT EXISTS rend chaque création idempotente
+SCHEMA_STATEMENTS = [
+    # Contraintes d'unicité (créent aussi l'index associé)
+    (
+        "battery_instance_battery_id",
+        "constraint",
+        "CREATE CONSTRAINT battery_instance_battery_id IF NOT EXISTS "
+        "FOR (b:BatteryInstance) REQUIRE b.batteryId IS UNIQUE"
+    ),
+    (
+        "battery_instance_passport_id",
+        "constraint",
+        "CREATE CONSTRAINT battery_instance_passport_id IF NOT EXISTS "
+        "FOR (b:BatteryInstance) REQUIRE b.batteryPassportId IS UNIQUE"
+    ),
+    (
+        "notification_notification_id",
+        "constraint",
+        "CREATE CONSTRAINT notification_notification_id IF NOT EXISTS "
+        "FOR (n:Notification) REQUIRE n.notificationId IS UNIQUE"
+    ),
+    # Un moduleId (M1, M2...) n'est unique qu'au sein d'une batterie.
+    # batteryId est recopié sur les modules existants avant la création
+    # (backfill_module_battery_ids), sans quoi ils échapperaient à la contrainte.
+    (
+        "module_battery_module_id",
+        "constraint",
+        "CREATE CONSTRAINT module_battery_module_id IF NOT EXISTS "
+        "FOR (m:Module) REQUIRE (m.batteryId, m.moduleId) IS UNIQUE"
+    ),
+    # Séries temporelles des modules (clé: "batteryId/moduleId")
+    (
+        "reading_chunk_series_start",
+        "constraint",
+        "CREATE CONSTRAINT reading_chunk_series_start IF NOT EXISTS "
+        "FOR (c:ReadingChunk) REQUIRE (c.series, c.start) IS UNIQUE"
+    ),
+    # Une décision par batterie et demande marché (clé: "batteryId/marketDemand").
+    # Les doublons existants sont supprimés et la clé recopiée avant la création
+    # (dedupe_decisions, backfill_decision_keys).
+    (
+        "decision_decision_key",
+        "constraint",
+        "CREATE CONSTRAINT decision_decision_key IF NOT EXISTS "
+        "FOR (d:Decision) REQUIRE d.decisionKey IS UNIQUE"
+    ),
+    (
+        "rollup_series_resolution_start",
+        "constraint",
+        "CREATE CONSTRAINT rollup_series_resolution_start IF NOT EXISTS "
+        "FOR (r:Rollup) REQUIRE (r.series, r.resolution, r.start) IS UNIQUE"
+    ),
+    # Index range pour les filtres fréquents
+    (
+        "battery_instance_status",
+        "index",
+        "CREATE INDEX battery_instance_status IF NOT EXISTS "
+        "FOR (b:BatteryInstance) ON (b.status)"
+    ),
+    (
+        "notification_read",
+        "index",
+        "CREATE INDEX notification_read IF NOT EXISTS "
+        "FOR (n:Notification) ON (n.read)"
+    ),
+    (
+        "notification_created_at",
+        "index",
+        "CREATE INDEX notification_created_at IF NOT EXISTS "
+        "FOR (n:Notification) ON (n.createdAt)"
+    ),
+    (
+        "status_name",
+        "index",
+        "CREATE INDEX status_name IF NOT EXISTS "
+        "FOR (s:Status) ON (s.name)"
+    ),
+    # Purge par ancienneté des séries temporelles
+    (
+        "reading_chunk_start",
+        "index",
+        "CREATE INDEX reading_chunk_start IF NOT EXISTS "
+        "FOR (c:ReadingChunk) ON (c.start)"
+    ),
+    (
+        "rollup_resolution_start",
+        "index",
+        "CREATE INDEX rollup_resolution_start IF NOT EXISTS "
+        "FOR (r:Rollup) ON (r.resolution, r.start)"
+    ),
+]
+
+
+# ============================================
+# MIGRATIONS DE DONNÉES
+# ============================================
+
+async def backfill_module_battery_ids(batch_size: int = MIGRATION_BATCH_SIZE) -> int:
+    """
+    Recopie batteryId sur les modules qui ne l'ont pas (créés avant la
+    contrainte module_battery_module_id), par lots de `batch_size`.
+    Idempotent. Retourne le nombre de modules complétés.
+    """
+    query = """
+    MATCH (b:BatteryInstance)-[:HAS_MODULE]->(m:Module)
+    WHERE m.batteryId IS NULL
+    WITH b, m
+    LIMIT $batch_size
+    SET m.batteryId = b.batteryId
+    """
+    total = 0
+    while True:
+        counters = await async_db.execute_write(query, {"batch_size": batch_size})
+        total += counters["properties_set"]
+        if counters["properties_set"] < batch_size:
+            return total
+
+
+async def dedupe_decisions(batch_size: int = MIGRATION_BATCH_SIZE) -> int:
+    """
+    Supprime les nœuds Decision en double pour une même batterie et demande
+    marché (MERGE concurrents avant decisionKey), en gardant le plus récent.
+    Idempotent. Retourne le nombre de décisions supprimées.
+    """
+    query = """
+    MATCH (b:BatteryInstance)-[:HAS_DECISION]->(d:Decision)
+    WITH b, d ORDER BY d.computedAt DESC
+    WITH b, d.marketDemand AS marketDemand, collect(d) AS decisions
+    WHERE size(decisions) > 1
+    UNWIND decisions[1..] AS duplicate
+    WITH duplicate
+    LIMIT $batch_size
+    DETACH DELETE duplicate
+    """
+    total = 0
+    while True:
+        counters = await async_db.execute_write(query, {"batch_size": batch_size})
+        total += counters["nodes_deleted"]
+        if counters["nodes_deleted"] < batch_size:
+            return total
+
+
+async def backfill_decision_keys(batch_size: int = MIGRATION_BATCH_SIZE) -> int:
+    """
+    Recopie decisionKey ("batteryId/marketDemand") sur les décisions qui ne
+    l'ont pas (créées avant la contrainte decision_decision_key), par lots.
+    Idempotent. Retourne le nombre de décisions complétées.
+    """
+    query = """
+    MATCH (b:BatteryInstance)-[:HAS_DECISION]->(d:Decision)
+    WHERE d.decisionKey IS NULL AND d.marketDemand IS NOT NULL
+    WITH b, d
+    LIMIT $batch_size
+    SET d.decisionKey = b.batteryId + '/' + d.marketDemand
+    """
+    total = 0
+    while True:
+        counters = await async_db.execute_write(query, {"batch_size": batch_size})
+        total += counters["properties_set"]
+        if counters["properties_set"] < batch_size:
+            return total
+
+
+# ============================================
+# BOOTSTRAP
+# ============================================
+
+async def ensure_schema():
+    """
+    Complète les données nécessaires aux contraintes puis crée les
+    contraintes et index manquants.
+    Une erreur sur un élément (ex: doublons existants empêchant une contrainte
+    d'unicité) est reportée sans bloquer le démarrage.
+    Retourne un rapport: {"backfilled": n, "decisionsDeduplicated": n,
+    "decisionKeys": n, "created": [...], "existing": [...], "failed": [...]}
+    """
+    report = {
+        "backfilled": 0,
+        "decisionsDeduplicated": 0,
+        "decisionKeys": 0,
+        "created": [],
+        "existing": [],
+        "failed": []
+    }
+    
+    migrations = [
+        ("backfilled", backfill_module_battery_ids),
+        ("decisionsDeduplicated", dedupe_decisions),
+        ("decisionKeys", backfill_decision_keys),
+    ]
+    for key, migration in migrations:
+        try:
+            report[key] = await migration()
+        except Exception as e:
+            report["failed"].append({"name": migration.__name__, "error": str(e)})
+    
+    for name, kind, query in SCHEMA_STATEMENTS:
+        try:
+            counters = await async_db.execute_write(query)
+            added = counters["constraints_added"] if kind == "constraint" else counters["indexes_added"]
+            report["created" if added else "existing"].append(name)
+        except Exception as e:
+            report["failed"].append({"name": name, "error": str(e)})
+    
+    return report
+
+
+def format_schema_report(report: dict) -> str:
+    """Résumé lisible du rapport pour les logs de démarrage"""
+    lines = [
+        f"🗂️  Schéma Neo4j: {len(report['created'])} créé(s), "
+        f"{len(report['existing'])} existant(s), {len(report['failed'])} en échec"
+    ]
+    if report.get("backfilled"):
+        lines.append(f"   🔧 batteryId recopié sur {report['backfilled']} module(s)")
+    if report.get("decisionsDeduplicated"):
+        lines.append(f"   🧹 {report['decisionsDeduplicated']} décision(s) en double supprimée(s)")
+    if report.get("decisionKeys"):
+        lines.append(f"   🔧 decisionKey recopié sur {report['decisionKeys']} décision(s)")
+    for name in report["created"]:
+        lines.append(f"   ➕ {name}")
+    for failure in report["failed"]:
+        lines.append(f"   ❌ {failure['name']}: {failure['error']}")
+    return "\n".join(lines)
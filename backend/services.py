@@ -0,0 +1,102 @@
+"""
+Services partagés - Fiches et diagnostics batterie
+Construction des réponses à partir des résultats de get_battery_with_modules,
+utilisée par les routers batteries, modules et dashboard
+"""
+
+from models import BatteryWithModules
+
+
+# ============================================
+# FICHE BATTERIE AVEC MODULES
+# ============================================
+
+def build_battery_with_modules(result: dict) -> BatteryWithModules:
+    """Fiche complète à partir du résultat de get_battery_with_modules"""
+    modules = result["modules"]
+    
+    # Extraire les données
+    battery = result.get("b", {})
+    model = result.get("m", {})
+    company = result.get("c", {})
+    battery_type = result.get("t", {})
+    composition = result.get("comp", {})
+    
+    # Calculer les stats de défaillance
+    defective_modules = [m for m in modules if m.get("isDefective")]
+    
+    return BatteryWithModules(
+        batteryId=battery.get("batteryId"),
+        batteryPassportId=battery.get("batteryPassportId"),
+        serialNumber=battery.get("serialNumber"),
+        status=battery.get("status", "Original"),
+        manufacturingDate=str(battery.get("manufacturingDate")) if battery.get("manufacturingDate") else None,
+        warrantyPeriod=battery.get("warrantyPeriod"),
+        massKg=battery.get("massKg"),
+        carbonFootprint=battery.get("carbonFootprint"),
+        modelName=model.get("name") if model else None,
+        manufacturer=company.get("name") if company else None,
+        batteryType=battery_type.get("name") if battery_type else None,
+        composition=composition.get("id") if composition else None,
+        modules=modules,
+        hasDefectiveModule=len(defective_modules) > 0,
+        defectiveModulesCount=len(defective_modules)
+    )
+
+
+# ============================================
+# DIAGNOSTIC
+# ============================================
+
+def build_diagnostic(battery_id: str, battery: dict) -> dict:
+    """
+    Diagnostic d'une batterie (résultat de get_battery_with_modules, au moins
+    un module): SOH moyen, modules défaillants, recommandation.
+    """
+    modules = battery["modules"]
+    
+    # Calculer les statistiques
+    total_soh = sum(m.get("soh", 0) for m in modules)
+    avg_soh = total_soh / len(modules)
+    
+    total_resistance_ratio = sum(
+        m.get("internalResistance", 0) / m.get("maxResistance", 1) 
+        for m in modules
+    )
+    avg_resistance_ratio = total_resistance_ratio / len(modules)
+    
+    defective_modules = [m for m in modules if m.get("isDefective")]
+    
+    avg_temp = sum(m.get("temperature", 0) for m in modules) / len(modules)
+    avg_voltage = sum(m.get("voltage", 0) for m in modules) / len(modules)
+    
+    # Déterminer l'état global
+    if len(defective_modules) > 0:
+        health_status = "CRITICAL"
+        recommendation = "Batterie hors d'usage - Signaler au Propriétaire BP"
+    elif avg_soh < 70:
+        health_status = "WARNING"
+        recommendation = "SOH faible - Surveillance recommandée"
+    elif avg_soh < 80:
+        health_status = "FAIR"
+        recommendation = "État acceptable - Contrôle dans 6 mois"
+    else:
+        health_status = "GOOD"
+        recommendation = "Batterie en bon état"
+    
+    return {
+        "batteryId": battery_id,
+        "status": battery.get("b", {}).get("status", "Unknown"),
+        "diagnostic": {
+            "healthStatus": health_status,
+            "avgSoh": round(avg_soh, 2),
+            "avgResistanceRatio": round(avg_resistance_ratio, 3),
+            "avgTemperature": round(avg_temp, 1),
+            "avgVoltage": round(avg_voltage, 2),
+            "totalModules": len(modules),
+            "defectiveModules": len(defective_modules),
+            "defectiveModuleIds": [m.get("moduleId") for m in defective_modules]
+        },
+        "recommendation": recommendation,
+        "modules": modules
+    }
@@ -0,0 +1,83 @@
+"""
+Statistiques de flotte - Snapshot en mémoire
+Mis à jour incrémentalement par les écritures de l'API
+et réconcilié périodiquement avec Neo4j en tâche de fond
+"""
+
+import os
+import asyncio
+from datetime import datetime
+
+from database import get_fleet_stats
+
+
+# Intervalle de réconciliation complète avec Neo4j (secondes)
+STATS_RECONCILE_INTERVAL = int(os.getenv("STATS_RECONCILE_INTERVAL", 60))
+
+
+class FleetStats:
+    """
+    Snapshot des statistiques servies par GET /stats.
+    Chaque worker uvicorn a son propre snapshot: les écritures des autres
+    workers n'y apparaissent qu'à la réconciliation suivante.
+    """
+    
+    def __init__(self):
+        self._snapshot = None
+        self._refreshed_at = None
+        self._lock = asyncio.Lock()
+    
+    async def refresh(self):
+        """Recalcule entièrement le snapshot depuis Neo4j"""
+        async with self._lock:
+            self._snapshot = await get_fleet_stats()
+            self._refreshed_at = datetime.now()
+        return self._snapshot
+    
+    async def get(self):
+        """Retourne le snapshot courant (calculé au premier appel)"""
+        if self._snapshot is None:
+            await self.refresh()
+        return {
+            **self._snapshot,
+            "byStatus": dict(self._snapshot["byStatus"]),
+            "snapshotAt": self._refreshed_at.isoformat()
+        }
+    
+    def invalidate(self):
+        """Force un recalcul complet au prochain appel (imports en masse, etc.)"""
+        self._snapshot = None
+    
+    def record_status_change(self, previous_status, new_status):
+        """Répercute un changement de statut d'une batterie"""
+        if self._snapshot is None or previous_status == new_status:
+            return
+        by_status = self._snapshot["byStatus"]
+        if by_status.get(previous_status, 0) > 0:
+            by_status[previous_status] -= 1
+            if by_status[previous_status] == 0:
+                del by_status[previous_status]
+        by_status[new_status] = by_status.get(new_status, 0) + 1
+    
+    def record_telemetry(self, updated_modules: list):
+        """Répercute les modules passés en défaut (ou revenus à la normale)"""
+        if self._snapshot is None:
+            return
+        delta = sum(
+            int(bool(m["isDefective"])) - int(bool(m["wasDefective"]))
+            for m in updated_modules
+        )
+        self._snapshot["defectiveModules"] = max(0, self._snapshot["defectiveModules"] + delta)
+    
+    async def run_reconciler(self, interval: int = STATS_RECONCILE_INTERVAL):
+        """Boucle de fond: réconciliation complète toutes les `interval` secondes"""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.refresh()
+            except Exception as e:
+                print(f"⚠️ Réconciliation des statistiques échouée: {e}")
+
+
+# Instance globale
+fleet_stats = FleetStats()
@@ -0,0 +1,171 @@
+"""
+Séries temporelles des modules - Historique de télémétrie
+Les lectures sont écrites par apply_telemetry_batch (même transaction):
+- ReadingChunk: points bruts, tableaux par tranche d'une minute
+- Rollup: agrégats count/sum/min/max par minute, heure et jour
+Ce module lit les agrégats et purge les données expirées
+"""
+
+import os
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from database import async_db
+
+
+# Métriques suivies (mêmes noms que ModuleBase)
+METRICS = ["internalResistance", "voltage", "temperature", "soh"]
+
+# Résolution exposée par l'API -> unité Cypher (datetime.truncate)
+RESOLUTIONS = {"1m": "minute", "1h": "hour", "1d": "day"}
+
+# Fenêtre par défaut d'une requête d'historique, par résolution
+DEFAULT_WINDOWS = {
+    "minute": timedelta(hours=6),
+    "hour": timedelta(days=7),
+    "day": timedelta(days=365),
+}
+
+# Nombre maximum d'agrégats renvoyés par module
+MAX_POINTS = 2000
+
+# Rétention (jours): points bruts, agrégats minute et heure (jour: illimité)
+RAW_RETENTION_DAYS = int(os.getenv("TIMESERIES_RAW_RETENTION_DAYS", 30))
+MINUTE_RETENTION_DAYS = int(os.getenv("TIMESERIES_MINUTE_RETENTION_DAYS", 7))
+HOUR_RETENTION_DAYS = int(os.getenv("TIMESERIES_HOUR_RETENTION_DAYS", 365))
+
+# Intervalle de purge (secondes)
+RETENTION_INTERVAL = int(os.getenv("TIMESERIES_RETENTION_INTERVAL", 3600))
+
+# Nœuds supprimés par transaction de purge
+RETENTION_BATCH_SIZE = int(os.getenv("TIMESERIES_RETENTION_BATCH_SIZE", 5000))
+
+
+def _capitalize(metric: str) -> str:
+    return metric[0].upper() + metric[1:]
+
+
+def as_utc(value: datetime = None):
+    """Datetime en UTC; une date sans fuseau est considérée comme UTC"""
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+def format_rollup(row: dict) -> dict:
+    """Agrégat Neo4j -> point d'historique {start, count, métrique: {avg, min, max}}"""
+    point = {"start": row["start"], "count": row["count"]}
+    for metric in METRICS:
+        name = _capitalize(metric)
+        point[metric] = {
+            "avg": row[f"sum{name}"] / row["count"] if row["count"] else None,
+            "min": row[f"min{name}"],
+            "max": row[f"max{name}"],
+        }
+    return point
+
+
+async def get_module_history(
+    battery_id: str,
+    resolution: str,
+    start: datetime = None,
+    end: datetime = None,
+    module_id: str = None
+) -> dict:
+    """
+    Agrégats d'une batterie (ou d'un module) sur une fenêtre [start, end[.
+    `resolution`: unité Cypher (minute, hour, day).
+    `start` / `end` sans fuseau sont lus en UTC.
+    Retourne {moduleId: [points...]} trié par date.
+    """
+    end = as_utc(end) or datetime.now(timezone.utc)
+    start = as_utc(start) or end - DEFAULT_WINDOWS[resolution]
+    
+    query = """
+    MATCH (b:BatteryInstance {batteryId: $battery_id})-[:HAS_MODULE]->(m:Module)
+    WHERE $module_id IS NULL OR m.moduleId = $module_id
+    WITH m, b.batteryId + '/' + m.moduleId AS series
+    CALL {
+        WITH series
+        MATCH (r:Rollup)
+        WHERE r.series = series
+          AND r.resolution = $resolution
+          AND r.start >= datetime($start)
+          AND r.start < datetime($end)
+        WITH r
+        ORDER BY r.start
+        LIMIT $max_points
+        RETURN collect(r {.*, start: toString(r.start)}) AS rollups
+    }
+    RETURN m.moduleId AS moduleId, rollups
+    ORDER BY moduleId
+    """
+    results = await async_db.execute_query(query, {
+        "battery_id": battery_id,
+        "module_id": module_id,
+        "resolution": resolution,
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "max_points": MAX_POINTS
+    })
+    return {
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "modules": {
+            row["moduleId"]: [format_rollup(rollup) for rollup in row["rollups"]]
+            for row in results
+        }
+    }
+
+
+async def delete_in_batches(query: str, parameters: dict, name: str, batch_size: int = RETENTION_BATCH_SIZE) -> int:
+    """
+    Rejoue une suppression bornée par LIMIT $batch_size jusqu'à épuisement:
+    une transaction par lot, pas de transaction géante sur un gros arriéré.
+    Retourne le nombre de nœuds supprimés.
+    """
+    total = 0
+    while True:
+        counters = await async_db.execute_write(query, {**parameters, "batch_size": batch_size}, name=name)
+        total += counters["nodes_deleted"]
+        if counters["nodes_deleted"] < batch_size:
+            return total
+
+
+async def purge_expired() -> dict:
+    """Supprime les points bruts et agrégats fins au-delà de leur rétention, par lots"""
+    now = datetime.now(timezone.utc)
+    deleted = {}
+    
+    deleted["chunks"] = await delete_in_batches("""
+    MATCH (c:ReadingChunk)
+    WHERE c.start < datetime($before)
+    WITH c
+    LIMIT $batch_size
+    DETACH DELETE c
+    """, {"before": (now - timedelta(days=RAW_RETENTION_DAYS)).isoformat()}, name="purge_expired_chunks")
+    
+    for resolution, days in (("minute", MINUTE_RETENTION_DAYS), ("hour", HOUR_RETENTION_DAYS)):
+        deleted[resolution] = await delete_in_batches("""
+        MATCH (r:Rollup)
+        WHERE r.resolution = $resolution AND r.start < datetime($before)
+        WITH r
+        LIMIT $batch_size
+        DETACH DELETE r
+        """, {"resolution": resolution, "before": (now - timedelta(days=days)).isoformat()}, name="purge_expired_rollups")
+    
+    return deleted
+
+
+async def run_retention(interval: int = RETENTION_INTERVAL):
+    """Boucle de fond: purge des séries temporelles toutes les `interval` secondes"""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            deleted = await purge_expired()
+            if any(deleted.values()):
+                print(f"🧹 Séries temporelles purgées: {deleted}")
+        except Exception as e:
+            print(f"⚠️ Purge des séries temporelles échouée: {e}")
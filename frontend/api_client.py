@@ -0,0 +1,189 @@
+"""
+Client API partagé par les interfaces Streamlit
+Session requests poolée (keep-alive, retries, timeouts) et cache
+des GET par TTL via st.cache_data, invalidé après chaque écriture
+"""
+
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, NamedTuple, Optional
+
+import requests
+import streamlit as st
+from requests.adapters import HTTPAdapter
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+from urllib3.util.retry import Retry
+
+from config import API_BASE_URL
+
+# ============================================
+# CONFIGURATION
+# ============================================
+
+# Timeouts (secondes): établissement de la connexion, lecture de la réponse
+API_CONNECT_TIMEOUT = float(os.getenv("API_CONNECT_TIMEOUT", 5))
+API_READ_TIMEOUT = float(os.getenv("API_READ_TIMEOUT", 30))
+
+# Rejeux des GET sur erreurs réseau / 502-504 (réveil de Render)
+API_RETRIES = int(os.getenv("API_RETRIES", 3))
+
+# Connexions keep-alive gardées par hôte
+API_POOL_SIZE = int(os.getenv("API_POOL_SIZE", 10))
+
+# Appels parallèles max lors d'un chargement de page (fetch_parallel)
+API_FANOUT_WORKERS = int(os.getenv("API_FANOUT_WORKERS", 6))
+
+# Durée de vie du cache (secondes): données batteries / données vivantes
+CACHE_TTL = int(os.getenv("API_CACHE_TTL", 60))
+LIVE_CACHE_TTL = int(os.getenv("API_LIVE_CACHE_TTL", 10))
+
+# Politiques de cache pour api_get
+CACHE_DATA = "data"   # batteries, stats, fiches complètes
+CACHE_LIVE = "live"   # notifications, alertes
+CACHE_NONE = None
+
+
+class ApiResult(NamedTuple):
+    """Réponse simplifiée (sérialisable pour st.cache_data)"""
+    status_code: int
+    data: object
+    next_cursor: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return 200 <= self.status_code < 300
+
+
+# ============================================
+# SESSION POOLÉE
+# ============================================
+
+@st.cache_resource
+def get_session() -> requests.Session:
+    """Session unique par processus Streamlit (connexions TCP/TLS réutilisées)"""
+    retry = Retry(
+        total=API_RETRIES,
+        backoff_factor=0.5,
+        status_forcelist=[502, 503, 504],
+        allowed_methods=["GET"],
+        raise_on_status=False
+    )
+    adapter = HTTPAdapter(pool_connections=API_POOL_SIZE, pool_maxsize=API_POOL_SIZE, max_retries=retry)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def _request(method: str, path: str, params: dict = None, json: dict = None) -> ApiResult:
+    response = get_session().request(
+        method,
+        f"{API_BASE_URL}{path}",
+        params=params,
+        json=json,
+        timeout=(API_CONNECT_TIMEOUT, API_READ_TIMEOUT)
+    )
+    try:
+        data = response.json()
+    except ValueError:
+        data = response.text
+    return ApiResult(response.status_code, data, response.headers.get("X-Next-Cursor"))
+
+
+# ============================================
+# GET (avec cache)
+# ============================================
+
+class _NotCached(Exception):
+    """Réponse en erreur: renvoyée à l'appelant sans entrer dans le cache"""
+
+    def __init__(self, result: ApiResult):
+        super().__init__(result.status_code)
+        self.result = result
+
+
+def _get_or_raise(path: str, params: dict = None) -> ApiResult:
+    result = _request("GET", path, params=params)
+    if not result.ok:
+        raise _NotCached(result)
+    return result
+
+
+@st.cache_data(ttl=CACHE_TTL, show_spinner=False)
+def _cached_get(path: str, params: dict = None) -> ApiResult:
+    return _get_or_raise(path, params)
+
+
+@st.cache_data(ttl=LIVE_CACHE_TTL, show_spinner=False)
+def _cached_get_live(path: str, params: dict = None) -> ApiResult:
+    return _get_or_raise(path, params)
+
+
+def api_get(path: str, params: dict = None, cache: Optional[str] = CACHE_DATA) -> ApiResult:
+    """
+    GET sur l'API. `cache`: CACHE_DATA (TTL long), CACHE_LIVE (TTL court)
+    ou CACHE_NONE. Seules les réponses 2xx sont mises en cache.
+    Les erreurs réseau sont levées (requests.RequestException).
+    """
+    try:
+        if cache == CACHE_DATA:
+            return _cached_get(path, params)
+        if cache == CACHE_LIVE:
+            return _cached_get_live(path, params)
+    except _NotCached as e:
+        return e.result
+    return _request("GET", path, params=params)
+
+
+def invalidate_cache():
+    """Vide le cache des GET (après une écriture ou un rafraîchissement manuel)"""
+    _cached_get.clear()
+    _cached_get_live.clear()
+
+
+# ============================================
+# ÉCRITURES (invalident le cache)
+# ============================================
+
+def api_post(path: str, params: dict = None, json: dict = None, invalidate: bool = True) -> ApiResult:
+    """POST sur l'API; vide le cache si l'appel a réussi et modifie des données"""
+    result = _request("POST", path, params=params, json=json)
+    if invalidate and result.ok:
+        invalidate_cache()
+    return result
+
+
+def api_put(path: str, params: dict = None, json: dict = None, invalidate: bool = True) -> ApiResult:
+    """PUT sur l'API; vide le cache si l'appel a réussi"""
+    result = _request("PUT", path, params=params, json=json)
+    if invalidate and result.ok:
+        invalidate_cache()
+    return result
+
+
+# ============================================
+# CHARGEMENT PARALLÈLE
+# ============================================
+
+@st.cache_resource
+def get_executor() -> ThreadPoolExecutor:
+    """Pool de threads partagé (les appels API passent la session poolée)"""
+    return ThreadPoolExecutor(max_workers=API_FANOUT_WORKERS, thread_name_prefix="api")
+
+
+def fetch_parallel(calls: Dict[str, Callable[[], object]]) -> Dict[str, Future]:
+    """
+    Lance des appels indépendants en parallèle: {nom: fonction sans argument}.
+    Retourne {nom: Future}; chaque section de la page attend uniquement
+    son propre résultat (`.result()`) au moment de s'afficher.
+    """
+    ctx = get_script_run_ctx()
+    
+    def run(fn):
+        # Contexte Streamlit du rerun (st.cache_data depuis un thread du pool)
+        add_script_run_ctx(threading.current_thread(), ctx)
+        return fn()
+    
+    executor = get_executor()
+    return {name: executor.submit(run, fn) for name, fn in calls.items()}
@@ -6,9 +6,8 @@ Lancer avec : streamlit run frontend/centre_tri.py --server.port 8503
 """
 
 import streamlit as st
-import requests
 from datetime import datetime
-from config import API_BASE_URL
+from api_client import api_get, api_post, api_put, CACHE_LIVE
 
 # ============================================
 # CONFIGURATION
@@ -111,53 +110,55 @@ st.markdown("""
 def get_battery(battery_id: str):
     """Récupère les infos d'une batterie"""
     try:
-        response = requests.get(f"{API_BASE_URL}/battery/{battery_id}/full")
-        return response.json() if response.status_code == 200 else None
+        response = api_get(f"/battery/{battery_id}/full")
+        return response.data if response.status_code == 200 else None
     except:
         return None
 
 def get_decision(battery_id: str, market_demand: str = "normal"):
     """Récupère la recommandation de décision"""
     try:
-        response = requests.post(
-            f"{API_BASE_URL}/modules/battery/{battery_id}/decision",
-            params={"market_demand": market_demand}
+        # Décision mise en cache côté API: ne modifie pas les données affichées
+        response = api_post(
+            f"/modules/battery/{battery_id}/decision",
+            params={"market_demand": market_demand},
+            invalidate=False
         )
-        return response.json() if response.status_code == 200 else None
+        return response.data if response.status_code == 200 else None
     except:
         return None
 
 def confirm_reception(battery_id: str, center_name: str):
     """Confirme la réception de la batterie"""
     try:
-        response = requests.post(
-            f"{API_BASE_URL}/notifications/confirm-reception/{battery_id}",
+        response = api_post(
+            f"/notifications/confirm-reception/{battery_id}",
             params={"center_name": center_name}
         )
-        return response.status_code == 200, response.json()
+        return response.status_code == 200, response.data
     except Exception as e:
         return False, str(e)
 
 def change_status(battery_id: str, new_status: str):
     """Change le statut après décision"""
     try:
-        response = requests.put(
-            f"{API_BASE_URL}/battery/{battery_id}/status",
+        response = api_put(
+            f"/battery/{battery_id}/status",
             json={"newStatus": new_status, "reason": f"Décision centre de tri: {new_status}"}
         )
-        return response.status_code == 200, response.json()
+        return response.status_code == 200, response.data
     except Exception as e:
         return False, str(e)
 
-def get_waste_batteries():
-    """Liste les batteries en statut Waste"""
+def get_waste_queue():
+    """File des batteries Waste (taille totale, batteries et décision enregistrée)"""
     try:
-        response = requests.get(f"{API_BASE_URL}/battery/", params={"status": "Waste"})
+        response = api_get("/dashboard/centre-tri", cache=CACHE_LIVE)
         if response.status_code == 200:
-            return [b for b in response.json() if b.get("status") == "Waste"]
-        return []
+            return response.data
+        return {}
     except:
-        return []
+        return {}
 
 # ============================================
 # PAGE PRINCIPALE
@@ -188,12 +189,17 @@ with col2:
     scan_btn = st.button("🔍", use_container_width=True)
 
 # Liste des batteries Waste en attente
-waste_batteries = get_waste_batteries()
+waste_queue = get_waste_queue()
+waste_batteries = waste_queue.get("queue", [])
 if waste_batteries:
-    st.caption(f"📦 {len(waste_batteries)} batterie(s) en attente de traitement")
+    st.caption(f"📦 {waste_queue.get('queueSize', 0)} batterie(s) en attente de traitement")
     selected = st.selectbox(
         "Batteries en attente (Waste)",
-        [""] + [f"{b.get('batteryId')} - {b.get('modelName')}" for b in waste_batteries],
+        [""] + [
+            f"{b.get('batteryId')} - {b.get('modelName')}"
+            + (f" - {b['decision']['recommendation']}" if b.get("decision") else "")
+            for b in waste_batteries
+        ],
         label_visibility="collapsed"
     )
     if selected:
@@ -6,10 +6,10 @@ Lancer avec : streamlit run frontend/garagiste.py --server.port 8501
 """
 
 import streamlit as st
-import requests
 import json
 from datetime import datetime
 from config import API_BASE_URL
+from api_client import api_get, api_post, CACHE_NONE
 
 # ============================================
 # CONFIGURATION
@@ -22,6 +22,9 @@ st.set_page_config(
     initial_sidebar_state="collapsed"
 )
 
+# Nombre de suggestions dans le sélecteur (une seule page, filtrée par préfixe)
+BATTERY_SUGGESTIONS = 20
+
 # ============================================
 # STYLES CSS
 # ============================================
@@ -92,23 +95,13 @@ st.markdown("""
 # FONCTIONS API
 # ============================================
 
-def get_battery(battery_id: str):
-    """Récupère les infos complètes d'une batterie"""
+def get_battery_view(battery_id: str):
+    """Fiche complète, diagnostic et notifications d'une batterie en un appel"""
     try:
-        response = requests.get(f"{API_BASE_URL}/battery/{battery_id}/full")
+        # Diagnostic à jour (télémétrie en continu): pas de cache
+        response = api_get(f"/dashboard/garagiste/{battery_id}", cache=CACHE_NONE)
         if response.status_code == 200:
-            return response.json()
-        return None
-    except Exception as e:
-        st.error(f"Erreur API: {e}")
-        return None
-
-def get_diagnostic(battery_id: str):
-    """Récupère le diagnostic d'une batterie"""
-    try:
-        response = requests.get(f"{API_BASE_URL}/modules/battery/{battery_id}/diagnostic")
-        if response.status_code == 200:
-            return response.json()
+            return response.data
         return None
     except Exception as e:
         st.error(f"Erreur API: {e}")
@@ -117,20 +110,23 @@ def get_diagnostic(battery_id: str):
 def report_waste(battery_id: str, reason: str, garage_name: str):
     """Signale une batterie comme Waste"""
     try:
-        response = requests.post(
-            f"{API_BASE_URL}/notifications/report-waste/{battery_id}",
+        response = api_post(
+            f"/notifications/report-waste/{battery_id}",
             params={"reason": reason, "garage_name": garage_name}
         )
-        return response.status_code == 200, response.json()
+        return response.status_code == 200, response.data
     except Exception as e:
         return False, str(e)
 
-def get_all_batteries():
-    """Liste toutes les batteries"""
+def search_batteries(prefix: str = "", limit: int = BATTERY_SUGGESTIONS):
+    """Première page des batteries dont l'ID commence par `prefix` (sélecteur)"""
     try:
-        response = requests.get(f"{API_BASE_URL}/battery/")
+        params = {"limit": limit}
+        if prefix:
+            params["search"] = prefix
+        response = api_get("/battery/", params=params)
         if response.status_code == 200:
-            return response.json()
+            return response.data
         return []
     except:
         return []
@@ -217,10 +213,13 @@ with col1:
     )
 
 with col2:
-    # Dropdown avec les batteries existantes
-    batteries = get_all_batteries()
+    # Suggestions: une page de batteries dont l'ID commence par la saisie
+    batteries = search_batteries(battery_id_input.strip())
     battery_options = [""] + [b.get("batteryId", "") for b in batteries]
-    selected_battery = st.selectbox("Ou sélectionner:", battery_options)
+    selected_battery = st.selectbox(
+        "Ou sélectionner:", battery_options,
+        help=f"{BATTERY_SUGGESTIONS} premières batteries dont l'ID commence par la saisie"
+    )
 
 # Déterminer l'ID à utiliser
 battery_id = battery_id_input or selected_battery
@@ -241,8 +240,9 @@ if "current_battery_id" in st.session_state and st.session_state["current_batter
     st.divider()
     
     # Charger les données
-    battery = get_battery(battery_id)
-    diagnostic = get_diagnostic(battery_id)
+    view = get_battery_view(battery_id) or {}
+    battery = view.get("battery")
+    diagnostic = view if view.get("diagnostic") else None
     
     if battery:
         # ============================================
@@ -6,9 +6,9 @@ Lancer avec : streamlit run frontend/proprietaire.py --server.port 8502
 """
 
 import streamlit as st
-import requests
 from datetime import datetime
 from config import API_BASE_URL
+from api_client import api_get, api_put, invalidate_cache, fetch_parallel, CACHE_LIVE
 
 # ============================================
 # CONFIGURATION
@@ -78,43 +78,54 @@ st.markdown("""
 # FONCTIONS API
 # ============================================
 
-def get_stats():
-    """Récupère les statistiques globales"""
+def get_dashboard():
+    """Écran Dashboard en un appel: stats, non lues, top alertes, notifications, file Waste"""
     try:
-        response = requests.get(f"{API_BASE_URL}/stats")
-        return response.json() if response.status_code == 200 else {}
+        response = api_get("/dashboard/proprietaire", cache=CACHE_LIVE)
+        return response.data if response.status_code == 200 else {}
     except:
         return {}
 
-def get_all_batteries():
-    """Liste toutes les batteries"""
+def get_all_batteries(status=None, cursor=None, limit=50):
+    """Liste une page de batteries (filtre statut côté API) et le curseur suivant"""
     try:
-        response = requests.get(f"{API_BASE_URL}/battery/")
-        return response.json() if response.status_code == 200 else []
+        params = {"limit": limit}
+        if status:
+            params["status"] = status
+        if cursor:
+            params["cursor"] = cursor
+        response = api_get("/battery/", params=params)
+        if response.status_code == 200:
+            return response.data, response.next_cursor
+        return [], None
     except:
-        return []
+        return [], None
 
-def get_notifications(unread_only=False):
-    """Récupère les notifications"""
+def get_notifications(unread_only=False, cursor=None, limit=50):
+    """Récupère une page de notifications et le curseur suivant"""
     try:
-        params = {"unread_only": unread_only}
-        response = requests.get(f"{API_BASE_URL}/notifications/", params=params)
-        return response.json() if response.status_code == 200 else []
+        params = {"unread_only": unread_only, "limit": limit}
+        if cursor:
+            params["cursor"] = cursor
+        response = api_get("/notifications/", params=params, cache=CACHE_LIVE)
+        if response.status_code == 200:
+            return response.data, response.next_cursor
+        return [], None
     except:
-        return []
+        return [], None
 
 def get_unread_count():
     """Compte les notifications non lues"""
     try:
-        response = requests.get(f"{API_BASE_URL}/notifications/unread/count")
-        return response.json().get("unreadCount", 0) if response.status_code == 200 else 0
+        response = api_get("/notifications/unread/count", cache=CACHE_LIVE)
+        return response.data.get("unreadCount", 0) if response.status_code == 200 else 0
     except:
         return 0
 
 def mark_as_read(notification_id: str):
     """Marque une notification comme lue"""
     try:
-        response = requests.put(f"{API_BASE_URL}/notifications/{notification_id}/read")
+        response = api_put(f"/notifications/{notification_id}/read")
         return response.status_code == 200
     except:
         return False
@@ -122,38 +133,38 @@ def mark_as_read(notification_id: str):
 def change_battery_status(battery_id: str, new_status: str, reason: str = ""):
     """Change le statut d'une batterie"""
     try:
-        response = requests.put(
-            f"{API_BASE_URL}/battery/{battery_id}/status",
+        response = api_put(
+            f"/battery/{battery_id}/status",
             json={"newStatus": new_status, "reason": reason}
         )
-        return response.status_code == 200, response.json()
+        return response.status_code == 200, response.data
     except Exception as e:
         return False, str(e)
 
 def process_notification(notification_id: str, new_status: str):
     """Traite une notification et change le statut"""
     try:
-        response = requests.put(
-            f"{API_BASE_URL}/notifications/{notification_id}/process",
+        response = api_put(
+            f"/notifications/{notification_id}/process",
             json={"newStatus": new_status}
         )
-        return response.status_code == 200, response.json()
+        return response.status_code == 200, response.data
     except Exception as e:
         return False, str(e)
 
 def get_defective_batteries():
     """Récupère les batteries avec modules défaillants"""
     try:
-        response = requests.get(f"{API_BASE_URL}/battery/defective/list")
-        return response.json() if response.status_code == 200 else []
+        response = api_get("/battery/defective/list", cache=CACHE_LIVE)
+        return response.data if response.status_code == 200 else []
     except:
         return []
 
 def get_alerts():
     """Récupère toutes les alertes"""
     try:
-        response = requests.get(f"{API_BASE_URL}/modules/alerts")
-        return response.json() if response.status_code == 200 else []
+        response = api_get("/modules/alerts", cache=CACHE_LIVE)
+        return response.data if response.status_code == 200 else []
     except:
         return []
 
@@ -164,6 +175,55 @@ def get_alerts():
 st.title("🏢 Interface Propriétaire Battery Passport")
 st.markdown("**Gestion des statuts et notifications**")
 
+# ============================================
+# CHARGEMENT PARALLÈLE DES DONNÉES
+# ============================================
+
+PAGES = ["📊 Dashboard", "🔔 Notifications", "🔋 Batteries", "⚠️ Alertes"]
+BATTERY_STATUSES = ["Tous", "Original", "Waste", "Reused", "Repurposed"]
+
+
+def batteries_query():
+    """(statut, curseur) de la page Batteries d'après l'état des widgets"""
+    status_filter = st.session_state.get("batteries_status_filter", "Tous")
+    # Pagination: pile des curseurs des pages visitées (remise à zéro si le filtre change)
+    if st.session_state.get("batteries_filter") != status_filter:
+        st.session_state["batteries_filter"] = status_filter
+        st.session_state["batteries_cursors"] = [None]
+    status = None if status_filter == "Tous" else status_filter
+    return status, st.session_state["batteries_cursors"][-1]
+
+
+def notifications_query():
+    """(non lues uniquement, curseur) de la page Notifications d'après l'état des widgets"""
+    unread_only = st.session_state.get("notifications_unread_only", False)
+    # Même pile de curseurs que la page Batteries (remise à zéro si le filtre change)
+    if st.session_state.get("notifications_filter") != unread_only:
+        st.session_state["notifications_filter"] = unread_only
+        st.session_state["notifications_cursors"] = [None]
+    return unread_only, st.session_state["notifications_cursors"][-1]
+
+
+# Appels indépendants lancés ensemble: la latence de la page est celle
+# du plus lent, et non plus la somme des allers-retours
+current_page = st.session_state.get("page", PAGES[0])
+loads = {}
+if current_page == "📊 Dashboard":
+    # Agrégat du rôle: le compteur de non lues en fait partie
+    loads["dashboard"] = get_dashboard
+else:
+    loads["unread"] = get_unread_count
+if current_page == "🔔 Notifications":
+    unread_only, notifications_cursor = notifications_query()
+    loads["notifications"] = lambda: get_notifications(unread_only=unread_only, cursor=notifications_cursor)
+elif current_page == "🔋 Batteries":
+    batteries_status, batteries_cursor = batteries_query()
+    loads["batteries"] = lambda: get_all_batteries(status=batteries_status, cursor=batteries_cursor)
+elif current_page == "⚠️ Alertes":
+    loads["alerts"] = get_alerts
+    loads["defective"] = get_defective_batteries
+data = fetch_parallel(loads)
+
 # ============================================
 # SIDEBAR - NAVIGATION
 # ============================================
@@ -172,20 +232,20 @@ with st.sidebar:
     st.header("📋 Navigation")
     
     # Compteur notifications
-    unread_count = get_unread_count()
+    if "dashboard" in data:
+        unread_count = data["dashboard"].result().get("unreadCount", 0)
+    else:
+        unread_count = data["unread"].result()
     if unread_count > 0:
         st.error(f"🔔 {unread_count} notification(s) non lue(s)")
     
-    page = st.radio(
-        "Section",
-        ["📊 Dashboard", "🔔 Notifications", "🔋 Batteries", "⚠️ Alertes"],
-        index=0
-    )
+    page = st.radio("Section", PAGES, index=0, key="page")
     
     st.divider()
     
     # Rafraîchissement
     if st.button("🔄 Rafraîchir", use_container_width=True):
+        invalidate_cache()
         st.rerun()
     
     st.divider()
@@ -200,7 +260,8 @@ if page == "📊 Dashboard":
     st.header("📊 Dashboard")
     
     # Stats
-    stats = get_stats()
+    dashboard = data["dashboard"].result()
+    stats = dashboard.get("stats", {})
     
     col1, col2, col3, col4 = st.columns(4)
     
@@ -211,7 +272,7 @@ if page == "📊 Dashboard":
     with col3:
         st.metric("⚠️ Modules Défaillants", stats.get("defectiveModules", 0))
     with col4:
-        st.metric("🔔 Notifications", get_unread_count())
+        st.metric("🔔 Notifications", unread_count)
     
     st.divider()
     
@@ -235,9 +296,9 @@ if page == "📊 Dashboard":
     # Alertes récentes
     st.subheader("🚨 Alertes Récentes")
     
-    alerts = get_alerts()
+    alerts = dashboard.get("alerts", [])
     if alerts:
-        for alert in alerts[:5]:
+        for alert in alerts:
             st.warning(
                 f"**{alert.get('batteryId')}** - Module {alert.get('moduleId')}: "
                 f"Résistance {alert.get('resistance')}Ω > Max {alert.get('maxResistance')}Ω "
@@ -245,6 +306,29 @@ if page == "📊 Dashboard":
             )
     else:
         st.success("✅ Aucune alerte active")
+    
+    st.divider()
+    
+    # File Waste (signalées par les garagistes, puis validées)
+    st.subheader(f"🗑️ File Waste ({dashboard.get('wasteQueueSize', 0)})")
+    
+    waste_queue = dashboard.get("wasteQueue", [])
+    if waste_queue:
+        st.dataframe(waste_queue, use_container_width=True, hide_index=True)
+    else:
+        st.success("✅ Aucune batterie en attente")
+    
+    st.divider()
+    
+    # Dernières notifications
+    st.subheader("🔔 Dernières Notifications")
+    
+    for notif in dashboard.get("notifications", []):
+        read_status = "✓" if notif.get("read") else "●"
+        st.caption(
+            f"{read_status} **{notif.get('batteryId', 'N/A')}** - {notif.get('message', '')} "
+            f"({notif.get('senderRole', '')}, urgence {notif.get('urgency', 'normal')})"
+        )
 
 # ============================================
 # PAGE : NOTIFICATIONS
@@ -256,9 +340,22 @@ elif page == "🔔 Notifications":
     # Filtres
     col1, col2 = st.columns([1, 3])
     with col1:
-        show_unread_only = st.checkbox("Non lues uniquement", value=False)
+        st.checkbox("Non lues uniquement", value=False, key="notifications_unread_only")
+    
+    cursors = st.session_state["notifications_cursors"]
+    notifications, next_cursor = data["notifications"].result()
     
-    notifications = get_notifications(unread_only=show_unread_only)
+    col_prev, col_page, col_next = st.columns([1, 2, 1])
+    with col_prev:
+        if len(cursors) > 1 and st.button("⬅️ Plus récentes", use_container_width=True):
+            cursors.pop()
+            st.rerun()
+    with col_page:
+        st.caption(f"Page {len(cursors)}")
+    with col_next:
+        if next_cursor and st.button("Plus anciennes ➡️", use_container_width=True):
+            cursors.append(next_cursor)
+            st.rerun()
     
     if notifications:
         for notif in notifications:
@@ -317,17 +414,22 @@ elif page == "🔔 Notifications":
 elif page == "🔋 Batteries":
     st.header("🔋 Gestion des Batteries")
     
-    # Filtre par statut
-    status_filter = st.selectbox(
-        "Filtrer par statut",
-        ["Tous", "Original", "Waste", "Reused", "Repurposed"]
-    )
-    
-    batteries = get_all_batteries()
+    # Filtre par statut (appliqué côté API)
+    st.selectbox("Filtrer par statut", BATTERY_STATUSES, key="batteries_status_filter")
+    cursors = st.session_state["batteries_cursors"]
+    batteries, next_cursor = data["batteries"].result()
     
-    # Appliquer le filtre
-    if status_filter != "Tous":
-        batteries = [b for b in batteries if b.get("status") == status_filter]
+    col_prev, col_page, col_next = st.columns([1, 2, 1])
+    with col_prev:
+        if len(cursors) > 1 and st.button("⬅️ Page précédente", use_container_width=True):
+            cursors.pop()
+            st.rerun()
+    with col_page:
+        st.caption(f"Page {len(cursors)}")
+    with col_next:
+        if next_cursor and st.button("Page suivante ➡️", use_container_width=True):
+            cursors.append(next_cursor)
+            st.rerun()
     
     if batteries:
         for battery in batteries:
@@ -379,8 +481,8 @@ elif page == "🔋 Batteries":
 elif page == "⚠️ Alertes":
     st.header("⚠️ Alertes - Modules Défaillants")
     
-    alerts = get_alerts()
-    defective = get_defective_batteries()
+    alerts = data["alerts"].result()
+    defective = data["defective"].result()
     
     if alerts:
         st.error(f"🚨 {len(alerts)} module(s) défaillant(s) détecté(s)")
@@ -428,9 +530,9 @@ if "view_battery" in st.session_state and st.session_state["view_battery"]:
         st.subheader(f"🔋 {battery_id}")
         
         try:
-            response = requests.get(f"{API_BASE_URL}/battery/{battery_id}/full")
+            response = api_get(f"/battery/{battery_id}/full")
             if response.status_code == 200:
-                battery = response.json()
+                battery = response.data
                 st.json(battery)
         except:
             st.error("Erreur chargement")
@@ -6,6 +6,7 @@ import {
 
 // ==================== CONFIGURATION ====================
 const API_BASE_URL = 'https://battery-passport-api.onrender.com';
+const PAGE_SIZE = 50;
 
 // ==================== API ====================
 const api = {
@@ -14,8 +15,11 @@ const api = {
     if (!res.ok) throw new Error('Battery not found');
     return res.json();
   },
-  async getAllBatteries() {
-    const res = await fetch(`${API_BASE_URL}/battery/`);
+  // Une page filtrée côté serveur: { items, nextCursor }
+  async getBatteriesPage(status, cursor = null) {
+    const params = new URLSearchParams({ status, limit: PAGE_SIZE, envelope: true });
+    if (cursor) params.set('cursor', cursor);
+    const res = await fetch(`${API_BASE_URL}/battery/?${params}`);
     if (!res.ok) throw new Error('Failed to fetch batteries');
     return res.json();
   },
@@ -401,6 +405,7 @@ const CentreTriDashboard = ({ onLogout }) => {
   const [loading, setLoading] = useState(false);
   const [toast, setToast] = useState(null);
   const [wasteBatteries, setWasteBatteries] = useState([]);
+  const [wasteCursor, setWasteCursor] = useState(null);
   const [showScanner, setShowScanner] = useState(false);
 
   const showToast = (message, type) => {
@@ -412,10 +417,12 @@ const CentreTriDashboard = ({ onLogout }) => {
     loadWasteBatteries();
   }, []);
 
-  const loadWasteBatteries = async () => {
+  // Première page (ou page suivante si `more`) des batteries Waste
+  const loadWasteBatteries = async (more = false) => {
     try {
-      const bats = await api.getAllBatteries();
-      setWasteBatteries(bats.filter(b => b.status === 'Waste'));
+      const page = await api.getBatteriesPage('Waste', more ? wasteCursor : null);
+      setWasteBatteries(prev => more ? [...prev, ...page.items] : page.items);
+      setWasteCursor(page.nextCursor);
     } catch (err) {
       console.error('Error loading waste batteries:', err);
     }
@@ -557,7 +564,7 @@ const CentreTriDashboard = ({ onLogout }) => {
             <div className="mt-4">
               <p className="text-sm text-slate-500 mb-2 flex items-center gap-2">
                 <Package className="w-4 h-4" />
-                Batteries en attente ({wasteBatteries.length})
+                Batteries en attente ({wasteBatteries.length}{wasteCursor ? '+' : ''})
               </p>
               <div className="flex flex-wrap gap-2">
                 {wasteBatteries.map(b => (
@@ -569,6 +576,14 @@ const CentreTriDashboard = ({ onLogout }) => {
                     {b.batteryId}
                   </button>
                 ))}
+                {wasteCursor && (
+                  <button 
+                    onClick={() => loadWasteBatteries(true)} 
+                    className="px-3 py-1.5 border border-dashed border-slate-300 hover:bg-slate-100 rounded-lg text-xs font-medium text-slate-500 transition-colors"
+                  >
+                    Charger plus…
+                  </button>
+                )}
               </div>
             </div>
           )}
@@ -6,21 +6,33 @@ import {
 
 // ==================== CONFIGURATION ====================
 const API_BASE_URL = 'https://battery-passport-api.onrender.com';
+const PAGE_SIZE = 60;
 
 // ==================== API ====================
 const api = {
-  async getAllBatteries() {
-    const res = await fetch(`${API_BASE_URL}/battery/`);
+  // Une page de batteries: { items, nextCursor }
+  async getBatteriesPage(cursor = null) {
+    const params = new URLSearchParams({ limit: PAGE_SIZE, envelope: true });
+    if (cursor) params.set('cursor', cursor);
+    const res = await fetch(`${API_BASE_URL}/battery/?${params}`);
     if (!res.ok) throw new Error('Failed to fetch batteries');
     return res.json();
   },
+  async getStats() {
+    const res = await fetch(`${API_BASE_URL}/stats`);
+    if (!res.ok) throw new Error('Failed to fetch stats');
+    return res.json();
+  },
   async getBatteryFull(batteryId) {
     const res = await fetch(`${API_BASE_URL}/battery/${batteryId}/full`);
     if (!res.ok) throw new Error('Battery not found');
     return res.json();
   },
-  async getNotifications() {
-    const res = await fetch(`${API_BASE_URL}/notifications/`);
+  // Une page de notifications (plus récentes d'abord): { items, nextCursor }
+  async getNotifications(cursor = null) {
+    const params = new URLSearchParams({ limit: PAGE_SIZE, envelope: true });
+    if (cursor) params.set('cursor', cursor);
+    const res = await fetch(`${API_BASE_URL}/notifications/?${params}`);
     if (!res.ok) throw new Error('Failed to fetch notifications');
     return res.json();
   },
@@ -215,6 +227,9 @@ const BatteryCard = ({ battery, onSelect }) => (
 const ProprietaireDashboard = ({ onLogout }) => {
   const [view, setView] = useState('dashboard'); // dashboard, notifications, batteries
   const [batteries, setBatteries] = useState([]);
+  const [batteriesCursor, setBatteriesCursor] = useState(null);
+  const [notificationsCursor, setNotificationsCursor] = useState(null);
+  const [fleetStats, setFleetStats] = useState(null);
   const [notifications, setNotifications] = useState([]);
   const [unreadCount, setUnreadCount] = useState(0);
   const [selectedBattery, setSelectedBattery] = useState(null);
@@ -234,13 +249,17 @@ const ProprietaireDashboard = ({ onLogout }) => {
   const loadData = async () => {
     setLoading(true);
     try {
-      const [bats, notifs, unread] = await Promise.all([
-        api.getAllBatteries(),
+      const [page, fleet, notifs, unread] = await Promise.all([
+        api.getBatteriesPage(),
+        api.getStats(),
         api.getNotifications(),
         api.getUnreadCount()
       ]);
-      setBatteries(bats);
-      setNotifications(Array.isArray(notifs) ? notifs : []);
+      setBatteries(page.items);
+      setBatteriesCursor(page.nextCursor);
+      setFleetStats(fleet);
+      setNotifications(Array.isArray(notifs?.items) ? notifs.items : []);
+      setNotificationsCursor(notifs?.nextCursor || null);
       setUnreadCount(unread?.unreadCount || 0);
     } catch (err) {
       console.error('Error loading data:', err);
@@ -249,6 +268,32 @@ const ProprietaireDashboard = ({ onLogout }) => {
     setLoading(false);
   };
 
+  // Page suivante de batteries (vue "Batteries")
+  const loadMoreBatteries = async () => {
+    setLoading(true);
+    try {
+      const page = await api.getBatteriesPage(batteriesCursor);
+      setBatteries(prev => [...prev, ...page.items]);
+      setBatteriesCursor(page.nextCursor);
+    } catch (err) {
+      showToast('Erreur de chargement', 'error');
+    }
+    setLoading(false);
+  };
+
+  // Notifications plus anciennes (vue "Notifications")
+  const loadMoreNotifications = async () => {
+    setLoading(true);
+    try {
+      const page = await api.getNotifications(notificationsCursor);
+      setNotifications(prev => [...prev, ...page.items]);
+      setNotificationsCursor(page.nextCursor);
+    } catch (err) {
+      showToast('Erreur de chargement', 'error');
+    }
+    setLoading(false);
+  };
+
   // Traiter une notification (valider → Waste)
   const handleProcessNotification = async (notificationId, newStatus) => {
     setLoading(true);
@@ -286,12 +331,13 @@ const ProprietaireDashboard = ({ onLogout }) => {
     setLoading(false);
   };
 
-  // Stats
+  // Stats (toute la flotte, via GET /stats)
+  const byStatus = fleetStats?.byStatus || {};
   const stats = {
-    total: batteries.length,
-    original: batteries.filter(b => b.status === 'Original').length,
-    waste: batteries.filter(b => b.status === 'Waste' || b.status === 'Signaled As Waste').length,
-    processed: batteries.filter(b => b.status === 'Reused' || b.status === 'Repurposed').length,
+    total: fleetStats?.totalBatteries || 0,
+    original: byStatus['Original'] || 0,
+    waste: (byStatus['Waste'] || 0) + (byStatus['Signaled As Waste'] || 0),
+    processed: (byStatus['Reused'] || 0) + (byStatus['Repurposed'] || 0),
   };
 
   const pendingNotifications = notifications.filter(n => n.status === 'pending');
@@ -510,6 +556,13 @@ const ProprietaireDashboard = ({ onLogout }) => {
                 ))}
               </div>
             )}
+            
+            {notificationsCursor && (
+              <button onClick={loadMoreNotifications} disabled={loading} className={`${styles.button} w-full mt-4`}>
+                {loading ? <RefreshCw className="w-4 h-4 animate-spin" /> : <ChevronRight className="w-4 h-4" />}
+                Notifications plus anciennes
+              </button>
+            )}
           </div>
         )}
 
@@ -518,7 +571,7 @@ const ProprietaireDashboard = ({ onLogout }) => {
           <div className={`${styles.card} p-6`}>
             <h2 className="font-semibold text-slate-800 flex items-center gap-2 mb-4">
               <Battery className="w-5 h-5 text-purple-600" />
-              Toutes les batteries ({batteries.length})
+              Toutes les batteries ({batteries.length} / {stats.total})
             </h2>
             
             <div className="grid grid-cols-1 md:grid-cols-2 lg:grid-cols-3 gap-3">
@@ -530,6 +583,13 @@ const ProprietaireDashboard = ({ onLogout }) => {
                 />
               ))}
             </div>
+            
+            {batteriesCursor && (
+              <button onClick={loadMoreBatteries} disabled={loading} className={`${styles.button} w-full mt-4`}>
+                {loading ? <RefreshCw className="w-4 h-4 animate-spin" /> : <ChevronRight className="w-4 h-4" />}
+                Charger plus
+              </button>
+            )}
           </div>
         )}
       </div>
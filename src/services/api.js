@@ -4,9 +4,13 @@ const FRONTEND_BASE_URL = 'https://battery-passport-repo.onrender.com';
 
 const api = {
   // ==================== BATTERIES ====================
-  async getAllBatteries(status = null) {
-    const params = status ? `?status=${status}` : '';
-    const res = await fetch(`${API_BASE_URL}/battery/${params}`);
+  // Une page de batteries: { items, nextCursor } (nextCursor null à la dernière page)
+  async getBatteries({ status = null, search = null, cursor = null, limit = 100 } = {}) {
+    const params = new URLSearchParams({ limit, envelope: true });
+    if (status) params.set('status', status);
+    if (search) params.set('search', search);
+    if (cursor) params.set('cursor', cursor);
+    const res = await fetch(`${API_BASE_URL}/battery/?${params}`);
     if (!res.ok) throw new Error('Failed to fetch batteries');
     return res.json();
   },
@@ -65,9 +69,11 @@ const api = {
   },
 
   // ==================== NOTIFICATIONS ====================
-  async getNotifications(unreadOnly = false) {
-    const params = unreadOnly ? '?unread_only=true' : '';
-    const res = await fetch(`${API_BASE_URL}/notifications/${params}`);
+  // Une page de notifications (plus récentes d'abord): { items, nextCursor }
+  async getNotifications({ unreadOnly = false, cursor = null, limit = 50 } = {}) {
+    const params = new URLSearchParams({ unread_only: unreadOnly, limit, envelope: true });
+    if (cursor) params.set('cursor', cursor);
+    const res = await fetch(`${API_BASE_URL}/notifications/?${params}`);
     if (!res.ok) throw new Error('Failed to fetch notifications');
     return res.json();
   },
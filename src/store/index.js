@@ -34,6 +34,8 @@ export const useAuthStore = create(
 export const useBatteryStore = create((set, get) => ({
   currentBattery: null,
   batteries: [],
+  batteriesCursor: null,
+  batteriesFilters: {},
   diagnostic: null,
   loading: false,
   error: null,
@@ -54,12 +56,27 @@ export const useBatteryStore = create((set, get) => ({
     }
   },
 
-  fetchAllBatteries: async (status = null) => {
+  // Première page (filtres status / search); la suite via fetchMoreBatteries
+  fetchBatteries: async (filters = {}) => {
     set({ loading: true, error: null });
     try {
-      const data = await api.getAllBatteries(status);
-      set({ batteries: data, loading: false });
-      return data;
+      const page = await api.getBatteries(filters);
+      set({ batteries: page.items, batteriesCursor: page.nextCursor, batteriesFilters: filters, loading: false });
+      return page.items;
+    } catch (error) {
+      set({ error: 'Failed to fetch batteries', loading: false });
+      throw error;
+    }
+  },
+
+  fetchMoreBatteries: async () => {
+    const { batteriesCursor, batteriesFilters } = get();
+    if (!batteriesCursor) return [];
+    set({ loading: true, error: null });
+    try {
+      const page = await api.getBatteries({ ...batteriesFilters, cursor: batteriesCursor });
+      set({ batteries: [...get().batteries, ...page.items], batteriesCursor: page.nextCursor, loading: false });
+      return page.items;
     } catch (error) {
       set({ error: 'Failed to fetch batteries', loading: false });
       throw error;
@@ -95,20 +112,46 @@ export const useBatteryStore = create((set, get) => ({
 
 export const useNotificationStore = create((set, get) => ({
   notifications: [],
+  notificationsCursor: null,
+  notificationsUnreadOnly: false,
   unreadCount: 0,
   loading: false,
 
+  // Première page seulement; les pages plus anciennes via fetchMoreNotifications
   fetchNotifications: async (unreadOnly = false) => {
     set({ loading: true });
     try {
-      const data = await api.getNotifications(unreadOnly);
-      // Ensure data is an array
-      const notifs = Array.isArray(data) ? data : [];
-      set({ notifications: notifs, loading: false });
+      const page = await api.getNotifications({ unreadOnly });
+      const notifs = Array.isArray(page?.items) ? page.items : [];
+      set({
+        notifications: notifs,
+        notificationsCursor: page?.nextCursor || null,
+        notificationsUnreadOnly: unreadOnly,
+        loading: false
+      });
       return notifs;
     } catch (error) {
       console.error('Failed to fetch notifications:', error);
-      set({ notifications: [], loading: false });
+      set({ notifications: [], notificationsCursor: null, loading: false });
+      return [];
+    }
+  },
+
+  fetchMoreNotifications: async () => {
+    const { notificationsCursor, notificationsUnreadOnly } = get();
+    if (!notificationsCursor) return [];
+    set({ loading: true });
+    try {
+      const page = await api.getNotifications({ unreadOnly: notificationsUnreadOnly, cursor: notificationsCursor });
+      set({
+        notifications: [...get().notifications, ...page.items],
+        notificationsCursor: page.nextCursor,
+        loading: false
+      });
+      return page.items;
+    } catch (error) {
+      console.error('Failed to fetch notifications:', error);
+      set({ loading: false });
       return [];
     }
   },
@@ -128,7 +171,7 @@ export const useNotificationStore = create((set, get) => ({
   markAsRead: async (notificationId) => {
     try {
       await api.markAsRead(notificationId);
-      await get().fetchNotifications();
+      await get().fetchNotifications(get().notificationsUnreadOnly);
       await get().fetchUnreadCount();
     } catch (error) {
       console.error('Failed to mark as read:', error);
@@ -138,7 +181,7 @@ export const useNotificationStore = create((set, get) => ({
   processNotification: async (notificationId, newStatus) => {
     try {
       await api.processNotification(notificationId, newStatus);
-      await get().fetchNotifications();
+      await get().fetchNotifications(get().notificationsUnreadOnly);
       await get().fetchUnreadCount();
     } catch (error) {
       console.error('Failed to process notification:', error);